@@ -1,13 +1,91 @@
 from argparse import ArgumentParser
-from collections import Counter
-from datetime import date, datetime
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from itertools import product
 import json
 import os
+import sys
+import threading
+import time
+from types import MappingProxyType
+import warnings
 
 import requests
 
-# Package name is github3.py
-import github3
+from contributor_ledger import ContributorLedger
+from github_client import get_client
+from instrumentation import span
+from org_snapshot import DEFAULT_TTL, InvitationJournal, OrgSnapshot
+from webhook_queue import POLL_INTERVAL, consume, start_receiver
+
+# Search query for the authors of merged pull requests. Only the logins and
+# merge times are requested, so that each page of 100 results is cheap.
+MERGED_PRS_QUERY = """
+query($query: String!, $cursor: String) {
+  search(query: $query, type: ISSUE, first: 100, after: $cursor) {
+    issueCount
+    pageInfo {
+      hasNextPage
+      endCursor
+    }
+    nodes {
+      ... on PullRequest {
+        author {
+          login
+        }
+        mergedAt
+      }
+    }
+  }
+}
+"""
+
+# Query for the repositories of an organization, with the time of the latest
+# commit on their default branch, which is when a pull request was last merged
+# (or something was pushed directly).
+REPOSITORIES_QUERY = """
+query($org: String!, $cursor: String) {
+  organization(login: $org) {
+    repositories(first: 100, after: $cursor, isArchived: false) {
+      pageInfo {
+        hasNextPage
+        endCursor
+      }
+      nodes {
+        name
+        defaultBranchRef {
+          target {
+            ... on Commit {
+              committedDate
+            }
+          }
+        }
+      }
+    }
+  }
+}
+"""
+
+# Maximum number of repositories processed at the same time. GitHub
+# discourages many concurrent requests with the same token, which can trigger
+# its secondary rate limits, so this is kept small.
+MAX_WORKERS = 4
+
+# Maximum number of invitations sent at the same time, and minimum time in
+# seconds between sending two invitations. GitHub asks for requests that
+# create content to be at least a second apart, to avoid its secondary rate
+# limits (which the client waits for anyway if they are hit).
+INVITATION_WORKERS = 2
+INVITATION_INTERVAL = 1
+
+# GitHub only returns the first 1000 results of a search, so date ranges with
+# more merged pull requests than this are split.
+SEARCH_RESULT_CAP = 1000
+
+# Client errors for which sending an invitation again may succeed (secondary
+# rate limits and timeouts). Other 4xx errors, such as 404 for a user who
+# does not exist or 422 for one who cannot be invited, are permanent.
+TRANSIENT_CLIENT_ERRORS = {403, 408, 429}
 
 
 class GitHubOrgAutoInvite:
@@ -17,7 +95,11 @@ class GitHubOrgAutoInvite:
                  n_min_pr=1,
                  oldest_date=None,
                  min_invite_gap_days=365,
-                 other_bots=None):
+                 other_bots=None,
+                 snapshot_ttl=DEFAULT_TTL,
+                 refresh_snapshot=False,
+                 ledger_path=None,
+                 offline=False):
         """
         Generate automatic invitations to an organization based on merged
         pull requests.
@@ -45,8 +127,9 @@ class GitHubOrgAutoInvite:
             Minimum number of pull requests someone not in the organization
             must have had merged to be issued an invitation.
 
-        oldest_date : str, optional
-            Date, formatted using ISO format, before which PRs are ignored.
+        oldest_date : str or `datetime.date`, optional
+            Date (or date formatted using ISO format) before which merged PRs
+            are ignored.
 
         min_invite_gap_days : int, optional
             Minimum number of days between invitations. Invitations are
@@ -54,19 +137,60 @@ class GitHubOrgAutoInvite:
             invitation failed and if that failure was because the user never
             responded. If the user has said no, they do not get invited again
             by the bot.
-        """
-        self.github_connection = github3.login(token=token)
-        self.org = self.github_connection.organization(organization)
 
-        # Build lists of categories we should skip invites for
+        snapshot_ttl : float, optional
+            Time in seconds after which the cached snapshot of the members,
+            blocked users and invitations of the organization is refreshed.
+
+        refresh_snapshot : bool, optional
+            If `True`, refresh the snapshot of the organization regardless of
+            its age.
+
+        ledger_path : str, optional
+            The SQLite database in which the merged pull requests are
+            counted from one run to the next (see `ContributorLedger`).
+
+        offline : bool, optional
+            If `True`, do not connect to GitHub and only use the cached
+            snapshot of the organization and the ledger, e.g. for `simulate`.
+            No repositories can be processed and no invitations sent.
+        """
+        if offline:
+            self.client = None
+            self.org_name = organization
+        else:
+            # The API URL can be changed with GITHUB_API_URL, for instance to
+            # use the stand-in server in standin/
+            self.client = get_client(token=token)
+            # The name of the organization as spelled on GitHub
+            self.org_name = self.client.rest('GET', f'orgs/{organization}')['login']
+
+        # Build sets of categories we should skip invites for, from the
+        # snapshot of the organization cached on disk.
         # If the token does not have sufficient scope then the initialization will fail
         # here.
-        self.blocked_users = [b.login for b in self.org.blocked_users()]
-        self.open_invitation = [i.login for i in self.org.invitations()]
-        self.failed_invites = get_failed_invitations(token, self.org.url)
+        # These are not modified afterwards, so that repositories can be
+        # processed concurrently.
+        self.snapshot = OrgSnapshot(self.org_name, self.client, ttl=snapshot_ttl,
+                                    verbose=verbose)
+        if offline:
+            if not self.snapshot.complete():
+                raise RuntimeError(f'No cached snapshot of the organization {organization}, '
+                                   'run the inviter once without --simulate first.')
+        else:
+            self.snapshot.refresh(force=refresh_snapshot)
+        self.journal = InvitationJournal(self.org_name)
+        self.load_org_state()
+
+        # Counts of merged pull requests, only updated with the pull requests
+        # merged since the previous run.
+        self.ledger = ContributorLedger(ledger_path)
 
-        # Get list of current members
-        self.current_members = [member.login for member in self.org.members()]
+        # Time of the latest commit on the default branch of the repositories
+        # found by discover_repos, recorded in the ledger once the
+        # repositories have been processed and their invitations queued.
+        self.default_branch_updates = {}
+        self.processed_repos = set()
 
         # Set the state for this run
         self.verbose = verbose
@@ -83,11 +207,30 @@ class GitHubOrgAutoInvite:
         if self.other_bots is None:
             self.other_bots = []
 
+    def load_org_state(self):
+        """
+        Set the members, blocked users and open and failed invitations of
+        the organization from the snapshot and the journal of invitations.
+        """
+        self.blocked_users = self.snapshot.blocked_users
+
+        # Invitations sent since the open invitations were listed are taken
+        # from the journal of invitations.
+        self.open_invitation = (self.snapshot.open_invitations |
+                                self.journal.sent_since(self.snapshot.fetched('open_invitations')))
+        self.failed_invites = MappingProxyType(self.snapshot.failed_invitations)
+
+        # Invitations which the inviter could not send and will not retry
+        self.given_up_invites = self.journal.given_up()
+
+        # Get set of current members
+        self.current_members = self.snapshot.members
+
     def process_invites_for_repo(self, repo):
         """
         Get list of contributors to a repository that are not currently
-        members of the GitHub organization and send them an
-        invitation to join the organization.
+        members of the GitHub organization and add them to the list of
+        people to invite to join the organization.
 
         Contributor here means someone who has had a pull request merged.
 
@@ -98,73 +241,118 @@ class GitHubOrgAutoInvite:
             Name of a repository in the organization to check for
             contributors.
         """
+        self.pending_invitation |= set(self.find_invitees(repo))
+
+    def process_invites_for_repos(self, repos, max_workers=MAX_WORKERS):
+        """
+        Like `process_invites_for_repo`, but for several repositories which
+        are processed concurrently.
+
+        Parameters
+        ----------
+
+        repos : list of str
+            Names of repositories in the organization to check for
+            contributors.
+
+        max_workers : int, optional
+            Maximum number of repositories processed at the same time.
+        """
+
+        def process(repo):
+            messages = []
+
+            def log(*args):
+                messages.append(' '.join(str(arg) for arg in args))
+
+            with span('process_invites_for_repo', repo=repo):
+                return self.find_invitees(repo, log=log), messages
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # map returns the results in the order of the repositories, so
+            # the output and the merged results do not depend on which
+            # repository finishes first.
+            for to_add, messages in executor.map(process, repos):
+                for message in messages:
+                    print(message)
+                self.pending_invitation |= set(to_add)
+
+    def find_invitees(self, repo, log=print):
+        """
+        Return the contributors to a repository who should be invited to
+        the organization.
+
+        This only reads the state gathered when the inviter was created, so
+        it can be called for several repositories at the same time.
+
+        Parameters
+        ----------
+
+        repo : str
+            Name of a repository in the organization to check for
+            contributors.
+
+        log : callable, optional
+            Function called with the progress messages, if ``verbose`` is
+            `True`.
+        """
         print_prefix = "\t"
         if self.verbose:
-            print(f"\n\nProcessing repository {repo}")
+            log(f"\n\nProcessing repository {repo}")
 
-        org_repo = self.github_connection.repository(self.org.login, repo)
+        too_old = self._oldest_merge_date()
 
-        pr_count = {}
+        if self.verbose:
+            log(print_prefix, f"Getting PRs merged since {too_old}")
 
-        if self.oldest_date is not None:
-            if isinstance(self.oldest_date, str):
-                oldest_date = date.fromisoformat(self.oldest_date)
-            too_old = oldest_date
-        else:
-            # Go back one year from now
-            now = datetime.now()
-            too_old = date(now.year - 1, now.month, now.day)
+        # Only the pull requests merged since the previous run are searched
+        # for, and the counts since too_old are then summed from the ledger.
+        full_name = f'{self.org_name}/{repo}'
+        self.ledger.update(full_name, too_old,
+                           lambda start, stop: self._merged_prs(repo, start, stop))
+        if repo in self.default_branch_updates:
+            self.processed_repos.add(repo)
+        pr_count = self.ledger.merged_counts(too_old, repo=full_name)
 
-        not_in = []
+        return self.select_invitees(repo, pr_count, log=log)
 
-        if self.verbose:
-            print(print_prefix, "Getting merged PRs")
+    def select_invitees(self, repo, pr_count, log=print):
+        """
+        Return the contributors to a repository who should be invited to
+        the organization, given the number of pull requests each of them
+        had merged since ``oldest_date``. This does not use the GitHub API.
 
-        # By default PRs are returned sorted in descending order by date
-        # of creation.
-        pr_authors = []
-        for pr in org_repo.pull_requests(state='closed'):
-            if pr.created_at.date() < too_old:
-                if self.verbose:
-                    print(print_prefix, f"Reached PRs older than {too_old}, breaking...")
-                break
-            author = pr.user.login
-            pr_authors.append(author)
+        Parameters
+        ----------
+
+        repo : str
+            Name of the repository.
 
-        # This should reduce author processing to a minimum
-        pr_count = Counter(pr_authors)
+        pr_count : dict
+            Number of merged pull requests for each author.
+
+        log : callable, optional
+            Function called with the progress messages, if ``verbose`` is
+            `True`.
+        """
+        print_prefix = "\t"
+        not_in = []
 
         for author in pr_count.keys():
 
-            # Stop processing in some cases
-            if (author in self.blocked_users):
-                continue
-            elif (author in self.open_invitation):
-                continue
-            elif author.endswith('[bot]'):
-                # GitHub's various bots have user names that end this way
-                continue
-            elif author in self.other_bots:
-                # Any other bots that don't follow the GitHub ends-with-[bot] pattern
-                continue
-            elif (author == 'ghost'):
-                # ghost is the login for any user who has deleted their account
+            reason_to_skip = self._skip_reason(author)
+            if reason_to_skip:
+                if self.verbose:
+                    log(print_prefix, f"{author} will not be invited because {reason_to_skip}")
                 continue
 
             if self.verbose:
-                print(print_prefix, f"Checking {author}")
-
-            if author not in self.current_members:
-                if self.verbose:
-                    print(print_prefix, f'\t{author} is not in the org {self.org.login}')
-                not_in.append(author)
-            else:
-                if self.verbose:
-                    print(print_prefix, f"\t{author} is already in the org {self.org.login}")
+                log(print_prefix, f'{author} is not in the org {self.org_name}')
+            not_in.append(author)
 
         if self.verbose:
-            print(print_prefix, f'These people from repository {repo} are '
-                                f'not in the org {self.org.login}: '
+            log(print_prefix, f'These people from repository {repo} are '
+                                f'not in the org {self.org_name}: '
                                 f'\n{print_prefix}{print_prefix}{not_in}')
 
         failed_invitees = self.failed_invites.keys()
@@ -172,12 +360,13 @@ class GitHubOrgAutoInvite:
         for author in not_in:
             if author in self.failed_invites:
                 reason_to_fail = self._check_send_invitation(self.failed_invites[author])
-                if reason_to_fail and self.verbose:
-                    print(print_prefix, f"{author} will not be invited because {reason_to_fail}")
+                if reason_to_fail:
+                    if self.verbose:
+                        log(print_prefix, f"{author} will not be invited because {reason_to_fail}")
                     continue
 
             if self.verbose:
-                print(print_prefix, f"{author} has {pr_count[author]} PRs in repo {repo}, "
+                log(print_prefix, f"{author} has {pr_count[author]} PRs in repo {repo}, "
                       f"minimum required is {self.n_min_pr}")
             if pr_count[author] >= self.n_min_pr:
                 to_add.append(author)
@@ -185,25 +374,383 @@ class GitHubOrgAutoInvite:
         # No one to add, so keep going
         if not to_add:
             if self.verbose:
-                print(print_prefix, f"No one to add from repository {repo}")
-            return
+                log(print_prefix, f"No one to add from repository {repo}")
+            return []
 
         if self.verbose:
-            print(print_prefix, f'Adding these people from repository {repo} '
-                                f'to the invite list for the org {self.org.login}: '
+            log(print_prefix, f'Adding these people from repository {repo} '
+                                f'to the invite list for the org {self.org_name}: '
                                 f'\n{print_prefix}{print_prefix}{to_add}')
 
-        self.pending_invitation |= set(to_add)
+        return to_add
 
-    def send_invitations(self):
+    def _skip_reason(self, author):
+        """
+        Return why someone should not be invited whatever their merged pull
+        requests, from the snapshot of the organization and the journal of
+        invitations, or an empty string if they can be.
+        """
+        if author in self.blocked_users:
+            return 'they are blocked by the organization'
+        elif author in self.open_invitation:
+            return 'they already have an open invitation'
+        elif author in self.given_up_invites:
+            return 'previous invitations could not be sent'
+        elif author.endswith('[bot]') or author in self.other_bots:
+            # GitHub's various bots have user names that end with [bot], and
+            # other_bots lists those that don't follow this pattern
+            return 'they are a bot'
+        elif author == 'ghost':
+            # ghost is the login for any user who has deleted their account
+            return 'their account was deleted'
+        elif author in self.current_members:
+            return f'they are already in the org {self.org_name}'
+        return ''
+
+    def queue_unsent(self):
+        """
+        Queue again the invitations which a previous run could not send (see
+        `InvitationJournal.unsent`), except for people who have since joined
+        the organization, been blocked or been invited.
+
+        The snapshot of the organization is refreshed first regardless of its
+        age, since sending an invitation to a member would change their role.
+        """
+        self.snapshot.refresh(force=True)
+        self.load_org_state()
+        for person in self.journal.unsent():
+            reason_to_skip = self._skip_reason(person)
+            if reason_to_skip:
+                if self.verbose:
+                    print(f"The invitation to {person} will not be sent again "
+                          f"because {reason_to_skip}")
+                continue
+            self.pending_invitation.add(person)
+
+    def simulate(self, repos=None, n_min_prs=(1,), oldest_dates=(None,),
+                 min_invite_gap_days=(365,)):
+        """
+        Return who would be invited with each combination of settings,
+        using only the counts in the ledger and the cached snapshot of the
+        organization.
+
+        A combination can only be evaluated if the ledger covers all the
+        repositories back to its ``oldest_date``, i.e. if the inviter was run
+        for them with that ``oldest_date`` (or an earlier one). Otherwise the
+        counts would be incomplete, so no invitees are returned for it.
+
+        Parameters
+        ----------
+
+        repos : list of str, optional
+            Names of the repositories to consider. Defaults to all the
+            repositories of the organization in the ledger.
+
+        n_min_prs, oldest_dates, min_invite_gap_days : iterable
+            The values of ``n_min_pr``, ``oldest_date`` and
+            ``min_invite_gap_days`` to try.
+
+        Returns
+        -------
+
+        List of ``((n_min_pr, oldest_date, min_invite_gap_days), invitees,
+        uncovered)`` tuples, where ``invitees`` is the sorted list of people
+        who would be invited, or `None` if the setting cannot be evaluated
+        because the ledger does not go back far enough for the repositories
+        in ``uncovered``.
+        """
+        if repos is None:
+            repos = self.ledger.repositories(self.org_name)
+
+        settings = (self.n_min_pr, self.oldest_date, self.min_invite_gap_days)
+
+        # The counts only depend on the date, so they are only read once for
+        # each date and repository.
+        counts = {}
+        covered = {}
+
+        def no_log(*args):
+            pass
+
+        results = []
+        try:
+            for n_min_pr, oldest_date, gap in product(n_min_prs, oldest_dates, min_invite_gap_days):
+                self.n_min_pr, self.oldest_date, self.min_invite_gap_days = n_min_pr, oldest_date, gap
+                too_old = self._oldest_merge_date()
+                if too_old not in covered:
+                    covered[too_old] = [repo for repo in repos if not self.ledger.covers(
+                        f'{self.org_name}/{repo}', too_old)]
+                uncovered = covered[too_old]
+                if uncovered:
+                    results.append(((n_min_pr, oldest_date, gap), None, uncovered))
+                    continue
+                invitees = set()
+                for repo in repos:
+                    if (repo, too_old) not in counts:
+                        counts[repo, too_old] = self.ledger.merged_counts(
+                            too_old, repo=f'{self.org_name}/{repo}')
+                    invitees.update(self.select_invitees(repo, counts[repo, too_old], log=no_log))
+                results.append(((n_min_pr, oldest_date, gap), sorted(invitees), []))
+        finally:
+            self.n_min_pr, self.oldest_date, self.min_invite_gap_days = settings
+
+        return results
+
+    def handle_webhook(self, event, payload):
+        """
+        Count a pull request merged into a repository of the organization,
+        from the payload of a ``pull_request`` webhook delivery, and invite
+        its author if they now qualify.
+
+        Only the author of the pull request is checked. If the ledger does
+        not yet cover the repository back to ``oldest_date``, it is first
+        brought up to date with a search, as in `find_invitees`. Other
+        events and actions are ignored.
+
+        Returns
+        -------
+
+        Dictionary of the invitations which could not be sent (see
+        `send_invitations`).
+        """
+        if event != 'pull_request' or payload.get('action') != 'closed':
+            return {}
+
+        pull_request = payload['pull_request']
+        owner, repo = payload['repository']['full_name'].split('/', 1)
+        if not pull_request.get('merged') or owner.lower() != self.org_name.lower():
+            return {}
+
+        full_name = f'{self.org_name}/{repo}'
+        user = pull_request.get('user')
+        # The user is null for accounts that have been deleted
+        author = user['login'] if user else 'ghost'
+
+        with span('handle_webhook', repo=repo, number=pull_request['number']):
+
+            too_old = self._oldest_merge_date()
+
+            if not self.ledger.covers(full_name, too_old):
+                self.ledger.update(full_name, too_old,
+                                   lambda start, stop: self._merged_prs(repo, start, stop))
+            self.ledger.record_merge(full_name, pull_request['number'], author,
+                                     pull_request['merged_at'])
+
+            if self.verbose:
+                print(f"\nPull request {full_name}#{pull_request['number']} by {author} was merged")
+
+            # The snapshot is refreshed once it is older than its
+            # time-to-live, since the daemon can run for a long time.
+            self.snapshot.refresh()
+            self.load_org_state()
+
+            pr_count = self.ledger.merged_counts(too_old, repo=full_name, author=author)
+            self.pending_invitation = set(self.select_invitees(repo, pr_count))
+            try:
+                return self.send_invitations()
+            finally:
+                self.pending_invitation = set()
+
+    def watch(self, queue_dir, poll_interval=POLL_INTERVAL, stop=None):
+        """
+        Handle the webhook deliveries added to a queue directory (see
+        `webhook_queue`) with `handle_webhook`, until ``stop`` (a
+        `threading.Event`) is set. Deliveries which cannot be handled are
+        retried and eventually set aside, without stopping the daemon (see
+        `webhook_queue.consume`).
+        """
+        def handle(event, payload):
+            failed = self.handle_webhook(event, payload)
+            for person in failed:
+                print(f'The invitation to {person} will be sent again by --retry-unsent')
+
+        consume(queue_dir, handle, poll_interval=poll_interval, stop=stop)
+
+    def discover_repos(self, log=print):
+        """
+        Return the names of the repositories in the organization in which
+        pull requests may have been merged since the previous run.
+
+        All the repositories are listed with a single paginated GraphQL
+        query, together with the time of the latest commit on their default
+        branch. Archived and empty repositories are skipped, as well as those
+        whose default branch has not changed since they were last processed
+        (and whose counts in the ledger go back far enough).
+
+        Parameters
+        ----------
+
+        log : callable, optional
+            Function called with the progress messages, if ``verbose`` is
+            `True`.
+        """
+
+        too_old = self._oldest_merge_date()
+
+        repos = []
+        cursor = None
+
+        while True:
+
+            result = self.client.graphql(REPOSITORIES_QUERY,
+                                         variables={'org': self.org_name, 'cursor': cursor})
+            repositories = result['organization']['repositories']
+
+            for node in repositories['nodes']:
+                if node['defaultBranchRef'] is None:
+                    continue
+                name = node['name']
+                updated_at = node['defaultBranchRef']['target']['committedDate']
+                if self.ledger.is_current(f'{self.org_name}/{name}', too_old, updated_at):
+                    if self.verbose:
+                        log(f'Skipping repository {name}, nothing was pushed to its '
+                            'default branch since the previous run')
+                    continue
+                self.default_branch_updates[name] = updated_at
+                repos.append(name)
+
+            if not repositories['pageInfo']['hasNextPage']:
+                return repos
+
+            cursor = repositories['pageInfo']['endCursor']
+
+    def _oldest_merge_date(self):
+        """
+        Return the date before which merged pull requests are ignored.
+        """
+        if self.oldest_date is not None:
+            too_old = self.oldest_date
+            if isinstance(too_old, str):
+                too_old = date.fromisoformat(too_old)
+        else:
+            # Go back one year from now
+            now = datetime.now()
+            too_old = date(now.year - 1, now.month, now.day)
+        return too_old
+
+    def _merged_prs(self, repo, start, stop):
+        """
+        Return the author and merge time of each pull request merged into a
+        repository between two dates (inclusive), using the GraphQL search
+        API.
+
+        If there are more merged pull requests than can be returned by a
+        single search, the date range is split in two and each half is
+        searched separately. A warning is emitted if that is still the case
+        for a single day.
+        """
+
+        search = f'repo:{self.org_name}/{repo} is:pr is:merged merged:{start}..{stop}'
+
+        prs = []
+        cursor = None
+
+        while True:
+
+            result = self.client.graphql(MERGED_PRS_QUERY,
+                                         variables={'query': search, 'cursor': cursor})['search']
+
+            if cursor is None and result['issueCount'] > SEARCH_RESULT_CAP:
+                if start < stop:
+                    middle = start + (stop - start) // 2
+                    return (self._merged_prs(repo, start, middle) +
+                            self._merged_prs(repo, middle + timedelta(days=1), stop))
+                # The search cannot be split further than a day
+                warnings.warn(f"{result['issueCount']} pull requests were merged into "
+                              f'{self.org_name}/{repo} on {start}, but only the first '
+                              f'{SEARCH_RESULT_CAP} can be found, so some authors will '
+                              'be undercounted')
+
+            for node in result['nodes']:
+                # The author is null for accounts that have been deleted
+                prs.append((node['author']['login'] if node.get('author') else 'ghost',
+                            node['mergedAt']))
+
+            if not result['pageInfo']['hasNextPage']:
+                return prs
+
+            cursor = result['pageInfo']['endCursor']
+
+    def send_invitations(self, max_workers=INVITATION_WORKERS):
         """
         Actually issue the invitations to the organization
+
+        Each invitation is recorded in the journal of invitations when it is
+        queued, and then when it has been sent or has failed, so that the
+        ones which were not sent can be retried later (see
+        `InvitationJournal.unsent`). Invitations refused by GitHub with a
+        permanent client error are recorded as rejected and never retried.
+
+        Once the invitations are queued, the time of the latest commit on
+        the default branch of the repositories processed is recorded in the
+        ledger, so that `discover_repos` skips them until something else is
+        pushed. This is not done in a dry run.
+
+        Parameters
+        ----------
+
+        max_workers : int, optional
+            Maximum number of invitations sent at the same time.
+
+        Returns
+        -------
+
+        Dictionary of the people who could not be invited but may be
+        retried, with the error for each.
         """
-        for person in self.pending_invitation:
-            if self.dry_run:
+        people = sorted(self.pending_invitation)
+
+        if self.dry_run:
+            for person in people:
                 print(f'DRY RUN: would have invited {person}')
-            else:
-                self.org.add_or_update_membership(person, role='member')
+            return {}
+
+        for person in people:
+            self.journal.record(person, 'queued')
+
+        # The repositories can only be skipped by the next run once their
+        # invitations are in the journal, from which any that are not sent
+        # can be retried.
+        for repo in sorted(self.processed_repos):
+            self.ledger.record_default_branch(f'{self.org_name}/{repo}',
+                                              self.default_branch_updates[repo])
+        self.processed_repos.clear()
+
+        pacing = threading.Lock()
+        next_start = [time.monotonic()]
+
+        def invite(person):
+            # Space out the start of the requests
+            with pacing:
+                time.sleep(max(0, next_start[0] - time.monotonic()))
+                next_start[0] = time.monotonic() + INVITATION_INTERVAL
+            with span('send_invitation', login=person):
+                try:
+                    self.client.rest('PUT', f'orgs/{self.org_name}/memberships/{person}',
+                                     json={'role': 'member'})
+                except requests.RequestException as exc:
+                    status = getattr(exc.response, 'status_code', None)
+                    if (status is not None and 400 <= status < 500 and
+                            status not in TRANSIENT_CLIENT_ERRORS):
+                        self.journal.record(person, 'rejected', error=str(exc))
+                        return 'rejected', str(exc)
+                    self.journal.record(person, 'failed', error=str(exc))
+                    return 'failed', str(exc)
+            self.journal.record(person, 'sent')
+            return 'sent', None
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = dict(zip(people, executor.map(invite, people)))
+
+        failed = {}
+        for person, (status, error) in results.items():
+            if status == 'rejected':
+                print(f'Could not invite {person}, will not try again: {error}')
+            elif status == 'failed':
+                print(f'Could not invite {person}: {error}')
+                failed[person] = error
+
+        return failed
 
     def _check_send_invitation(self, failed_invite):
         """
@@ -254,42 +801,6 @@ class GitHubOrgAutoInvite:
         return ''
 
 
-# failed_invitations from the GitHub REST API is not part of the github3.py
-# API, so it is added here.
-def get_failed_invitations(token, org_url):
-    """
-    Use the GitHub API to get a list of failed invitations.
-
-    NOTE: if failed_invitations ever becomes part of github3.py API
-          then this can be removed.
-
-    Parameters
-    ----------
-
-    token: str
-        GitHub authentication token.
-
-    org_url: str
-        URL for API requests for organization of interest.
-
-    Returns
-    -------
-
-    List of GitHub invitations that failed
-        See https://docs.github.com/en/rest/reference/orgs#list-failed-organization-invitations
-        for details of response content.
-    """
-    headers = {"Authorization": f"token {token}"}
-    failed_url = org_url + '/failed_invitations'
-    failed_invites = requests.get(failed_url,
-                                  headers=headers)
-    if failed_invites.status_code != 200:
-        raise RuntimeError("Attempt to retrieve failed invitations from "
-                           f"{failed_url} resulted in error "
-                           f"{failed_invites} {failed_invites.reason}")
-    return {f['login']: f for f in failed_invites.json()}
-
-
 def main(org, token, args):
     """
     Process command line arguments and drive generation of
@@ -305,15 +816,85 @@ def main(org, token, args):
     inviter = GitHubOrgAutoInvite(org, token,
                                   verbose=args.verbose,
                                   dry_run=args.dry_run,
-                                  n_min_pr=args.num_pr,
-                                  oldest_date=args.date,
-                                  min_invite_gap_days=args.min_invite_gap,
-                                  other_bots=args.other_bots)
+                                  n_min_pr=args.num_pr[0],
+                                  oldest_date=args.date[0],
+                                  min_invite_gap_days=args.min_invite_gap[0],
+                                  other_bots=args.other_bots,
+                                  snapshot_ttl=args.snapshot_ttl * 3600,
+                                  refresh_snapshot=args.refresh_snapshot,
+                                  ledger_path=args.ledger)
+
+    if args.watch:
+        if args.listen:
+            host, _, port = args.listen.rpartition(':')
+            start_receiver(args.watch, host=host or '127.0.0.1', port=int(port),
+                           verbose=args.verbose)
+        print(f'Waiting for merged pull requests in {args.watch}')
+        try:
+            inviter.watch(args.watch)
+        except KeyboardInterrupt:
+            pass
+        return
+
+    if args.retry_unsent:
+        # Only send the invitations that were queued by a previous run but
+        # not sent
+        inviter.queue_unsent()
+    else:
+        repos = args.repos
+        if args.all_repos:
+            with span('discover_repos'):
+                repos = inviter.discover_repos()
+
+        inviter.process_invites_for_repos(repos, max_workers=args.jobs)
+
+    with span('send_invitations'):
+        failed = inviter.send_invitations()
+
+    if failed:
+        sys.exit(f'{len(failed)} invitation(s) could not be sent, use '
+                 '--retry-unsent to try again')
+
+
+def comma_separated(type):
+    """
+    Return a function converting a comma-separated command line argument to
+    a list of values of the given type, for use as an argparse ``type``.
+    """
+    def convert(value):
+        return [type(item) for item in value.split(',')]
+    # Used by argparse in the message for invalid values
+    convert.__name__ = type.__name__
+    return convert
 
-    for repo in args.repos:
-        inviter.process_invites_for_repo(repo)
 
-    inviter.send_invitations()
+def simulate(org, args):
+    """
+    Print who would be invited with each combination of the values of
+    ``--num-pr``, ``--date`` and ``--min-invite-gap``, using only the cached
+    data from previous runs.
+    """
+    inviter = GitHubOrgAutoInvite(org, None,
+                                  other_bots=args.other_bots,
+                                  ledger_path=args.ledger,
+                                  offline=True)
+
+    results = inviter.simulate(args.repos or None,
+                               n_min_prs=args.num_pr,
+                               oldest_dates=args.date,
+                               min_invite_gap_days=args.min_invite_gap)
+
+    for (n_min_pr, oldest_date, gap), invitees, uncovered in results:
+        setting = (f'--num-pr {n_min_pr} --date {oldest_date or "(one year ago)"} '
+                   f'--min-invite-gap {gap}')
+        if invitees is None:
+            print(f'{setting}: cannot be evaluated, the merged pull requests are '
+                  f'not counted back to that date for {", ".join(uncovered)} (run the '
+                  'inviter for them with this --date first)')
+            continue
+        print(f'{setting}: {len(invitees)} invitation(s)')
+        if invitees:
+            print('\t' + ' '.join(invitees))
 
 
 if __name__ == '__main__':
@@ -331,38 +912,112 @@ if __name__ == '__main__':
                         help="Name of the GitHub organization to check for new "
                              "invitees.")
 
-    parser.add_argument('repos', nargs='+',
+    parser.add_argument('repos', nargs='*',
                         help="One or more repository in this organization "
                              "which are to be checked for new pull requests.")
 
+    parser.add_argument('--all-repos', action='store_true',
+                        help='Check all the repositories in the organization '
+                             'instead, except those where nothing was pushed '
+                             'to the default branch since the previous run.')
+
     parser.add_argument('--num-pr', '-n', action='store',
-                        default=1, type=int,
+                        default=[1], type=comma_separated(int),
                         help='Minimum number of merged PRs contributor must '
-                              'have to be added to organization.')
+                              'have to be added to organization. With '
+                              '--simulate, several comma-separated values can '
+                              'be given.')
 
-    parser.add_argument('--date', '-d', type=date.fromisoformat,
-                        help='Only consider pull requests made after this '
+    parser.add_argument('--date', '-d', type=comma_separated(date.fromisoformat),
+                        default=[None],
+                        help='Only consider pull requests merged after this '
                              'date. Default is one year from date script '
-                             'is run.')
+                             'is run. With --simulate, several comma-separated '
+                             'values can be given.')
 
     parser.add_argument('--min-invite-gap', '-m', action='store',
-                        default=365, type=int,
+                        default=[365], type=comma_separated(int),
                         help='Minimum gap, in days, between the expiration of '
                              'a previous invitation and the sending of a new '
-                             'one.')
+                             'one. With --simulate, several comma-separated '
+                             'values can be given.')
+
+    parser.add_argument('--simulate', action='store_true',
+                        help='Instead of sending invitations, print who would '
+                             'be invited for each combination of the values '
+                             'given to --num-pr, --date and --min-invite-gap, '
+                             'using only the data cached by previous runs '
+                             '(the repositories default to all those checked '
+                             'before). No token is needed.')
 
     parser.add_argument('--dry-run', action='store_true',
                         help='Run the script but do not actually send '
                              'any invitations. The *only* action skipped '
                              'is sending the invitations.')
 
+    parser.add_argument('--retry-unsent', action='store_true',
+                        help='Instead of checking repositories, send the '
+                             'invitations which a previous run could not '
+                             'send, as recorded in the journal of invitations.')
+
+    parser.add_argument('--watch', metavar='QUEUE_DIR',
+                        help='Run as a daemon which invites the authors of '
+                             'pull requests as they are merged, reading the '
+                             'pull_request webhook deliveries from this queue '
+                             'directory (see webhook_queue.py).')
+
+    parser.add_argument('--listen', metavar='[HOST:]PORT',
+                        help='With --watch, also receive the webhook '
+                             'deliveries over HTTP on this port. Set '
+                             'GITHUB_WEBHOOK_SECRET to check their signatures.')
+
+    parser.add_argument('--jobs', '-j', type=int, default=MAX_WORKERS,
+                        help='Number of repositories to process at the same '
+                             f'time. Default is {MAX_WORKERS}.')
+
+    parser.add_argument('--snapshot-ttl', type=float, default=DEFAULT_TTL / 3600,
+                        help='Age, in hours, after which the cached members, '
+                             'blocked users and invitations of the organization '
+                             f'are fetched again. Default is {DEFAULT_TTL // 3600}.')
+
+    parser.add_argument('--refresh-snapshot', action='store_true',
+                        help='Fetch the members, blocked users and invitations '
+                             'of the organization even if the cached ones are '
+                             'recent.')
+
+    parser.add_argument('--ledger',
+                        help='SQLite database in which merged pull requests '
+                             'are counted between runs, so that only the ones '
+                             'merged since the previous run are fetched. '
+                             'Default is $ASTROPY_TOOLS_LEDGER or '
+                             '~/.cache/astropy-tools/contributors.sqlite.')
+
     parser.add_argument('--verbose', '-v', action='store_true',
                         help='Display more output while running.')
 
     parser.add_argument('--other-bots', nargs='+',
                         help="GitHub names of bot accounts that do NOT end with '[bot]'")
 
-    args = parser.parse_args()
+    # The repositories can be given after the options, as with nargs="+"
+    args = parser.parse_intermixed_args()
+
+    if not args.simulate and max(len(args.num_pr), len(args.date),
+                                 len(args.min_invite_gap)) > 1:
+        parser.error('several values of --num-pr, --date and --min-invite-gap '
+                     'can only be given with --simulate')
+
+    if args.simulate:
+        if args.all_repos or args.retry_unsent:
+            parser.error('--simulate cannot be used with --all-repos or --retry-unsent')
+        simulate(args.organization, args)
+        sys.exit()
+
+    if bool(args.repos) + args.all_repos + args.retry_unsent + bool(args.watch) != 1:
+        parser.error('give either one or more repositories, --all-repos, --retry-unsent '
+                     'or --watch')
+
+    if args.listen and not args.watch:
+        parser.error('--listen can only be used with --watch')
 
     token = os.getenv('ORG_INVITE_TOKEN', None)
     if token is None:
@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+"""
+Single entry point for the tools in this repository.
+
+Each subcommand runs one of the scripts in this repository in the current
+process, passing it the remaining command line arguments, e.g.::
+
+    python astropy_tools.py next-pr astropy/astropy
+    python astropy_tools.py consistency astropy/astropy --output consistency.html
+
+Several subcommands can be chained with ``+``, in which case they run one
+after the other in the same process, so that modules, HTTP sessions and
+caches are only set up once::
+
+    python astropy_tools.py next-pr astropy/astropy + invite --dry-run astropy astropy
+
+The scripts are only imported when their subcommand is run.
+
+With ``--metrics DIR``, spans and counters for HTTP requests, subprocesses
+and the main stages of each tool are written to ``DIR`` as JSON metrics and
+a Chrome trace (see ``instrumentation.py``), and ``--profile`` additionally
+records a cProfile profile and a tracemalloc snapshot::
+
+    python astropy_tools.py --profile --metrics profile/ consistency astropy/astropy
+"""
+
+import os
+import sys
+import runpy
+import argparse
+import contextlib
+
+import instrumentation
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+CHAIN_SEPARATOR = '+'
+
+DEFAULT_PROFILE_DIR = 'astropy-tools-profile'
+
+# Subcommands that run a single script, given as (script, help)
+SCRIPTS = {
+    'invite': ('add_contributors_to_org.py',
+               'Invite contributors with merged PRs to the GitHub organization'),
+    'next-pr': ('next_pr_number.py',
+                'Find the next PR number for a repository'),
+    'usage': (os.path.join('astropy_usage', 'astropy_usage.py'),
+              'Collect usage statistics for astropy from GitHub and PyPI'),
+    'certs': (os.path.join('astropy_certificates', 'scripts', 'certificates.py'),
+              'Generate workshop certificates'),
+}
+
+CONSISTENCY_STAGES = [os.path.join('pr_consistency', '1.get_merged_prs.py'),
+                      os.path.join('pr_consistency', '2.find_pr_branches.py'),
+                      os.path.join('pr_consistency', '3.find_pr_changelog_section.py'),
+                      os.path.join('pr_consistency', '4.check_consistency.py')]
+
+PLOTS = {'status': os.path.join('visualizations_demographics', 'astropy_status_plots.py'),
+         'cites': os.path.join('visualizations_demographics', 'cites_and_mentions.py')}
+
+COMMANDS = {
+    'consistency': 'Run the PR consistency check scripts in pr_consistency',
+    'plots': 'Make the demographics plots in visualizations_demographics',
+}
+COMMANDS.update({name: help for name, (script, help) in SCRIPTS.items()})
+
+
+def run_script(script, args):
+    """
+    Run one of the scripts in this repository as ``__main__`` with the given
+    arguments, as if it had been run from the command line.
+
+    Returns the exit code of the script.
+    """
+
+    path = os.path.join(ROOT, script)
+    directory = os.path.dirname(path)
+
+    old_argv = sys.argv
+    sys.argv = [path] + list(args)
+    sys.path.insert(0, directory)
+    try:
+        with instrumentation.span('script', script=script):
+            runpy.run_path(path, run_name='__main__')
+    except SystemExit as exc:
+        if exc.code is None:
+            return 0
+        elif isinstance(exc.code, int):
+            return exc.code
+        else:
+            print(exc.code, file=sys.stderr)
+            return 1
+    finally:
+        sys.argv = old_argv
+        sys.path.remove(directory)
+
+    return 0
+
+
+def run_consistency(args):
+
+    parser = argparse.ArgumentParser(prog='astropy_tools.py consistency',
+                                     description=COMMANDS['consistency'])
+    parser.add_argument('repository', default='astropy/astropy', nargs='?',
+                        help='the repository to check (default is "astropy/astropy")')
+    parser.add_argument('changelog', default='CHANGES.rst', nargs='?',
+                        help='the name of the changelog file (default is "CHANGES.rst")')
+    parser.add_argument('--output', '-o',
+                        help='file to write the report to (default is standard output)')
+    parser.add_argument('--stages', default='1234',
+                        help='which stages to run (default is "1234")')
+    args = parser.parse_args(args)
+
+    stage_args = {'1': [args.repository],
+                  '2': [args.repository],
+                  '3': [args.repository, args.changelog],
+                  '4': [args.repository]}
+
+    for stage in args.stages:
+        script = CONSISTENCY_STAGES[int(stage) - 1]
+        if stage == '4' and args.output:
+            with open(args.output, 'w') as f, contextlib.redirect_stdout(f):
+                status = run_script(script, stage_args[stage])
+        else:
+            status = run_script(script, stage_args[stage])
+        if status:
+            return status
+
+    return 0
+
+
+def run_plots(args):
+
+    parser = argparse.ArgumentParser(prog='astropy_tools.py plots',
+                                     description=COMMANDS['plots'])
+    parser.add_argument('kind', choices=sorted(PLOTS),
+                        help='which set of plots to make')
+    args, extra = parser.parse_known_args(args)
+
+    return run_script(PLOTS[args.kind], extra)
+
+
+def split_chain(argv):
+    """
+    Split the command line into a list of (subcommand, arguments).
+    """
+    chain = [[]]
+    for arg in argv:
+        if arg == CHAIN_SEPARATOR:
+            chain.append([])
+        else:
+            chain[-1].append(arg)
+    return [(args[0], args[1:]) for args in chain if args]
+
+
+def main(argv=None):
+
+    if argv is None:
+        argv = sys.argv[1:]
+
+    epilog = 'subcommands:\n' + '\n'.join(f'  {name:<12} {help}'
+                                          for name, help in sorted(COMMANDS.items()))
+    epilog += (f'\n\nSeveral subcommands can be chained with "{CHAIN_SEPARATOR}" to '
+               'run them in a single process.')
+
+    parser = argparse.ArgumentParser(prog='astropy_tools.py',
+                                     description='Tools used by the Astropy project.',
+                                     epilog=epilog,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--metrics', metavar='DIR',
+                        help='write metrics and a Chrome trace to this directory')
+    parser.add_argument('--profile', action='store_true',
+                        help='also write a cProfile profile and a tracemalloc snapshot '
+                             f'(to --metrics, or {DEFAULT_PROFILE_DIR} by default)')
+    parser.add_argument('command', choices=sorted(COMMANDS), metavar='subcommand',
+                        help='the subcommand to run (see below)')
+    parser.add_argument('args', nargs=argparse.REMAINDER,
+                        help='arguments passed to the subcommand')
+
+    # Options which apply to the whole chain come before the first subcommand
+    options = argparse.ArgumentParser(add_help=False, allow_abbrev=False)
+    options.add_argument('--metrics')
+    options.add_argument('--profile', action='store_true')
+    first = next((i for i, arg in enumerate(argv) if arg in COMMANDS), len(argv))
+    options, extra = options.parse_known_args(argv[:first])
+    if extra:
+        parser.parse_args(extra)
+    argv = argv[first:]
+
+    if options.profile:
+        instrumentation.enable(options.metrics or DEFAULT_PROFILE_DIR, profile=True)
+    elif options.metrics:
+        instrumentation.enable(options.metrics)
+
+    chain = split_chain(argv)
+    if not chain:
+        parser.print_help()
+        return 1
+
+    # Validate the whole chain before running anything
+    for command, args in chain:
+        parser.parse_args([command])
+
+    for command, args in chain:
+        if command == 'consistency':
+            status = run_consistency(args)
+        elif command == 'plots':
+            status = run_plots(args)
+        else:
+            status = run_script(SCRIPTS[command][0], args)
+        if status:
+            return status
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
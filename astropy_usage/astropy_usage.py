@@ -1,97 +1,220 @@
+import os
 import sys
-import time
-import pickle
+import json
+import argparse
 import requests
 
-from github import Github, GithubException
-
 from common import get_credentials
+from github_client import get_client
+from pypi_index import PyPIIndex
 
-step_size = 100
 search_phrase = '"from astropy" import OR "import astropy"'
 
+# GitHub only returns the first 1000 results of a search, and only indexes
+# files smaller than 384 KB.
+SEARCH_RESULT_CAP = 1000
+MAX_FILE_SIZE = 384 * 1024
+
+# The searches are split by file size into ranges with about this many
+# results, so that a range is rarely over the cap and its results take few
+# pages.
+TARGET_RESULTS = 900
+PER_PAGE = 100
+
+parser = argparse.ArgumentParser(description='Collect usage statistics for astropy from '
+                                             'GitHub and PyPI.')
+parser.add_argument('journal', nargs='?', default='usage_journal.jsonl',
+                    help='the journal in which the progress is recorded, to resume '
+                         'an interrupted run (default is "usage_journal.jsonl")')
+parser.add_argument('--reverse-deps', metavar='DUMP',
+                    help='instead of searching GitHub, find the projects on PyPI '
+                         'which depend on astropy from a local dump of their metadata '
+                         '(JSON Lines, optionally gzipped, or SQLite; see '
+                         'reverse_dependencies.py)')
+parser.add_argument('--project', default='astropy',
+                    help='with --reverse-deps, the project to find the reverse '
+                         'dependencies of (default is "astropy")')
+parser.add_argument('--include-extras', action='store_true',
+                    help='with --reverse-deps, also count requirements which only '
+                         'apply to an extra')
+parser.add_argument('--all-releases', action='store_true',
+                    help='with --reverse-deps, count the requirements of every release '
+                         'rather than only of the latest one')
+parser.add_argument('--jobs', '-j', type=int,
+                    help='with --reverse-deps, the number of processes parsing the '
+                         'dump (default is one per CPU)')
+parser.add_argument('--output', '-o',
+                    help='with --reverse-deps, a CSV file to write the reverse '
+                         'dependencies and their depth to')
+args = parser.parse_args()
+
+if args.reverse_deps:
+    from reverse_dependencies import main
+    main(args.reverse_deps, project=args.project, include_extras=args.include_extras,
+         all_releases=args.all_releases, jobs=args.jobs, output=args.output)
+    sys.exit(0)
+
 username, password = get_credentials()
 
-gh = Github(username, password)
-total_repo = gh.search_code(search_phrase).totalCount
+client = get_client(auth=(username, password))
+
+
+def search(size_range=None, per_page=PER_PAGE):
+    """
+    Search for files importing astropy, optionally within a range of sizes
+    (inclusive), and return the response for the first page.
+    """
+    query = search_phrase
+    if size_range is not None:
+        query += ' size:{}..{}'.format(*size_range)
+    response = client.get('search/code', params={'q': query, 'per_page': per_page})
+    response.raise_for_status()
+    return response
+
+
+def partition_sizes(start=0, width=100):
+    """
+    Split the file sizes from ``start`` up into consecutive ranges with fewer
+    than ``SEARCH_RESULT_CAP`` results each, and yield each range with its
+    number of results and the response for its first page.
+
+    The width of each range is adapted from the density of results in the
+    previous one: a range with too many results is narrowed (bisected, or
+    more if it is far over the cap) and searched again, and after a sparse
+    range the next one is widened, so that sparse sizes are merged into few
+    searches. Sizes with more results than the cap on their own are yielded
+    anyway, and only their first results can be collected.
+    """
+
+    lo = start
+
+    while lo <= MAX_FILE_SIZE:
+
+        hi = min(lo + width - 1, MAX_FILE_SIZE)
+        response = search((lo, hi))
+        total = response.json()['total_count']
+
+        if total > SEARCH_RESULT_CAP and hi > lo:
+            width = max(1, min(width // 2, width * TARGET_RESULTS // total))
+            continue
+
+        yield (lo, hi), total, response
+
+        lo = hi + 1
+        # Do not widen too much at once, since the density of results can
+        # change quickly
+        width = max(1, min(width * 4, width * TARGET_RESULTS // max(total, 1)))
+
+
+total_repo = search(per_page=1).json()['total_count']
+
+
+# The progress is recorded in an append-only journal, one JSON object per
+# line: a "range" entry with the new repositories found once each size range
+# has been searched. A previous run is resumed by replaying the journal.
+journal_filename = args.journal
 
 
-if len(sys.argv) > 1:
-    filename = sys.argv[1]
-    print("Loading previous results from {}".format(filename))
-    with open(filename, 'rb') as f:
-        saved_results = pickle.load(f)
-    step, queried_results, gh_repo, gh_name, missed_results = saved_results
-else:
-    step = 0
-    queried_results = 0
-    gh_repo = set()
-    gh_name = set()
-    missed_results = 0
+def replay(filename):
+    """
+    Return the entries in the journal, ignoring an incomplete last line left
+    by a run that was interrupted while writing it.
+    """
+    entries = []
+    if os.path.exists(filename):
+        with open(filename) as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    continue
+    return entries
+
+
+next_size = 0
+queried_results = 0
+gh_repo = set()
+missed_results = 0
+
+entries = replay(journal_filename)
+if entries:
+    print("Resuming from {} entries in {}".format(len(entries), journal_filename))
+
+for entry in entries:
+    if entry['type'] == 'range':
+        next_size = entry['hi'] + 1
+        queried_results += entry['results']
+        missed_results += entry['missed']
+        gh_repo.update(entry['repos'])
+
+gh_name = {gh_full_name.split('/')[-1] for gh_full_name in gh_repo}
+
+# Make sure that new entries start on a new line, even after an incomplete
+# last line
+if os.path.exists(journal_filename) and os.path.getsize(journal_filename):
+    with open(journal_filename, 'rb') as f:
+        f.seek(-1, os.SEEK_END)
+        complete = f.read() == b'\n'
+    if not complete:
+        with open(journal_filename, 'a') as f:
+            f.write('\n')
+
+# Line buffered, so that each entry is written as soon as it is recorded
+journal = open(journal_filename, 'a', buffering=1)
+
+
+def record(**entry):
+    journal.write(json.dumps(entry) + '\n')
+
 
 print("Total number of search results: {}".format(total_repo))
 
 
-# We need to limit the search by repo size as the results are limited to 1000.
+# We need to limit the search by file size as the results are limited to 1000.
 # (and astropy is imported in 58K+ repositories.
 
-while queried_results + missed_results < total_repo:
-    queried_results_rollback = queried_results
-    gh_search_result = gh.search_code('{} size:{}..{}'.format(
-        search_phrase, step * step_size, (step + 1) * step_size))
-    current_total = gh_search_result.totalCount
+for (lo, hi), current_total, response in partition_sizes(start=next_size):
 
-    if current_total > 1000:
-        print("Use smaller step_size total count is {} for size {}..{}".format(
-            current_total, step * step_size, (step + 1) * step_size))
-        missed_results += current_total - 1000
+    missed = 0
+    if current_total > SEARCH_RESULT_CAP:
+        print("More than {} results ({}) for files of size {}, some will be missed".format(
+            SEARCH_RESULT_CAP, current_total, lo))
+        missed = current_total - SEARCH_RESULT_CAP
+
+    results = 0
+    new_repos = []
 
     try:
-        for i in gh_search_result:
-            gh_full_name = i.repository.full_name
-            gh_repo.add(gh_full_name)
-            gh_name.add(gh_full_name.split('/')[-1])
-            queried_results += 1
-            # This is an ugly hack to work around the API limits
-            time.sleep(0.4)
-    except GithubException:
-        print("Finished search up until step {} for a total of {} repos. "
+        # Pages are requested one at a time, as GitHub discourages
+        # concurrent searches. The requests are paced by the rate limit
+        # broker from the X-RateLimit-* and Retry-After headers, so they are
+        # only delayed once the search budget is exhausted.
+        for i in client.paginate('search/code', items_key='items', prefetch=0,
+                                 response=response):
+            gh_full_name = i['repository']['full_name']
+            if gh_full_name not in gh_repo:
+                gh_repo.add(gh_full_name)
+                gh_name.add(gh_full_name.split('/')[-1])
+                new_repos.append(gh_full_name)
+            results += 1
+    except requests.RequestException:
+        print("Finished search up until size {} for a total of {} repos. "
               "Search failed after the {}th repo.".format(
-                  step, queried_results_rollback, queried_results))
-        queried_results = queried_results_rollback
-        with open('usage_results.pkl', 'wb') as f:
-            results = (step, queried_results, gh_repo, gh_name, missed_results)
-            pickle.dump(results, f)
+                  lo, queried_results, queried_results + results))
         raise
 
-    step += 1
-
-    # save partial results at each step
-    with open('usage_results.pkl', 'wb') as f:
-        results = (step, queried_results, gh_repo, gh_name, missed_results)
-        pickle.dump(results, f)
-
-    time.sleep(30)
-
-
-pypi_name = set()
-checked_names = set()
+    # Only the repositories found in this range are recorded, and the range
+    # is searched again on resume if the run stops before this.
+    record(type='range', lo=lo, hi=hi, results=results, missed=missed, repos=new_repos)
+    queried_results += results
+    missed_results += missed
 
-for i, name in enumerate(gh_name):
-    response = requests.get("http://pypi.python.org/pypi/{}/json".format(name))
-    if response.status_code == 200:
-        pypi_name.add(name)
-    checked_names.add(name)
 
-    # Save partial results
-    if i % 500 == 0:
-        with open('pypi_results.pkl', 'wb') as f:
-            results = (pypi_name, checked_names)
-            pickle.dump(results, f)
+journal.close()
 
-with open('pypi_results.pkl', 'wb') as f:
-    results = (pypi_name, checked_names)
-    pickle.dump(results, f)
+# The names are matched against a local index of all the projects on PyPI,
+# which is only downloaded again once a day.
+pypi_name = PyPIIndex().matching(gh_name)
 
 print("Unique GitHub repos: {}\n"
       "Projects on PyPI: {}\n".format(
@@ -0,0 +1 @@
+../instrumentation.py
\ No newline at end of file
@@ -0,0 +1,371 @@
+"""
+Reverse dependencies of a project, from a local dump of PyPI metadata.
+
+Code search only finds the repositories which import astropy, up to the
+limits of the search. The packages on PyPI which depend on astropy can
+instead be found from their metadata, without any network access, given a
+dump of the ``requires_dist`` of each release (for instance exported from
+the public PyPI dataset on BigQuery) either as:
+
+* a JSON Lines file (optionally gzipped) with one release per line, as an
+  object with the ``name``, ``version`` and ``requires_dist`` (a list of
+  requirement strings) and optionally the ``upload_time`` of the release;
+* or a SQLite database with a table with the same columns, in which
+  ``requires_dist`` is a JSON list or one requirement per line.
+
+Only the latest release of each project is used (the one uploaded last, or
+the last in the dump if the upload times are not given), unless
+``all_releases`` is set in which case a project depends on everything any of
+its releases ever required. Requirements that only apply to an extra (such
+as ``astropy; extra == "all"``) are left out unless ``include_extras`` is
+set.
+
+The requirements are parsed by a pool of processes, and the dependency graph
+is kept in compressed sparse row form in arrays of integers, so that dumps
+with hundreds of thousands of releases can be processed in minutes.
+"""
+
+import os
+import re
+import gzip
+import json
+import sqlite3
+from array import array
+from collections import deque
+from functools import lru_cache
+from itertools import islice
+import multiprocessing
+
+from pypi_index import normalize
+
+# Size of the parts of the dump parsed by each worker process at a time, in
+# bytes for a JSON Lines file and in releases otherwise
+CHUNK_BYTES = 16 * 1024 * 1024
+CHUNK_SIZE = 50000
+
+# The name at the start of a requirement (PEP 508)
+REQUIREMENT_NAME = re.compile(r'\s*([A-Za-z0-9](?:[A-Za-z0-9._-]*[A-Za-z0-9])?)')
+
+EXTRA_MARKER = re.compile(r'\bextra\s*==')
+
+# The same few thousand names make up most of the requirements
+_normalize = lru_cache(maxsize=100000)(normalize)
+
+
+def parse_requirements(requires_dist, include_extras=False):
+    """
+    Return the normalized names of the projects in a list of requirement
+    strings (or a single requirement string), as a sorted tuple.
+    """
+    if isinstance(requires_dist, str):
+        # A single requirement rather than a list
+        requires_dist = [requires_dist]
+    dependencies = set()
+    for requirement in requires_dist or ():
+        if not isinstance(requirement, str):
+            continue
+        requirement, _, marker = requirement.partition(';')
+        if not include_extras and EXTRA_MARKER.search(marker):
+            continue
+        match = REQUIREMENT_NAME.match(requirement)
+        if match:
+            dependencies.add(_normalize(match.group(1)))
+    return tuple(sorted(dependencies))
+
+
+def _json_releases(lines, include_extras):
+    for line in lines:
+        try:
+            release = json.loads(line)
+        except ValueError:
+            continue
+        if not isinstance(release, dict) or not release.get('name'):
+            continue
+        yield (normalize(release['name']), str(release.get('upload_time') or ''),
+               parse_requirements(release.get('requires_dist'), include_extras))
+
+
+def _row_releases(rows, include_extras):
+    for name, upload_time, requires_dist in rows:
+        if not name:
+            continue
+        if isinstance(requires_dist, str):
+            requires_dist = requires_dist.strip()
+            if requires_dist.startswith('['):
+                try:
+                    requires_dist = json.loads(requires_dist)
+                except ValueError:
+                    continue
+            else:
+                requires_dist = requires_dist.splitlines()
+        yield (normalize(name), str(upload_time or ''),
+               parse_requirements(requires_dist, include_extras))
+
+
+def _merge(projects, releases, all_releases):
+    """
+    Add releases, given as ``(name, upload_time, requires)``, to a
+    dictionary giving the upload time and requirements of each project.
+    """
+    for name, upload_time, requires in releases:
+        previous = projects.get(name)
+        if all_releases:
+            if previous is not None:
+                requires = previous[1].union(requires)
+            projects[name] = (upload_time, frozenset(requires))
+        elif previous is None or upload_time >= previous[0]:
+            projects[name] = (upload_time, requires)
+    return projects
+
+
+def _lines_in_range(path, start, stop):
+    # A line belongs to the range in which it starts
+    with open(path, 'rb') as f:
+        if start:
+            f.seek(start - 1)
+            f.readline()
+        position = f.tell()
+        while position < stop:
+            line = f.readline()
+            if not line:
+                break
+            position += len(line)
+            yield line
+
+
+def _rows_in_range(path, query, start, stop):
+    connection = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        yield from connection.execute(query, (start, stop))
+    finally:
+        connection.close()
+
+
+def _parse(task):
+    """
+    Parse a part of the dump, and return its latest release of each project
+    (or the union of its releases), so that the workers send back as little
+    as possible.
+    """
+    kind, source, include_extras, all_releases = task
+    if kind == 'lines':
+        releases = _json_releases(source, include_extras)
+    elif kind == 'range':
+        releases = _json_releases(_lines_in_range(*source), include_extras)
+    else:
+        releases = _row_releases(_rows_in_range(*source), include_extras)
+    projects = _merge({}, releases, all_releases)
+    return [(name, upload_time, requires) for name, (upload_time, requires) in projects.items()]
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _sqlite_tasks(path):
+    connection = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        tables = [row[0] for row in connection.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table'")]
+        for table in tables:
+            columns = {row[1] for row in connection.execute(f'PRAGMA table_info("{table}")')}
+            if {'name', 'requires_dist'} <= columns:
+                break
+        else:
+            raise ValueError(f'No table with name and requires_dist columns in {path}')
+        first, last = connection.execute(f'SELECT MIN(rowid), MAX(rowid) FROM "{table}"').fetchone()
+    finally:
+        connection.close()
+    if first is None:
+        return
+    upload_time = 'upload_time' if 'upload_time' in columns else 'NULL'
+    query = (f'SELECT name, {upload_time}, requires_dist FROM "{table}" '
+             'WHERE rowid >= ? AND rowid < ? ORDER BY rowid')
+    for start in range(first, last + 1, CHUNK_SIZE):
+        yield path, query, start, start + CHUNK_SIZE
+
+
+def _context():
+    # The worker processes are forked where possible, since the other start
+    # methods run the main module again, which for astropy_usage.py would
+    # start the code search.
+    if 'fork' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('fork')
+    return multiprocessing.get_context()
+
+
+def is_sqlite(path):
+    """
+    Whether a file is a SQLite database, rather than a JSON Lines file.
+    """
+    with open(path, 'rb') as f:
+        return f.read(16) == b'SQLite format 3\x00'
+
+
+def read_dump(path, include_extras=False, all_releases=False, jobs=None):
+    """
+    Read a dump of PyPI metadata and return a dictionary giving for each
+    project the names of the projects it depends on.
+
+    The dump is split into parts (ranges of bytes in a JSON Lines file, or
+    of rows in a SQLite database) which are read and parsed in ``jobs``
+    processes (by default one per CPU), or in this process if ``jobs`` is 1.
+    A gzipped file can only be read from the start, so its lines are read
+    in this process and sent to the others.
+    """
+
+    if is_sqlite(path):
+        tasks = (('rows', source) for source in _sqlite_tasks(path))
+        lines = None
+    elif path.endswith('.gz'):
+        lines = gzip.open(path, 'rb')
+        tasks = (('lines', chunk) for chunk in _chunks(lines, CHUNK_SIZE))
+    else:
+        size = os.path.getsize(path)
+        tasks = (('range', (path, start, min(start + CHUNK_BYTES, size)))
+                 for start in range(0, size, CHUNK_BYTES))
+        lines = None
+
+    tasks = ((kind, source, include_extras, all_releases) for kind, source in tasks)
+    projects = {}
+
+    try:
+        if jobs == 1:
+            for task in tasks:
+                _merge(projects, _parse(task), all_releases)
+        else:
+            # The parts are merged in order, so that the last release in the
+            # dump wins when the upload times are not given.
+            with _context().Pool(jobs) as pool:
+                for part in pool.imap(_parse, tasks):
+                    _merge(projects, part, all_releases)
+    finally:
+        if lines is not None:
+            lines.close()
+
+    return {name: requires for name, (upload_time, requires) in projects.items()}
+
+
+class DependencyGraph:
+    """
+    The graph of the dependencies between projects, stored to look up the
+    projects which depend on a given one.
+
+    Each project is given an integer ID, and the IDs of the projects which
+    depend on each project are stored consecutively in a single array, with
+    the offset of the list for each project in another array (compressed
+    sparse row form).
+
+    Parameters
+    ----------
+    dependencies : dict
+        The names of the projects that each project depends on, as returned
+        by `read_dump`.
+    """
+
+    def __init__(self, dependencies):
+
+        self.ids = {}
+        self.names = []
+
+        # The edges, from each dependency to the project depending on it
+        sources = array('l')
+        targets = array('l')
+        for name, requires in dependencies.items():
+            dependent = self._id(name)
+            for requirement in requires:
+                if requirement != name:
+                    sources.append(self._id(requirement))
+                    targets.append(dependent)
+
+        self.offsets = array('l', [0]) * (len(self.names) + 1)
+        for dependency in sources:
+            self.offsets[dependency + 1] += 1
+        for i in range(1, len(self.offsets)):
+            self.offsets[i] += self.offsets[i - 1]
+
+        self.dependents = array('l', [0]) * len(sources)
+        position = self.offsets[:-1]
+        for dependency, dependent in zip(sources, targets):
+            self.dependents[position[dependency]] = dependent
+            position[dependency] += 1
+
+    def _id(self, name):
+        if name not in self.ids:
+            self.ids[name] = len(self.names)
+            self.names.append(name)
+        return self.ids[name]
+
+    def __len__(self):
+        return len(self.names)
+
+    def direct_dependents(self, name):
+        """
+        Return the names of the projects which depend on a project.
+        """
+        i = self.ids.get(normalize(name))
+        if i is None:
+            return []
+        return [self.names[j] for j in self.dependents[self.offsets[i]:self.offsets[i + 1]]]
+
+    def reverse_dependencies(self, name, max_depth=None):
+        """
+        Return a dictionary giving the depth of each project which depends on
+        a project, directly (depth 1) or through other projects, up to
+        ``max_depth``.
+        """
+
+        start = self.ids.get(normalize(name))
+        if start is None:
+            return {}
+
+        depths = array('l', [-1]) * len(self.names)
+        depths[start] = 0
+        queue = deque([start])
+
+        while queue:
+            i = queue.popleft()
+            if max_depth is not None and depths[i] >= max_depth:
+                continue
+            for j in self.dependents[self.offsets[i]:self.offsets[i + 1]]:
+                if depths[j] < 0:
+                    depths[j] = depths[i] + 1
+                    queue.append(j)
+
+        return {self.names[i]: depth for i, depth in enumerate(depths) if depth > 0}
+
+
+def write_report(filename, depths):
+    """
+    Write the reverse dependencies to a CSV file, nearest first.
+    """
+    with open(filename, 'w') as f:
+        f.write('project,depth\n')
+        for name, depth in sorted(depths.items(), key=lambda item: (item[1], item[0])):
+            f.write(f'{name},{depth}\n')
+
+
+def main(dump, project='astropy', include_extras=False, all_releases=False,
+         jobs=None, output=None):
+
+    if not os.path.exists(dump):
+        raise SystemExit(f'{dump} does not exist')
+
+    dependencies = read_dump(dump, include_extras=include_extras,
+                             all_releases=all_releases, jobs=jobs)
+    graph = DependencyGraph(dependencies)
+    depths = graph.reverse_dependencies(project)
+
+    print("Projects in the dump: {}\n"
+          "Direct reverse dependencies of {}: {}\n"
+          "Transitive reverse dependencies of {}: {}".format(
+              len(dependencies), project, sum(depth == 1 for depth in depths.values()),
+              project, len(depths)))
+
+    if output:
+        write_report(output, depths)
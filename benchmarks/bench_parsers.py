@@ -0,0 +1,163 @@
+"""
+Benchmarks for the parsers in visualizations_demographics and
+discontinued_usage.
+"""
+
+import io
+import os
+import json
+import random
+import shutil
+import tempfile
+import contextlib
+from datetime import datetime, timedelta
+
+from .source import load_module
+
+ISO_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+
+def make_numstat_log(n_commits, seed=1):
+    """
+    Output of ``git log --numstat --format=format:"COMMIT,%H,%at,%aN"``.
+    """
+
+    rng = random.Random(seed)
+    timestamp = 1300000000
+
+    commits = []
+    for i in range(n_commits):
+        timestamp += rng.randint(60, 20000)
+        files = []
+        for _ in range(rng.choice([1, 1, 2, 3, 8])):
+            if rng.random() < 0.02:
+                files.append(f'-\t-\tdocs/image{i}.png')
+            else:
+                files.append(f'{rng.randint(0, 200)}\t{rng.randint(0, 100)}\t'
+                             f'astropy/module{rng.randrange(50)}/file{rng.randrange(20)}.py')
+        commits.append(f'COMMIT,{i:040x},{timestamp},Author {rng.randrange(500)}\n' +
+                       '\n'.join(files) + '\n')
+
+    return '\n'.join(reversed(commits))
+
+
+def make_issues(n_issues, seed=1):
+    """
+    Issues or pull requests as returned by the GitHub REST API (only the keys
+    that are used).
+    """
+
+    rng = random.Random(seed)
+    start = datetime(2012, 1, 1)
+
+    issues = []
+    for number in range(n_issues):
+        created = start + timedelta(hours=number)
+        closed = created + timedelta(days=rng.randint(0, 100)) if rng.random() < 0.8 else None
+        merged = closed if closed and rng.random() < 0.7 else None
+        issues.append({'number': number,
+                       'created_at': created.strftime(ISO_FORMAT),
+                       'closed_at': closed.strftime(ISO_FORMAT) if closed else None,
+                       'merged_at': merged.strftime(ISO_FORMAT) if merged else None,
+                       'user': {'id': rng.randrange(2000)} if rng.random() < 0.99 else None})
+
+    return issues
+
+
+def make_rst(n_sections, seed=1):
+    """
+    An RST document with nested sections using a mix of header characters.
+    """
+
+    rng = random.Random(seed)
+    chars = '#*=-^'
+
+    lines = []
+    level = 0
+    for i in range(n_sections):
+        level = rng.randint(1, min(level + 1, len(chars) - 1)) if i else 0
+        title = f'Section {i}'
+        underline = chars[level] * (len(title) + 2)
+        if level == 0:
+            lines.append(underline)
+        lines += [title, underline, '', 'Some text in this section.', '']
+
+    return '\n'.join(lines) + '\n'
+
+
+class ParseGitLog:
+    """
+    Parsing the ``git log`` statistics used for the demographics plots.
+    """
+
+    params = [1000, 10000, 100000]
+    param_names = ['commits']
+
+    def setup(self, n_commits):
+        self.module = load_module(os.path.join('visualizations_demographics',
+                                               'astropy_status_plots.py'))
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, 'gitlogstats')
+        with open(self.filename, 'w') as f:
+            f.write(make_numstat_log(n_commits))
+
+    def teardown(self, n_commits):
+        shutil.rmtree(self.tmpdir)
+
+    def time_parse_git_log(self, n_commits):
+        self.module.parse_git_log(self.filename, cumlines=True)
+
+    def peakmem_parse_git_log(self, n_commits):
+        self.module.parse_git_log(self.filename, cumlines=True)
+
+
+class IssueReport:
+    """
+    Counting issues and pull requests opened and closed since a release.
+    """
+
+    params = [1000, 10000, 100000]
+    param_names = ['entries']
+
+    def setup(self, n_entries):
+        self.module = load_module(os.path.join('discontinued_usage', 'gh_issuereport.py'))
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, 'issues.json')
+        with open(self.filename, 'w') as f:
+            json.dump(make_issues(n_entries), f)
+        self.since = datetime(2013, 1, 1)
+
+    def teardown(self, n_entries):
+        shutil.rmtree(self.tmpdir)
+
+    def time_count_issues_since(self, n_entries):
+        self.module.count_issues_since(self.since, 'astropy/astropy', cacheto=self.filename)
+
+    def time_count_prs_since(self, n_entries):
+        self.module.count_prs_since(self.since, 'astropy/astropy', cacheto=self.filename)
+
+
+class ReplaceHeaderChars:
+    """
+    Normalizing the section header characters of an RST file.
+    """
+
+    params = [100, 1000, 10000]
+    param_names = ['sections']
+
+    def setup(self, n_sections):
+        self.module = load_module(os.path.join('discontinued_usage', 'unify_section_headings.py'))
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, 'index.rst')
+        self.content = make_rst(n_sections)
+
+    def teardown(self, n_sections):
+        shutil.rmtree(self.tmpdir)
+
+    def time_replace_header_chars(self, n_sections):
+        # The file is rewritten in place, so start from the original content
+        # each time
+        with open(self.filename, 'w') as f:
+            f.write(self.content)
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.module.replace_header_chars(self.filename)
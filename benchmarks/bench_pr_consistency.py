@@ -0,0 +1,160 @@
+"""
+Benchmarks for the parsing and checking loops of the pr_consistency scripts.
+"""
+
+import os
+import random
+from datetime import datetime, timedelta
+
+from .source import load_definitions
+
+BRANCHES = ['v3.0.x', 'v3.1.x', 'v3.2.x', 'v4.0.x', 'v4.1.x', 'v4.2.x',
+            'v4.3.x', 'v5.0.x', 'v5.1.x']
+
+SIZES = [1000, 10000, 100000]
+
+
+def make_git_log(n_commits, seed=1):
+    """
+    Output of ``git log`` for a branch with merge commits, backports and
+    ordinary commits.
+    """
+
+    rng = random.Random(seed)
+    date = datetime(2020, 1, 1)
+
+    commits = []
+    for i in range(n_commits):
+        date += timedelta(minutes=rng.randint(1, 600))
+        kind = rng.random()
+        if kind < 0.4:
+            message = (f'Merge pull request #{i} from user{i % 97}/feature-{i}\n\n'
+                       f'    Fix the handling of some edge case in module {i % 13}')
+            merge = f'Merge: {i:07x} {i + 1:07x}\n'
+        elif kind < 0.5:
+            message = f'Backport PR #{i}: Fix the handling of some edge case'
+            merge = ''
+        else:
+            message = f'Improve the documentation of function_{i}\n\n    Longer explanation.'
+            merge = ''
+        commits.append(f'commit {i:040x}\n{merge}Author: User {i % 97} <user{i % 97}@example.com>\n'
+                       f"Date:   {date.strftime('%a %b %d %H:%M:%S %Y')} +0000\n\n"
+                       f'    {message}\n')
+
+    return '\n'.join(reversed(commits))
+
+
+def make_changelog(n_entries, seed=1):
+    """
+    Lines of a changelog in the current format, with several pull requests
+    mentioned in some entries.
+    """
+
+    rng = random.Random(seed)
+
+    lines = []
+    number = 0
+    entries_per_version = 200
+    versions = max(1, n_entries // entries_per_version)
+
+    for v in range(versions, 0, -1):
+        heading = f'{v // 10}.{v % 10}.{rng.randint(0, 3)} ({2000 + v // 4}-01-01)'
+        lines += [heading + '\n', '=' * len(heading) + '\n', '\n']
+        for subpackage in ['astropy.io.fits', 'astropy.table', 'astropy.units']:
+            lines += [subpackage + '\n', '^' * len(subpackage) + '\n', '\n']
+            for _ in range(entries_per_version // 3):
+                number += 1
+                refs = ', '.join(f'#{number + k}' for k in range(rng.choice([1, 1, 1, 2])))
+                lines += ['- Fixed a bug in the handling of some input that could\n',
+                          f'  lead to a wrong result. [{refs}]\n', '\n']
+
+    return lines
+
+
+def make_pull_requests(n_prs, seed=1):
+    """
+    The inputs of ``check_pull_request`` for a set of pull requests.
+    """
+
+    rng = random.Random(seed)
+    labels = ['Bug', 'Docs', 'Affects-dev', 'no-changelog-entry-needed', 'table']
+
+    prs = []
+    for number in range(n_prs):
+        index = rng.randrange(len(BRANCHES))
+        milestone = f'{BRANCHES[index][:-2]}.{rng.randint(0, 2)}' if rng.random() < 0.9 else None
+        cl_version = milestone if milestone and rng.random() < 0.8 else None
+        branches = [branch for branch in BRANCHES[index:] if rng.random() < 0.95]
+        prs.append((str(number), rng.sample(labels, rng.randint(0, 2)), milestone,
+                    cl_version, branches,
+                    datetime(2020, 1, 1) + timedelta(hours=number)))
+
+    return prs
+
+
+class FindPRBranches:
+    """
+    The regular expression scan of ``git log`` for each branch.
+    """
+
+    params = SIZES
+    param_names = ['commits']
+
+    def setup(self, n_commits):
+        self.find_prs_in_log = load_definitions(os.path.join('pr_consistency', '2.find_pr_branches.py'),
+                                                ['find_prs_in_log'])['find_prs_in_log']
+        self.log = make_git_log(n_commits)
+
+    def time_find_prs_in_log(self, n_commits):
+        self.find_prs_in_log(self.log)
+
+
+class FindPRChangelogSection:
+    """
+    Parsing the changelog into the section of each pull request.
+    """
+
+    params = SIZES
+    param_names = ['entries']
+
+    def setup(self, n_entries):
+        namespace = load_definitions(os.path.join('pr_consistency', '3.find_pr_changelog_section.py'),
+                                     ['BLOCK_PATTERN', 'ISSUE_PATTERN', 'find_prs_in_changelog',
+                                      'find_changelog_sections'])
+        self.find_prs_in_changelog = namespace['find_prs_in_changelog']
+        self.find_changelog_sections = namespace['find_changelog_sections']
+        self.lines = make_changelog(n_entries)
+        self.content = ''.join(self.lines)
+
+    def time_find_prs_in_changelog(self, n_entries):
+        self.find_prs_in_changelog(self.content)
+
+    def time_find_changelog_sections(self, n_entries):
+        self.find_changelog_sections(self.lines)
+
+    def peakmem_find_changelog_sections(self, n_entries):
+        self.find_changelog_sections(self.lines)
+
+
+class CheckConsistency:
+    """
+    The checks run for each pull request.
+    """
+
+    params = SIZES
+    param_names = ['pull_requests']
+
+    def setup(self, n_prs):
+        namespace = load_definitions(os.path.join('pr_consistency', '4.check_consistency.py'),
+                                     ['parse_isoformat', 'VALID', 'CANTFIX', 'INVALID',
+                                      'BRANCH_CLOSED_DICT', 'EXPECTED_MISSING',
+                                      'REVERTED_FROM_BRANCH', 'check_pull_request'],
+                                     BRANCHES=BRANCHES, MANUAL_MERGES={})
+        namespace['BRANCH_CLOSED'] = namespace['BRANCH_CLOSED_DICT']['astropy/astropy']
+        self.check_pull_request = namespace['check_pull_request']
+        self.prs = make_pull_requests(n_prs)
+
+    def time_check_pull_request(self, n_prs):
+        check_pull_request = self.check_pull_request
+        for pr in self.prs:
+            check_pull_request(*pr)
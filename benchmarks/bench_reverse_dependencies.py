@@ -0,0 +1,68 @@
+"""
+Benchmarks for the reverse dependency analysis in astropy_usage.
+"""
+
+import os
+import json
+import random
+import shutil
+import tempfile
+
+from .source import load_module
+
+BASE_PROJECTS = ['astropy', 'numpy', 'scipy', 'matplotlib', 'requests', 'pyyaml']
+
+
+def make_metadata_dump(filename, n_projects, releases_per_project=5, seed=1):
+    """
+    A JSON Lines dump of the ``requires_dist`` of each release of
+    ``n_projects`` projects, in which each project depends on a few base
+    projects and on projects listed before it.
+    """
+
+    rng = random.Random(seed)
+    names = list(BASE_PROJECTS)
+
+    with open(filename, 'w') as f:
+        for i in range(n_projects):
+            name = f'Project_{i}'
+            requires = rng.sample(BASE_PROJECTS, rng.randint(0, 3))
+            requires += rng.sample(names, min(len(names), rng.randint(0, 3)))
+            for version in range(releases_per_project):
+                requires_dist = [f'{requirement}>=1.{version}' for requirement in requires]
+                if rng.random() < 0.2:
+                    requires_dist.append('astropy[all]; extra == "all"')
+                f.write(json.dumps({'name': name, 'version': f'1.{version}',
+                                    'upload_time': f'2020-01-{version + 1:02d}T00:00:00',
+                                    'requires_dist': requires_dist}) + '\n')
+            names.append(name)
+
+
+class ReverseDependencies:
+    """
+    Reading a dump of PyPI metadata and finding the reverse dependencies of
+    astropy.
+    """
+
+    params = [10000, 100000]
+    param_names = ['projects']
+    timeout = 600
+
+    def setup(self, n_projects):
+        self.module = load_module(os.path.join('astropy_usage', 'reverse_dependencies.py'))
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, 'releases.jsonl')
+        make_metadata_dump(self.filename, n_projects)
+        self.graph = self.module.DependencyGraph(self.module.read_dump(self.filename, jobs=1))
+
+    def teardown(self, n_projects):
+        shutil.rmtree(self.tmpdir)
+
+    def time_read_dump(self, n_projects):
+        self.module.read_dump(self.filename)
+
+    def time_build_graph(self, n_projects):
+        self.module.DependencyGraph(self.module.read_dump(self.filename))
+
+    def time_reverse_dependencies(self, n_projects):
+        self.graph.reverse_dependencies('astropy')
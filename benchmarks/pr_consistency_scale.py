@@ -0,0 +1,480 @@
+#!/usr/bin/env python
+"""
+End-to-end scale benchmark for the scripts in pr_consistency.
+
+This generates a synthetic repository and runs all four scripts against it,
+recording for each of them the wall time, the peak memory use, the number of
+subprocesses started and the number of API requests made. The data is
+generated deterministically from ``--seed``:
+
+* the merged pull requests are served by the stand-in server in ``standin``
+  (so no network access or token is needed);
+
+* bug fixes are milestoned for the latest maintenance branch at the time
+  they were merged;
+
+* a git repository is built with ``git fast-import``, with a merge commit on
+  ``main`` for each merged pull request, maintenance branches forked from
+  ``main`` at each release, backports of pull requests milestoned for a
+  maintenance branch (a fraction of which are missing or later reverted, so
+  that the consistency checks have something to report);
+
+* a changelog with an entry for most of the pull requests, in the section of
+  their milestone.
+
+The run fails (with a non-zero exit code) if any stage exceeds its
+thresholds. By default the number of API requests and subprocesses are
+checked against what the scripts need at the given scale. Limits on the other
+metrics can be given in a JSON file with ``--thresholds``, e.g.::
+
+    {"1": {"wall_time": 30}, "2": {"peak_rss_mb": 200}}
+
+or relative to the metrics of a previous run (saved with ``--output``) with
+``--baseline`` and ``--tolerance``::
+
+    python pr_consistency_scale.py --prs 20000 --output baseline.json
+    python pr_consistency_scale.py --prs 20000 --baseline baseline.json
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import subprocess
+from urllib.request import urlopen
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, os.path.join(ROOT, 'standin'))
+
+from standin_server import Datasets, VERSIONS, START_DATE, END_DATE, start_server  # noqa: E402
+
+REPOSITORY_NAME = 'standin/synthetic'
+
+STAGES = ['1.get_merged_prs.py',
+          '2.find_pr_branches.py',
+          '3.find_pr_changelog_section.py',
+          '4.check_consistency.py']
+
+METRICS = ['wall_time', 'peak_rss_mb', 'children_peak_rss_mb', 'subprocesses', 'api_calls']
+
+# Metrics which are compared to the baseline with --baseline. The counts are
+# instead checked exactly against what is expected at the given scale.
+TIMING_METRICS = ['wall_time', 'peak_rss_mb', 'children_peak_rss_mb']
+
+# Differences from the baseline smaller than this are always allowed, since
+# they are within the noise for short stages.
+BASELINE_SLACK = {'wall_time': 0.5, 'peak_rss_mb': 5, 'children_peak_rss_mb': 5}
+
+# Small script used to run each stage, which counts the subprocesses started
+# through an audit hook and records the peak memory of the subprocesses, and
+# writes these to a JSON file on exit.
+RUNNER = """
+import os, sys, json, runpy, atexit, resource
+script, counts_file = sys.argv[1:3]
+counts = {'subprocesses': 0}
+def hook(event, args):
+    if event in ('subprocess.Popen', 'os.system', 'os.posix_spawn', 'os.spawn'):
+        counts['subprocesses'] += 1
+def save():
+    counts['children_peak_rss_kb'] = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    with open(counts_file, 'w') as f:
+        json.dump(counts, f)
+atexit.register(save)
+sys.addaudithook(hook)
+sys.argv = [script] + sys.argv[3:]
+sys.path.insert(0, os.path.dirname(script))
+runpy.run_path(script, run_name='__main__')
+"""
+
+
+def version_tuple(version):
+    return tuple(int(x) for x in version.lstrip('v').split('.'))
+
+
+def fork_date(version):
+    """
+    The date at which the maintenance branch for a version is forked from
+    main, which matches how milestones are assigned in the synthetic data.
+    """
+    index = VERSIONS.index(version)
+    return START_DATE + (END_DATE - START_DATE) * (index + 1) / len(VERSIONS)
+
+
+def assign_bugfix_milestones(pull_requests, branches):
+    """
+    Move bug fixes (pull requests milestoned for a patch release) to the
+    latest maintenance branch existing when they were merged, as is done in
+    practice, so that they need to be backported.
+    """
+    forks = sorted((fork_date(branch[1:-2]), branch) for branch in branches)
+    for pr in pull_requests:
+        if pr['milestone'] is None or version_tuple(pr['milestone'])[2] == 0:
+            continue
+        forked = [branch for date, branch in forks if date <= pr['merged_at']]
+        if forked:
+            pr['milestone'] = f"{forked[-1][:-2]}.{version_tuple(pr['milestone'])[2]}"
+
+
+class FastImportStream:
+    """
+    Builds the input for ``git fast-import``.
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.mark = 0
+
+    def data(self, text):
+        data = text.encode('utf-8')
+        self.chunks.append(b'data %d\n' % len(data) + data + b'\n')
+
+    def commit(self, ref, message, timestamp, author='user', parent=None,
+               merge=None, changes=()):
+        self.mark += 1
+        self.chunks.append(f'commit {ref}\nmark :{self.mark}\n'
+                           f'committer {author} <{author}@example.com> {timestamp} +0000\n'
+                           .encode('utf-8'))
+        self.data(message)
+        if parent is not None:
+            self.chunks.append(f'from :{parent}\n'.encode('utf-8'))
+        if merge is not None:
+            self.chunks.append(f'merge :{merge}\n'.encode('utf-8'))
+        for path, content in changes:
+            if content is None:
+                self.chunks.append(f'D {path}\n'.encode('utf-8'))
+            else:
+                self.chunks.append(f'M 100644 inline {path}\n'.encode('utf-8'))
+                self.data(content)
+        self.chunks.append(b'\n')
+        return self.mark
+
+    def reset(self, ref, mark):
+        self.chunks.append(f'reset {ref}\nfrom :{mark}\n\n'.encode('utf-8'))
+
+    def getvalue(self):
+        return b''.join(self.chunks)
+
+
+def build_repository(path, pull_requests, branches, backport_fraction,
+                     revert_fraction, rng):
+    """
+    Build a bare git repository with the history of the given (merged) pull
+    requests, replacing any existing repository at ``path``, and return
+    statistics about what it contains.
+    """
+
+    stream = FastImportStream()
+
+    forks = sorted((fork_date(branch[1:-2]), branch) for branch in branches)
+    forked = []
+
+    stats = {'commits': 0, 'backports': 0, 'missing_backports': 0, 'reverts': 0}
+
+    tip = stream.commit('refs/heads/main', 'Initial commit',
+                        int(START_DATE.timestamp()), changes=[('README', 'Synthetic\n')])
+
+    for pr in sorted(pull_requests, key=lambda pr: pr['merged_at']):
+
+        merged = pr['merged_at']
+        timestamp = int(merged.timestamp())
+        number = pr['number']
+        path_in_repo = f'prs/{number // 1000}/{number}.txt'
+
+        while forks and forks[0][0] <= merged:
+            stream.reset(f'refs/heads/{forks[0][1]}', tip)
+            forked.append(forks.pop(0)[1])
+
+        feature = stream.commit('refs/heads/incoming', pr['title'], timestamp - 60,
+                                author=pr['author'], parent=tip,
+                                changes=[(path_in_repo, f'{number}\n')])
+        tip = stream.commit('refs/heads/main',
+                            f"Merge pull request #{number} from {pr['author']}/pr-{number}\n\n{pr['title']}",
+                            timestamp, author=pr['author'], merge=feature,
+                            changes=[(path_in_repo, f'{number}\n')])
+
+        # Pull requests merged after their milestone's branch was forked need
+        # to be backported to that branch and all the later ones.
+        if pr['milestone'] is not None:
+            milestone = version_tuple(pr['milestone'])[:2]
+            for branch in forked:
+                if version_tuple(branch[:-2]) < milestone:
+                    continue
+                if rng.random() > backport_fraction:
+                    stats['missing_backports'] += 1
+                    continue
+                message = f"Backport PR #{number}: {pr['title']}"
+                stream.commit(f'refs/heads/{branch}', message, timestamp + 600,
+                              author='meeseeksmachine',
+                              changes=[(path_in_repo, f'{number}\n')])
+                stats['backports'] += 1
+                if rng.random() < revert_fraction:
+                    stream.commit(f'refs/heads/{branch}', f'Revert "{message}"',
+                                  timestamp + 1200, author=pr['author'],
+                                  changes=[(path_in_repo, None)])
+                    stats['reverts'] += 1
+
+    stats['commits'] = stream.mark
+
+    # The repository is built again from scratch when the same --workdir is
+    # used twice, since fast-import refuses to overwrite existing refs
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    subprocess.run(['git', 'init', '--quiet', '--bare', path], check=True)
+    subprocess.run(['git', 'fast-import', '--quiet'], input=stream.getvalue(),
+                   cwd=path, check=True)
+    subprocess.run(['git', 'update-ref', '-d', 'refs/heads/incoming'], cwd=path, check=True)
+    subprocess.run(['git', 'symbolic-ref', 'HEAD', 'refs/heads/main'], cwd=path, check=True)
+
+    return stats
+
+
+def write_changelog(filename, pull_requests, fraction, rng):
+    """
+    Write a changelog with an entry in the section of their milestone for the
+    given fraction of pull requests.
+    """
+
+    sections = {}
+    for pr in pull_requests:
+        if pr['milestone'] is not None and rng.random() < fraction:
+            sections.setdefault(pr['milestone'].lstrip('v'), []).append(pr)
+
+    with open(filename, 'w') as f:
+        for version in sorted(sections, key=version_tuple, reverse=True):
+            heading = f'{version} (unreleased)'
+            f.write(f'{heading}\n{"=" * len(heading)}\n\nBug Fixes\n---------\n\n')
+            for pr in sections[version]:
+                f.write(f"- {pr['title']}. [#{pr['number']}]\n\n")
+
+    return sum(len(prs) for prs in sections.values())
+
+
+def get_stats(url, reset=False):
+    with urlopen(url + ('/_standin/reset' if reset else '/_standin/stats')) as response:
+        return json.loads(response.read())
+
+
+def run_stage(stage, workdir, env, server_url):
+    """
+    Run one of the scripts and return its metrics.
+    """
+
+    script = os.path.join(ROOT, 'pr_consistency', stage)
+    counts_file = os.path.join(workdir, 'counts.json')
+
+    args = [REPOSITORY_NAME]
+    if stage.startswith('3.'):
+        args.append('CHANGES.rst')
+
+    output_name = 'consistency.html' if stage.startswith('4.') else stage.replace('.py', '.log')
+
+    get_stats(server_url, reset=True)
+
+    start = time.perf_counter()
+    with open(os.path.join(workdir, output_name), 'w') as output:
+        proc = subprocess.Popen([sys.executable, '-c', RUNNER, script, counts_file] + args,
+                                cwd=workdir, env=env, stdout=output,
+                                stderr=subprocess.STDOUT)
+        # wait4 gives us the resource usage of this process alone
+        _, status, rusage = os.wait4(proc.pid, 0)
+        proc.returncode = os.waitstatus_to_exitcode(status)
+    wall_time = time.perf_counter() - start
+
+    if proc.returncode != 0:
+        raise RuntimeError(f'{stage} failed with exit code {proc.returncode}, '
+                           f'see {os.path.join(workdir, output_name)}')
+
+    with open(counts_file) as f:
+        counts = json.load(f)
+
+    api_calls = get_stats(server_url)
+
+    # ru_maxrss is in kilobytes on Linux but in bytes on macOS
+    scale = 1024 ** 2 if sys.platform == 'darwin' else 1024
+
+    return {'wall_time': round(wall_time, 3),
+            'peak_rss_mb': round(rusage.ru_maxrss / scale, 1),
+            'children_peak_rss_mb': round(counts['children_peak_rss_kb'] / scale, 1),
+            'subprocesses': counts['subprocesses'],
+            'api_calls': sum(api_calls.values()),
+            'api_calls_by_endpoint': api_calls}
+
+
+def expected_counts(n_merged, n_branches):
+    """
+    The number of API requests and subprocesses each stage should need.
+    """
+    # The first script asks for PRs into master (none here) and then pages
+    # through those into main 100 at a time until it gets an empty page.
+    graphql_pages = 1 + math.ceil(n_merged / 100) + 1
+    # The second script clones the repository and then runs five git commands
+    # per branch.
+    git_commands = 1 + 5 * n_branches
+    return {'1': {'api_calls': graphql_pages, 'subprocesses': 0},
+            '2': {'api_calls': 0, 'subprocesses': git_commands},
+            '3': {'api_calls': 0, 'subprocesses': 0},
+            '4': {'api_calls': 0, 'subprocesses': 0}}
+
+
+def check_thresholds(results, thresholds, baseline=None, tolerance=0.2):
+    """
+    Return a list of messages for metrics exceeding their thresholds.
+    """
+
+    failures = []
+
+    for stage, metrics in results.items():
+
+        limits = dict(thresholds.get(stage, {}))
+
+        if baseline is not None and stage in baseline:
+            for metric in TIMING_METRICS:
+                if metric in baseline[stage]:
+                    limit = max(baseline[stage][metric] * (1 + tolerance),
+                                baseline[stage][metric] + BASELINE_SLACK[metric])
+                    limits[metric] = min(limits.get(metric, limit), limit)
+
+        for metric, limit in sorted(limits.items()):
+            if metrics[metric] > limit:
+                failures.append(f'Stage {stage}: {metric} is {metrics[metric]} '
+                                f'(threshold {limit:g})')
+
+    return failures
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--prs', type=int, default=20000,
+                        help='number of synthetic pull requests (about 75%% are merged)')
+    parser.add_argument('--branches', type=int, default=6,
+                        help=f'number of maintenance branches (at most {len(VERSIONS) - 1})')
+    parser.add_argument('--backport-fraction', type=float, default=0.95,
+                        help='fraction of the needed backports that are done')
+    parser.add_argument('--revert-fraction', type=float, default=0.02,
+                        help='fraction of backports that are reverted')
+    parser.add_argument('--changelog-fraction', type=float, default=0.9,
+                        help='fraction of milestoned pull requests in the changelog')
+    parser.add_argument('--seed', type=int, default=1,
+                        help='random seed for the synthetic data')
+    parser.add_argument('--format', default=os.environ.get('ARTEFACT_FORMAT', 'json'),
+                        choices=['json', 'columnar', 'columnar-compressed'],
+                        help='format of the intermediate files (see ARTEFACT_FORMAT)')
+    parser.add_argument('--thresholds',
+                        help='JSON file with the maximum value of metrics for each stage')
+    parser.add_argument('--baseline',
+                        help='metrics of a previous run (saved with --output) to compare to')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='allowed relative increase of wall time and memory use '
+                             'compared to --baseline (default is 0.2)')
+    parser.add_argument('--output', '-o',
+                        help='file to write the metrics to as JSON')
+    parser.add_argument('--workdir',
+                        help='directory to run in, which is kept after the run '
+                             '(by default a temporary directory is used and removed)')
+    args = parser.parse_args(argv)
+
+    if not 1 <= args.branches < len(VERSIONS):
+        parser.error(f'--branches should be between 1 and {len(VERSIONS) - 1}')
+
+    workdir = args.workdir or tempfile.mkdtemp()
+    os.makedirs(os.path.join(workdir, 'tmp'), exist_ok=True)
+
+    rng = random.Random(args.seed)
+
+    # The last version has no maintenance branch yet
+    branches = [f'v{version}.x' for version in VERSIONS[-args.branches - 1:-1]]
+
+    try:
+
+        print('Generating synthetic data...')
+        start = time.perf_counter()
+        datasets = Datasets(n_prs=args.prs, n_search_hits=0, n_citations=0, seed=args.seed)
+        merged = datasets.merged_pull_requests
+        assign_bugfix_milestones(merged, branches)
+        repo_stats = build_repository(os.path.join(workdir, 'synthetic.git'), merged,
+                                      branches, args.backport_fraction,
+                                      args.revert_fraction, rng)
+        changelog = os.path.join(workdir, 'CHANGES.rst')
+        n_entries = write_changelog(changelog, merged, args.changelog_fraction, rng)
+        setup_time = time.perf_counter() - start
+
+        print(f'  {len(merged)} merged pull requests, {len(branches)} branches, '
+              f"{repo_stats['commits']} commits, {repo_stats['backports']} backports "
+              f"({repo_stats['missing_backports']} missing, {repo_stats['reverts']} reverted), "
+              f'{n_entries} changelog entries ({setup_time:.1f}s)')
+
+        server, url = start_server(datasets=datasets, rate_limit=False)
+
+        env = dict(os.environ,
+                   GITHUB_API_URL=url,
+                   GITHUB_TOKEN='standin',
+                   ASTROPY_TOOLS_HTTP_CACHE=os.path.join(workdir, 'http-cache'),
+                   ASTROPY_TOOLS_RATE_LIMIT_DIR=os.path.join(workdir, 'ratelimit'),
+                   ARTEFACT_FORMAT=args.format,
+                   PR_BRANCHES=','.join(branches),
+                   REPOSITORY_URL=os.path.join(workdir, 'synthetic.git'),
+                   LOCAL_CHANGELOG=changelog,
+                   TMPDIR=os.path.join(workdir, 'tmp'),
+                   NO_COLOR='1')
+
+        results = {}
+        try:
+            for stage in STAGES:
+                print(f'Running {stage}...')
+                results[stage[0]] = run_stage(stage, workdir, env, url)
+        finally:
+            server.shutdown()
+
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print()
+    print(f"{'stage':<34}" + ''.join(f'{metric:>22}' for metric in METRICS))
+    for stage in STAGES:
+        print(f'{stage:<34}' + ''.join(f'{results[stage[0]][metric]:>22}' for metric in METRICS))
+    print()
+
+    thresholds = expected_counts(len(merged), len(branches))
+    if args.thresholds:
+        with open(args.thresholds) as f:
+            for stage, limits in json.load(f).items():
+                thresholds.setdefault(stage, {}).update(limits)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['stages']
+
+    failures = check_thresholds(results, thresholds, baseline=baseline,
+                                tolerance=args.tolerance)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'parameters': vars(args),
+                       'setup': {'merged_pull_requests': len(merged),
+                                 'branches': branches,
+                                 'changelog_entries': n_entries,
+                                 'setup_time': round(setup_time, 3),
+                                 **repo_stats},
+                       'stages': results,
+                       'failures': failures}, f, indent=2, sort_keys=True)
+
+    if failures:
+        for failure in failures:
+            print(failure)
+        return 1
+
+    print('All stages within thresholds')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
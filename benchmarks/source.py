@@ -0,0 +1,89 @@
+"""
+Access to the code being benchmarked.
+
+Most of the tools in this repository are scripts which do their work when
+imported, so the benchmarks either import the few modules that can be
+imported safely, or extract only the definitions they need from a script.
+
+When run through asv, the commit being benchmarked is checked out in a build
+directory, which the install command in ``asv.conf.json`` records in the
+``ASTROPY_TOOLS_SOURCE`` environment variable. Otherwise the code next to
+this directory is used. Benchmarks for code which does not exist at a given
+commit are skipped.
+"""
+
+import os
+import re
+import ast
+import sys
+import importlib.util
+
+ROOT = os.environ.get('ASTROPY_TOOLS_SOURCE',
+                      os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _prepare(script):
+    path = os.path.join(ROOT, script)
+    if not os.path.exists(path):
+        raise NotImplementedError(f'{script} does not exist in this version')
+    directory = os.path.dirname(path)
+    if directory not in sys.path:
+        sys.path.insert(0, directory)
+    return path
+
+
+def load_module(script):
+    """
+    Import a script that does not do anything when imported.
+    """
+
+    path = _prepare(script)
+    name = '_benchmarked_' + re.sub(r'\W', '_', script)
+
+    if name not in sys.modules:
+        spec = importlib.util.spec_from_file_location(name, path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        sys.modules[name] = module
+
+    return sys.modules[name]
+
+
+def load_definitions(script, names, **namespace):
+    """
+    Extract the functions and constants with the given names from a script
+    without running the rest of it, and return them in a dictionary.
+
+    The imports at the top level of the script are run too, and any extra
+    keyword arguments are available as globals to the extracted functions.
+    """
+
+    path = _prepare(script)
+
+    with open(path) as f:
+        tree = ast.parse(f.read(), path)
+
+    body = []
+    found = set()
+
+    for node in tree.body:
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            body.append(node)
+        elif isinstance(node, (ast.FunctionDef, ast.ClassDef)) and node.name in names:
+            body.append(node)
+            found.add(node.name)
+        elif isinstance(node, ast.Assign):
+            targets = {target.id for target in node.targets if isinstance(target, ast.Name)}
+            if targets & set(names):
+                body.append(node)
+                found |= targets
+
+    missing = set(names) - found
+    if missing:
+        raise NotImplementedError(f"{', '.join(sorted(missing))} not defined in {script} "
+                                  "in this version")
+
+    namespace = dict(namespace, __name__='_benchmarked', __file__=path)
+    exec(compile(ast.Module(body=body, type_ignores=[]), path, 'exec'), namespace)
+
+    return namespace
@@ -0,0 +1,126 @@
+import os
+import sys
+import netrc
+import getpass
+import warnings
+
+GITHUB_API_HOST = 'api.github.com'
+
+BRANCHES_DICT = {'astropy/astropy': ['v0.1.x', 'v0.2.x', 'v0.3.x', 'v0.4.x',
+                                     'v1.0.x', 'v1.1.x', 'v1.2.x', 'v1.3.x',
+                                     'v2.0.x',
+                                     'v3.0.x', 'v3.1.x', 'v3.2.x',
+                                     'v4.0.x', 'v4.1.x', 'v4.2.x', 'v4.3.x',
+                                     'v5.0.x', 'v5.1.x'],
+                 'astropy/astropy-helpers': ['v0.4.x', 'v1.0.x', 'v1.1.x',
+                                             'v1.2.x', 'v1.3.x',
+                                             'v2.0.x',
+                                             'v3.0.x', 'v3.1.x', 'v3.2.x',
+                                             'v4.0.x'],
+                 'astropy/astroquery': [],  # we don't have bugfix branches
+}
+
+# ANSI color codes understood by color_print - these are the same names as
+# used by astropy.utils.console.color_print, which we avoid importing since
+# importing astropy takes a long time.
+COLOR_CODES = {'black': '0;30', 'red': '0;31', 'green': '0;32',
+               'brown': '0;33', 'blue': '0;34', 'magenta': '0;35',
+               'cyan': '0;36', 'lightgrey': '0;37', 'default': '0;39',
+               'darkgrey': '1;30', 'lightred': '1;31', 'lightgreen': '1;32',
+               'yellow': '1;33', 'lightblue': '1;34', 'lightmagenta': '1;35',
+               'lightcyan': '1;36', 'white': '1;37'}
+
+
+def color_print(*args, end='\n', file=None):
+    """
+    Print colored text to a terminal.
+
+    Arguments are given in pairs of text and color name, e.g.
+    ``color_print('Error:', 'red', ' something went wrong', '')``. An empty
+    color name means no color. Colors are only used if the output is a
+    terminal and the ``NO_COLOR`` environment variable is not set.
+    """
+
+    if file is None:
+        file = sys.stdout
+
+    use_color = (hasattr(file, 'isatty') and file.isatty()
+                 and 'NO_COLOR' not in os.environ)
+
+    for i in range(0, len(args), 2):
+        msg = args[i]
+        color = args[i + 1] if i + 1 < len(args) else ''
+        if use_color and color in COLOR_CODES:
+            msg = f'\033[{COLOR_CODES[color]}m{msg}\033[0m'
+        file.write(msg)
+
+    file.write(end)
+    file.flush()
+
+
+def get_credentials(username=None, password=None, needs_token=False):
+    pwtype = 'personal access token' if needs_token else 'password'
+
+    if needs_token and 'GITHUB_TOKEN' in os.environ:
+        print('Using GITHUB_TOKEN environment variable')
+        return None, os.environ['GITHUB_TOKEN']
+
+    try:
+        my_netrc = netrc.netrc()
+    except Exception:
+        pass
+    else:
+        auth = my_netrc.authenticators(GITHUB_API_HOST)
+        if auth:
+            response = 'NONE'  # to allow enter to be default Y
+            while response.lower() not in ('y', 'n', ''):
+                print('Using the following GitHub credentials from '
+                      '~/.netrc: {}/{}'.format(auth[0], '*' * 8))
+                response = input(
+                    'Use these credentials (if not you will be prompted '
+                    'for new credentials)? [Y/n] ')
+            if response.lower() == 'y' or response == '':
+                username = auth[0]
+                password = auth[2]
+                if needs_token:
+                    warnings.warn('Interpreting "password" in netrc as a personal access token')
+
+    if not (username or password):
+        print(f"Enter your GitHub username and {pwtype} so that API "
+               "requests aren't as severely rate-limited...")
+        username = input('Username: ')
+        password = getpass.getpass('Password: ')
+    elif not password:
+        print(f"Enter your GitHub {pwtype} so that API "
+               "requests aren't as severely rate-limited...")
+        password = getpass.getpass('Password: ')
+
+    return username, password
+
+
+def get_branches(repo):
+
+    # The branches can also be given explicitly as a comma-separated list,
+    # e.g. for repositories not listed in BRANCHES_DICT
+    if os.environ.get('PR_BRANCHES'):
+        return os.environ['PR_BRANCHES'].split(',')
+
+    try:
+        branches = BRANCHES_DICT[repo]
+    except KeyError:
+        print("No branches of interest was defined, using all branches with "
+              "names starting with a number or v[0-9] ")
+
+        from github import Github
+        from github_client import make_retry
+        g = Github(*get_credentials(), retry=make_retry())
+        repo = g.get_repo(repo)
+
+        branches = []
+
+        for br in repo.get_branches():
+            if (br.name[0] in '1234567890'
+                    or br.name[0] == 'v' and br.name[1] in '1234567890'):
+                branches.append(br.name)
+
+    return branches
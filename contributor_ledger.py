@@ -0,0 +1,246 @@
+"""
+A ledger of the pull requests merged into the repositories of an organization.
+
+The ledger is a SQLite database holding, for each repository, author and day,
+the number of pull requests by that author merged into the repository on that
+day, together with the latest merge time seen in each repository. A run of
+the org inviter then only needs to search for the pull requests merged since
+that high-water mark, and the number of pull requests merged by each author
+since a date is a sum over the daily counts - for a single repository or for
+all of them.
+
+The time of the latest commit on the default branch of each repository when
+it was last updated is recorded too, so that repositories where nothing has
+been merged since can be skipped without searching them at all.
+
+Between two searches, pull requests can also be added one at a time as they
+are merged (e.g. from webhook deliveries) with `record_merge`.
+"""
+
+import os
+import sqlite3
+import threading
+from collections import Counter
+from datetime import date, timedelta
+
+# Location of the ledger - set the ASTROPY_TOOLS_LEDGER environment variable
+# to change it.
+LEDGER_PATH = os.environ.get(
+    'ASTROPY_TOOLS_LEDGER',
+    os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')),
+                 'astropy-tools', 'contributors.sqlite'))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS merged_prs (
+    repo TEXT NOT NULL,
+    day TEXT NOT NULL,
+    author TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (repo, day, author)
+);
+CREATE INDEX IF NOT EXISTS merged_prs_by_day ON merged_prs (day);
+CREATE TABLE IF NOT EXISTS repositories (
+    repo TEXT PRIMARY KEY,
+    covered_from TEXT NOT NULL,
+    last_merged_at TEXT
+);
+CREATE TABLE IF NOT EXISTS default_branches (
+    repo TEXT PRIMARY KEY,
+    updated_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS webhook_merges (
+    repo TEXT NOT NULL,
+    number INTEGER NOT NULL,
+    PRIMARY KEY (repo, number)
+);
+"""
+
+
+class ContributorLedger:
+    """
+    Daily counts of merged pull requests per repository and author.
+
+    Repositories are identified by their full name (``org/repo``). The
+    ledger can be used from several threads at the same time.
+
+    Parameters
+    ----------
+    path : str, optional
+        The SQLite database to use, created if needed. Defaults to
+        ``LEDGER_PATH``.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or LEDGER_PATH
+        if self.path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False, timeout=60)
+        with self._lock, self._connection:
+            self._connection.executescript(SCHEMA)
+
+    def close(self):
+        self._connection.close()
+
+    def high_water_mark(self, repo):
+        """
+        Return the time at which the most recent pull request seen in a
+        repository was merged, as an ISO 8601 string, or `None`.
+        """
+        with self._lock:
+            row = self._connection.execute('SELECT last_merged_at FROM repositories '
+                                           'WHERE repo = ?', (repo,)).fetchone()
+        return row[0] if row else None
+
+    def update(self, repo, since, fetch):
+        """
+        Bring the counts for a repository up to date, from ``since`` to
+        today.
+
+        Parameters
+        ----------
+        repo : str
+            Full name of the repository.
+        since : `datetime.date`
+            Earliest day for which the counts are needed.
+        fetch : callable
+            Function called with a start and stop date (inclusive), which
+            should return the ``(author, merged_at)`` pairs of the pull
+            requests merged into the repository between these dates, where
+            ``merged_at`` is an ISO 8601 string in UTC.
+
+        Notes
+        -----
+        The pull requests merged on the day of the high-water mark are
+        fetched again, since searches have a resolution of a day, and the
+        counts for that day are replaced. Days before the ones already in the
+        ledger are fetched if ``since`` is earlier than in previous runs.
+        """
+
+        with self._lock:
+            row = self._connection.execute('SELECT covered_from, last_merged_at FROM repositories '
+                                           'WHERE repo = ?', (repo,)).fetchone()
+
+        today = date.today()
+
+        if row is None:
+            covered_from, last_merged_at = since, None
+            ranges = [(since, today)]
+            resume = since
+        else:
+            covered_from = date.fromisoformat(row[0])
+            last_merged_at = row[1]
+            resume = date.fromisoformat(last_merged_at[:10]) if last_merged_at else covered_from
+            ranges = [(resume, today)]
+            if since < covered_from:
+                ranges.insert(0, (since, covered_from - timedelta(days=1)))
+                covered_from = since
+
+        counts = Counter()
+        for start, stop in ranges:
+            for author, merged_at in fetch(start, stop):
+                counts[author, merged_at[:10]] += 1
+                if last_merged_at is None or merged_at > last_merged_at:
+                    last_merged_at = merged_at
+
+        with self._lock, self._connection:
+            # This also replaces the counts from pull requests added with
+            # record_merge, which are all after the high-water mark.
+            self._connection.execute('DELETE FROM merged_prs WHERE repo = ? AND day >= ?',
+                                     (repo, resume.isoformat()))
+            self._connection.execute('DELETE FROM webhook_merges WHERE repo = ?', (repo,))
+            self._connection.executemany('INSERT INTO merged_prs (repo, day, author, count) '
+                                         'VALUES (?, ?, ?, ?)',
+                                         [(repo, day, author, n)
+                                          for (author, day), n in counts.items()])
+            self._connection.execute('INSERT OR REPLACE INTO repositories '
+                                     '(repo, covered_from, last_merged_at) VALUES (?, ?, ?)',
+                                     (repo, covered_from.isoformat(), last_merged_at))
+
+    def covers(self, repo, since):
+        """
+        Whether the counts for a repository go back to ``since``.
+        """
+        with self._lock:
+            row = self._connection.execute('SELECT covered_from FROM repositories '
+                                           'WHERE repo = ?', (repo,)).fetchone()
+        return row is not None and date.fromisoformat(row[0]) <= since
+
+    def record_merge(self, repo, number, author, merged_at):
+        """
+        Count a single pull request merged into a repository which is
+        already in the ledger, and return whether it was counted.
+
+        Pull requests merged before the high-water mark are already counted,
+        and so are pull requests recorded before, so these are ignored. The
+        high-water mark is not moved, so that the next `update` still
+        searches for any pull request merged since the previous one which
+        was not recorded.
+        """
+        with self._lock, self._connection:
+            row = self._connection.execute('SELECT last_merged_at FROM repositories '
+                                           'WHERE repo = ?', (repo,)).fetchone()
+            if row is None or (row[0] is not None and merged_at <= row[0]):
+                return False
+            inserted = self._connection.execute('INSERT OR IGNORE INTO webhook_merges (repo, number) '
+                                                'VALUES (?, ?)', (repo, number)).rowcount
+            if not inserted:
+                return False
+            self._connection.execute('INSERT INTO merged_prs (repo, day, author, count) '
+                                     'VALUES (?, ?, ?, 1) '
+                                     'ON CONFLICT (repo, day, author) DO UPDATE SET count = count + 1',
+                                     (repo, merged_at[:10], author))
+        return True
+
+    def repositories(self, org):
+        """
+        Return the names (without the organization) of the repositories of
+        an organization in the ledger.
+        """
+        with self._lock:
+            rows = self._connection.execute('SELECT repo FROM repositories WHERE repo LIKE ? '
+                                            'ORDER BY repo', (f'{org}/%',)).fetchall()
+        return [repo.split('/', 1)[1] for repo, in rows]
+
+    def record_default_branch(self, repo, updated_at):
+        """
+        Record the time of the latest commit on the default branch of a
+        repository, as of the latest `update`.
+        """
+        with self._lock, self._connection:
+            self._connection.execute('INSERT OR REPLACE INTO default_branches (repo, updated_at) '
+                                     'VALUES (?, ?)', (repo, updated_at))
+
+    def is_current(self, repo, since, updated_at):
+        """
+        Whether the counts for a repository cover ``since`` and the default
+        branch of the repository has not changed since they were updated, in
+        which case nothing new can have been merged.
+        """
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT covered_from, updated_at FROM repositories '
+                'JOIN default_branches USING (repo) WHERE repo = ?', (repo,)).fetchone()
+        return (row is not None and date.fromisoformat(row[0]) <= since and
+                row[1] == updated_at)
+
+    def merged_counts(self, since, repo=None, author=None):
+        """
+        Return a `~collections.Counter` of the number of pull requests merged
+        by each author since a date (inclusive), in one repository or, if
+        ``repo`` is `None`, in all the repositories in the ledger. If
+        ``author`` is given, only that author is counted.
+        """
+
+        query = 'SELECT author, SUM(count) FROM merged_prs WHERE day >= ?'
+        parameters = [since.isoformat()]
+        if repo is not None:
+            query += ' AND repo = ?'
+            parameters.append(repo)
+        if author is not None:
+            query += ' AND author = ?'
+            parameters.append(author)
+        query += ' GROUP BY author'
+
+        with self._lock:
+            return Counter(dict(self._connection.execute(query, parameters)))
@@ -1,6 +1,6 @@
-import requests
 from github import Github
 from common import get_credentials
+from pypi_index import PyPIIndex
 
 username, password = get_credentials()
 gh = Github(username, password)
@@ -16,12 +16,7 @@ for i in gh_search_result:
 
 gh_name = set(gh_name)
 
-pypi_name = []
-
-for i in gh_name:
-    response = requests.get("http://pypi.python.org/pypi/{}/json".format(i))
-    if response.status_code == 200:
-        pypi_name.append(i)
+pypi_name = PyPIIndex().matching(gh_name)
 
 
 print(len(gh_name), len(pypi_name))
@@ -0,0 +1 @@
+../common.py
\ No newline at end of file
@@ -28,6 +28,7 @@ import json
 import datetime
 
 from common import get_credentials
+from github_client import get_client
 
 import requests
 from six import moves
@@ -37,20 +38,9 @@ ISO_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
 
 
 def paginate_list_request(req, verbose=False, auth=None):
-    elems = []
-    currreq = req
-    i = 1
-
-    while 'next' in currreq.links:
-        elems.extend(currreq.json())
-
-        i += 1
-        if verbose:
-            print('Doing request', i, 'of', currreq.links['last']['url'].split('page=')[-1])
-        currreq = requests.get(currreq.links['next']['url'], auth=auth)
-
-    elems.extend(currreq.json())
-    return elems
+    if verbose and 'last' in req.links:
+        print('Doing', req.links['last']['url'].split('page=')[-1], 'requests')
+    return list(get_client(auth=auth).paginate(req.url, response=req))
 
 
 def count_issues_since(dt, repo, auth=None, verbose=True, cacheto=None):
@@ -60,7 +50,7 @@ def count_issues_since(dt, repo, auth=None, verbose=True, cacheto=None):
     else:
         url = GH_API_BASE_URL + '/repos/' + repo + '/issues?per_page=100&state=all'
 
-        req = requests.get(url, auth=auth)
+        req = get_client(auth=auth).get(url)
         if not req.ok:
             msg = 'Failed to access github API for repo using url {}. {}: {}: {}'
             raise requests.HTTPError(msg.format(url, req.status_code, req.reason, req.text))
@@ -91,7 +81,7 @@ def count_prs_since(dt, repo, auth=None, verbose=True, cacheto=None):
     else:
         url = GH_API_BASE_URL + '/repos/' + repo + '/pulls?per_page=100&state=all'
 
-        req = requests.get(url, auth=auth)
+        req = get_client(auth=auth).get(url)
         prlst = paginate_list_request(req, verbose, auth=auth)
         if cacheto:
             with open(cacheto, 'w') as f:
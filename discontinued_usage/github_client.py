@@ -0,0 +1 @@
+../github_client.py
\ No newline at end of file
@@ -0,0 +1 @@
+../pypi_index.py
\ No newline at end of file
@@ -0,0 +1 @@
+../rate_limit.py
\ No newline at end of file
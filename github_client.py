@@ -0,0 +1,494 @@
+"""
+A GitHub API client shared by the tools in this repository.
+
+All requests go through a single `requests.Session` per process, so that
+connections are kept alive and pooled between requests (and between tools,
+when several are run from ``astropy_tools.py``). Connection errors and 5xx
+responses are retried with exponential backoff, and responses indicating that
+a primary or secondary rate limit was hit are retried once the limit resets.
+
+Responses to GET requests that include an ``ETag`` or ``Last-Modified``
+header are stored in an on-disk cache (see `HTTPCache`), and later requests
+for the same URL are sent as conditional requests. If the server replies with
+``304 Not Modified``, the cached body is returned instead - for GitHub, such
+requests do not count against the primary rate limit.
+
+Before each request to the GitHub API, permission is asked from the
+`rate_limit.RateLimitBroker` for the credentials used, which shares the rate
+limits between all the processes using the same credentials.
+
+Typical usage::
+
+    from common import get_credentials
+    from github_client import get_client
+
+    client = get_client(token=get_credentials(needs_token=True)[1])
+    data = client.graphql('{ viewer { login } }')
+    issues = client.rest('GET', 'repos/astropy/astropy/issues')
+"""
+
+import os
+import json
+import time
+import hashlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+from urllib3.util.retry import Retry
+
+from rate_limit import get_broker, resource_for_url
+from instrumentation import span, count
+
+DEFAULT_GITHUB_API_URL = 'https://api.github.com'
+
+# This can be overridden to use e.g. the stand-in server in standin/
+GITHUB_API_URL = os.environ.get('GITHUB_API_URL', DEFAULT_GITHUB_API_URL).rstrip('/')
+GITHUB_GRAPHQL_URL = GITHUB_API_URL + '/graphql'
+
+# Responses with these status codes are retried with exponential backoff
+RETRY_STATUSES = (500, 502, 503, 504)
+
+# Maximum number of times a request is retried after hitting a rate limit,
+# and the maximum time in seconds to wait each time.
+MAX_RATE_LIMIT_RETRIES = 5
+MAX_RATE_LIMIT_WAIT = 3600
+
+# Directory for the HTTP cache - set the ASTROPY_TOOLS_HTTP_CACHE environment
+# variable to change it, or to an empty string to disable the cache.
+HTTP_CACHE_DIR = os.environ.get(
+    'ASTROPY_TOOLS_HTTP_CACHE',
+    os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')),
+                 'astropy-tools', 'http'))
+
+# Headers of cached responses that are not stored, since they describe the
+# original response rather than the resource.
+UNCACHED_HEADERS = {'content-encoding', 'content-length', 'transfer-encoding',
+                    'connection', 'keep-alive', 'date', 'set-cookie'}
+
+_session = None
+_clients = {}
+
+
+class HTTPCache:
+    """
+    A persistent cache of HTTP response bodies together with their
+    validators (``ETag`` and ``Last-Modified``).
+
+    Each entry is stored as two files in ``directory``: the body, and a small
+    JSON file with the headers. Entries are keyed by the URL and by the
+    credentials used, since different users can get different responses.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(request):
+        parts = [request.method, request.url,
+                 request.headers.get('Accept', ''),
+                 request.headers.get('Authorization', '')]
+        return hashlib.sha256('\n'.join(parts).encode('utf-8')).hexdigest()
+
+    def _paths(self, key):
+        path = os.path.join(self.directory, key[:2], key)
+        return path + '.json', path + '.body'
+
+    def get(self, key):
+        meta_path, body_path = self._paths(key)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            with open(body_path, 'rb') as f:
+                body = f.read()
+        except (OSError, ValueError):
+            return None
+        return meta, body
+
+    def store(self, key, response):
+        meta_path, body_path = self._paths(key)
+        os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+        meta = {'url': response.url,
+                'headers': {name: value for name, value in response.headers.items()
+                            if name.lower() not in UNCACHED_HEADERS}}
+        # Write the body first and the metadata last, each atomically, so that
+        # an interrupted write never leaves a usable but inconsistent entry.
+        for path, data, mode in ((body_path, response.content, 'wb'),
+                                 (meta_path, json.dumps(meta), 'w')):
+            with open(path + '.tmp', mode) as f:
+                f.write(data)
+            os.replace(path + '.tmp', path)
+
+
+class GitHubHTTPAdapter(HTTPAdapter):
+    """
+    An `HTTPAdapter` that revalidates cached GET responses with
+    ``If-None-Match`` and ``If-Modified-Since``, and that asks the rate limit
+    broker before sending requests to the GitHub API.
+    """
+
+    def __init__(self, *args, cache=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache = cache
+
+    def _send(self, request, **kwargs):
+
+        resource = resource_for_url(request.url)
+        if resource is None:
+            return super().send(request, **kwargs)
+
+        broker = get_broker(request.headers.get('Authorization'))
+
+        with span('rate_limit.acquire', resource=resource):
+            broker.acquire(resource)
+        response = super().send(request, **kwargs)
+        broker.update(resource, response.headers)
+        return response
+
+    def send(self, request, **kwargs):
+        parts = urlsplit(request.url)
+        with span('http.request', method=request.method, host=parts.hostname,
+                  path=parts.path) as attributes:
+            response = self._send_cached(request, **kwargs)
+            attributes['status'] = response.status_code
+            if not kwargs.get('stream'):
+                attributes['bytes'] = len(response.content)
+            if getattr(response, 'from_cache', False):
+                attributes['from_cache'] = True
+                count('http.cache_hit')
+        return response
+
+    def _send_cached(self, request, **kwargs):
+
+        if (self.cache is None or request.method != 'GET' or kwargs.get('stream')
+                or 'If-None-Match' in request.headers
+                or 'If-Modified-Since' in request.headers):
+            return self._send(request, **kwargs)
+
+        key = self.cache.key(request)
+        entry = self.cache.get(key)
+
+        if entry is not None:
+            meta, body = entry
+            headers = CaseInsensitiveDict(meta['headers'])
+            if 'ETag' in headers:
+                request.headers['If-None-Match'] = headers['ETag']
+            if 'Last-Modified' in headers:
+                request.headers['If-Modified-Since'] = headers['Last-Modified']
+
+        response = self._send(request, **kwargs)
+
+        if response.status_code == 304 and entry is not None:
+            return self._cached_response(request, response, meta, body)
+
+        if (response.status_code == 200
+                and ('ETag' in response.headers or 'Last-Modified' in response.headers)):
+            self.cache.store(key, response)
+
+        return response
+
+    @staticmethod
+    def _cached_response(request, not_modified, meta, body):
+        response = requests.Response()
+        response.status_code = 200
+        response.reason = 'OK'
+        response.url = meta['url']
+        response.request = request
+        response.connection = not_modified.connection
+        # Headers of the 304 response (e.g. current rate limit values) take
+        # precedence over the cached ones.
+        response.headers = CaseInsensitiveDict(meta['headers'])
+        response.headers.update(not_modified.headers)
+        response.encoding = get_encoding_from_headers(response.headers)
+        response._content = body
+        response.from_cache = True
+        return response
+
+
+def make_retry(total=5, backoff_factor=1):
+    """
+    Return the retry policy used for all requests, which can also be passed
+    to other clients, e.g. ``github.Github(retry=make_retry())``.
+    """
+    # GraphQL queries are sent with POST, so we retry all methods
+    return Retry(total=total, backoff_factor=backoff_factor,
+                 status_forcelist=RETRY_STATUSES, allowed_methods=None,
+                 raise_on_status=False, respect_retry_after_header=True)
+
+
+def get_cache():
+    """
+    Return the HTTP cache, or `None` if it is disabled.
+    """
+    if not HTTP_CACHE_DIR:
+        return None
+    try:
+        return HTTPCache(HTTP_CACHE_DIR)
+    except OSError:
+        return None
+
+
+def configure_session(session, pool_maxsize=10):
+    """
+    Mount a pooled, caching and rate limited adapter with the retry policy
+    on an existing session. This can be used for the sessions of other libraries such as
+    github3.py.
+    """
+    adapter = GitHubHTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize,
+                                max_retries=make_retry(), cache=get_cache())
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_session():
+    """
+    Return the `requests.Session` shared by all clients in this process.
+    """
+    global _session
+    if _session is None:
+        _session = configure_session(requests.Session())
+    return _session
+
+
+def page_urls(next_url, last_url):
+    """
+    Given the URLs of the next and last pages from a ``Link`` header, return
+    the URLs of all the pages between them, or `None` if the pages are not
+    numbered (e.g. for cursor-based pagination).
+    """
+
+    parts = urlsplit(next_url)
+    query = parse_qs(parts.query)
+    last_query = parse_qs(urlsplit(last_url).query)
+
+    if 'page' not in query or 'page' not in last_query:
+        return None
+
+    urls = []
+    for page in range(int(query['page'][0]), int(last_query['page'][0]) + 1):
+        query['page'] = [str(page)]
+        urls.append(parts._replace(query=urlencode(query, doseq=True)).geturl())
+
+    return urls
+
+
+def rate_limit_wait(response, attempt=0):
+    """
+    If the response indicates that a rate limit was hit, return the number
+    of seconds to wait before retrying, otherwise return `None`.
+
+    See https://docs.github.com/en/rest/using-the-rest-api/rate-limits-for-the-rest-api
+    """
+
+    if response.status_code not in (403, 429):
+        return None
+
+    headers = response.headers
+
+    if 'Retry-After' in headers:
+        wait = float(headers['Retry-After'])
+    elif headers.get('X-RateLimit-Remaining') == '0' and 'X-RateLimit-Reset' in headers:
+        wait = int(headers['X-RateLimit-Reset']) - time.time() + 1
+    elif response.status_code == 429 or 'secondary rate limit' in response.text.lower():
+        wait = 60 * 2 ** attempt
+    else:
+        # A genuine permission error
+        return None
+
+    return min(max(wait, 1), MAX_RATE_LIMIT_WAIT)
+
+
+class GitHubClient:
+    """
+    Client for the GitHub REST and GraphQL APIs.
+
+    Parameters
+    ----------
+    token : str, optional
+        GitHub token to authenticate with.
+    auth : tuple, optional
+        ``(username, password)`` to authenticate with instead of a token, as
+        returned by ``common.get_credentials``.
+    session : `requests.Session`, optional
+        The session to use. By default the shared session is used.
+    verbose : bool, optional
+        If `True`, print a message when waiting for a rate limit to reset.
+    """
+
+    def __init__(self, token=None, auth=None, session=None, verbose=True):
+        self.session = session if session is not None else get_session()
+        self.headers = {'Accept': 'application/vnd.github+json'}
+        if token:
+            self.headers['Authorization'] = f'Bearer {token}'
+        self.auth = auth if auth and any(auth) else None
+        self.verbose = verbose
+
+    def request(self, method, url, **kwargs):
+        """
+        Send a request, waiting and retrying if a rate limit is hit. The URL
+        can be relative to the API root. Returns the `requests.Response`.
+        """
+
+        if not url.startswith(('http://', 'https://')):
+            url = GITHUB_API_URL + '/' + url.lstrip('/')
+
+        headers = dict(self.headers)
+        headers.update(kwargs.pop('headers', None) or {})
+        kwargs.setdefault('auth', self.auth)
+
+        for attempt in range(MAX_RATE_LIMIT_RETRIES + 1):
+            response = self.session.request(method, url, headers=headers, **kwargs)
+            wait = rate_limit_wait(response, attempt)
+            if wait is None or attempt == MAX_RATE_LIMIT_RETRIES:
+                return response
+            if self.verbose:
+                print(f'Hit GitHub rate limit, waiting {wait:.0f}s before retrying')
+            count('rate_limit.hit')
+            with span('rate_limit.wait', seconds=wait):
+                time.sleep(wait)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def rest(self, method, url, **kwargs):
+        """
+        Send a REST API request and return the decoded JSON response, raising
+        `requests.HTTPError` if the request failed.
+        """
+        response = self.request(method, url, **kwargs)
+        response.raise_for_status()
+        if response.status_code == 204:
+            return None
+        return response.json()
+
+    def _get_page(self, url, params=None):
+        response = self.get(url, params=params)
+        response.raise_for_status()
+        return response
+
+    def paginate(self, url, params=None, items_key=None, stop=None, prefetch=4,
+                 response=None):
+        """
+        Iterate lazily over the items of a paginated REST API listing.
+
+        Pages are only requested as the items are consumed. Once the ``Link``
+        header of a response reveals the number of the last page, up to
+        ``prefetch`` of the following pages are requested concurrently.
+
+        Parameters
+        ----------
+        url : str
+            The URL of the first page, which can be relative to the API root.
+        params : dict, optional
+            Query parameters for the first page, e.g. ``{'per_page': 100}``.
+        items_key : str, optional
+            For endpoints which return a dictionary (such as the search API),
+            the key under which the items are found.
+        stop : callable, optional
+            Function called with each item. If it returns `True`, the
+            iteration ends (without yielding that item) and no further pages
+            are requested.
+        prefetch : int, optional
+            Maximum number of pages to request concurrently ahead of the page
+            being consumed. Set to 0 to request pages one at a time.
+        response : `requests.Response`, optional
+            The response for the first page, if it has already been fetched.
+        """
+
+        if response is None:
+            response = self._get_page(url, params)
+
+        remaining = None
+        pending = deque()
+        executor = None
+
+        try:
+            while True:
+
+                items = response.json()
+                if items_key is not None:
+                    items = items[items_key]
+
+                for item in items:
+                    if stop is not None and stop(item):
+                        return
+                    yield item
+
+                if remaining is None and prefetch > 0 and 'last' in response.links:
+                    urls = page_urls(response.links['next']['url'],
+                                     response.links['last']['url'])
+                    if urls is not None:
+                        remaining = deque(urls)
+                        executor = ThreadPoolExecutor(max_workers=prefetch)
+
+                if remaining is not None:
+                    while remaining and len(pending) < prefetch:
+                        pending.append(executor.submit(self._get_page, remaining.popleft()))
+                    if not pending:
+                        return
+                    response = pending.popleft().result()
+                elif 'next' in response.links:
+                    response = self._get_page(response.links['next']['url'])
+                else:
+                    return
+
+        finally:
+            for future in pending:
+                future.cancel()
+            if executor is not None:
+                executor.shutdown(wait=False)
+
+    def graphql(self, query, variables=None):
+        """
+        Run a GraphQL query and return the ``data`` part of the response,
+        raising `RuntimeError` if the query failed.
+        """
+
+        payload = {'query': query}
+        if variables:
+            payload['variables'] = variables
+
+        for attempt in range(MAX_RATE_LIMIT_RETRIES + 1):
+
+            response = self.post(GITHUB_GRAPHQL_URL, json=payload)
+
+            if response.status_code != 200:
+                raise RuntimeError(f'Query failed: {response.status_code} {response.reason}')
+
+            result = response.json()
+            errors = result.get('errors')
+
+            # Rate limits in GraphQL are reported with a 200 status code
+            if (errors and attempt < MAX_RATE_LIMIT_RETRIES
+                    and any(error.get('type') == 'RATE_LIMITED' for error in errors)):
+                wait = min(60 * 2 ** attempt, MAX_RATE_LIMIT_WAIT)
+                if self.verbose:
+                    print(f'Hit GitHub rate limit, waiting {wait:.0f}s before retrying')
+                time.sleep(wait)
+                continue
+
+            if errors:
+                raise RuntimeError('Query failed: ' +
+                                   '; '.join(error.get('message', '') for error in errors))
+
+            return result['data']
+
+
+def get_client(token=None, auth=None):
+    """
+    Return a `GitHubClient` for the given credentials. Clients are cached, so
+    that all the tools running in a process share them.
+    """
+    key = (token, tuple(auth) if auth else None)
+    if key not in _clients:
+        _clients[key] = GitHubClient(token=token, auth=auth)
+    return _clients[key]
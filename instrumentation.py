@@ -0,0 +1,262 @@
+"""
+Lightweight tracing and metrics for the tools in this repository.
+
+Code is instrumented with spans around the operations that take time, e.g.::
+
+    from instrumentation import span
+
+    with span('find_pr_branches.branch', branch=branch):
+        ...
+
+and with counters for things that are not timed::
+
+    from instrumentation import count
+
+    count('http.cache_hit')
+
+Subprocesses can be run with `call` and `check_output`, which wrap the
+functions of the same name in `subprocess` in spans.
+
+This does nothing unless the ``ASTROPY_TOOLS_METRICS`` environment variable
+is set to a directory (or `enable` is called, e.g. by the ``--profile`` option
+of ``astropy_tools.py``). In that case, when the process exits, it writes to
+that directory:
+
+* ``metrics-<pid>.json``: for each span name the number of calls, the total
+  and maximum duration, a histogram of durations and the total number of
+  bytes (for spans that record a ``bytes`` attribute), the counters, the peak
+  memory use of the process, and the total run time.
+
+* ``trace-<pid>.json``: every span as a Chrome trace event, which can be
+  opened in ``chrome://tracing`` or https://ui.perfetto.dev to see where the
+  time goes.
+
+With profiling enabled (see `enable`), a cProfile profile
+(``profile-<pid>.pstats``) and a tracemalloc snapshot of the memory allocated
+at the end (``tracemalloc-<pid>.snapshot``, with the top allocations in
+``tracemalloc-<pid>.txt``) are written too.
+"""
+
+import os
+import sys
+import json
+import time
+import atexit
+import threading
+import subprocess
+from bisect import bisect_left
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Upper bounds, in milliseconds, of the buckets of the duration histograms
+HISTOGRAM_BUCKETS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000,
+                     10000, 30000, 60000]
+
+# Maximum number of events kept for the Chrome trace - the metrics are still
+# aggregated for spans beyond this.
+MAX_TRACE_EVENTS = 1000000
+
+_lock = threading.Lock()
+_output_dir = None
+_profiler = None
+_start = time.perf_counter()
+_spans = {}
+_counters = {}
+_events = []
+
+
+def enabled():
+    return _output_dir is not None
+
+
+def enable(output_dir, profile=False):
+    """
+    Start collecting metrics, to be written to ``output_dir`` when the
+    process exits. If ``profile`` is `True`, also run cProfile and
+    tracemalloc.
+    """
+
+    global _output_dir, _profiler
+
+    os.makedirs(output_dir, exist_ok=True)
+
+    if _output_dir is None:
+        atexit.register(write)
+
+    _output_dir = output_dir
+
+    if profile and _profiler is None:
+        import cProfile
+        import tracemalloc
+        tracemalloc.start()
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+
+
+@contextmanager
+def _span(name, attributes):
+
+    start = time.perf_counter()
+    try:
+        yield attributes
+    finally:
+        end = time.perf_counter()
+        duration_ms = (end - start) * 1000
+
+        with _lock:
+            stats = _spans.get(name)
+            if stats is None:
+                stats = _spans[name] = {'count': 0, 'total_ms': 0., 'max_ms': 0., 'bytes': 0,
+                                        'histogram': [0] * (len(HISTOGRAM_BUCKETS) + 1)}
+            stats['count'] += 1
+            stats['total_ms'] += duration_ms
+            stats['max_ms'] = max(stats['max_ms'], duration_ms)
+            stats['bytes'] += attributes.get('bytes') or 0
+            stats['histogram'][bisect_left(HISTOGRAM_BUCKETS, duration_ms)] += 1
+
+        if len(_events) < MAX_TRACE_EVENTS:
+            _events.append({'name': name,
+                            'cat': name.split('.')[0],
+                            'ph': 'X',
+                            'ts': round((start - _start) * 1e6),
+                            'dur': round((end - start) * 1e6),
+                            'pid': os.getpid(),
+                            'tid': threading.get_ident(),
+                            'args': attributes})
+
+
+class _NoopSpan:
+    # Used when metrics are disabled, and cheaper than a generator-based
+    # context manager since spans can be in hot loops.
+
+    def __enter__(self):
+        return {}
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_noop_span = _NoopSpan()
+
+
+def span(name, **attributes):
+    """
+    Time the enclosed block. The context manager returns the dictionary of
+    attributes of the span, to which more can be added within the block
+    (e.g. the status code or size of a response).
+    """
+    if _output_dir is None:
+        return _noop_span
+    return _span(name, attributes)
+
+
+def count(name, value=1):
+    """
+    Increment a counter.
+    """
+    if _output_dir is None:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def _command(args):
+    return args if isinstance(args, str) else ' '.join(str(arg) for arg in args)
+
+
+def call(args, **kwargs):
+    """
+    Run `subprocess.call` in a ``subprocess`` span.
+    """
+    with span('subprocess', command=_command(args)) as attributes:
+        attributes['returncode'] = subprocess.call(args, **kwargs)
+        return attributes['returncode']
+
+
+def check_output(args, **kwargs):
+    """
+    Run `subprocess.check_output` in a ``subprocess`` span.
+    """
+    with span('subprocess', command=_command(args)) as attributes:
+        output = subprocess.check_output(args, **kwargs)
+        attributes['bytes'] = len(output)
+        return output
+
+
+def peak_memory_mb():
+    """
+    Return the peak resident memory of this process in MB.
+    """
+    if resource is None:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux but in bytes on macOS
+    return maxrss / (1024 ** 2 if sys.platform == 'darwin' else 1024)
+
+
+def get_metrics():
+    """
+    Return the metrics collected so far.
+    """
+
+    labels = [f'<={bound}ms' for bound in HISTOGRAM_BUCKETS] + [f'>{HISTOGRAM_BUCKETS[-1]}ms']
+
+    with _lock:
+        spans = {name: dict(stats,
+                            total_ms=round(stats['total_ms'], 3),
+                            max_ms=round(stats['max_ms'], 3),
+                            histogram={label: n for label, n in zip(labels, stats['histogram']) if n})
+                 for name, stats in sorted(_spans.items())}
+        counters = dict(sorted(_counters.items()))
+
+    metrics = {'pid': os.getpid(),
+               'wall_time': round(time.perf_counter() - _start, 3),
+               'peak_rss_mb': peak_memory_mb(),
+               'spans': spans,
+               'counters': counters}
+
+    if _profiler is not None:
+        import tracemalloc
+        metrics['tracemalloc_peak_mb'] = tracemalloc.get_traced_memory()[1] / 1024 ** 2
+
+    return metrics
+
+
+def write():
+    """
+    Write the metrics and trace (and profiles, if enabled) to the output
+    directory.
+    """
+
+    if _output_dir is None:
+        return
+
+    pid = os.getpid()
+
+    def path(name):
+        return os.path.join(_output_dir, f'{name}-{pid}')
+
+    if _profiler is not None:
+        import tracemalloc
+        _profiler.disable()
+        _profiler.dump_stats(path('profile') + '.pstats')
+        snapshot = tracemalloc.take_snapshot()
+        snapshot.dump(path('tracemalloc') + '.snapshot')
+        with open(path('tracemalloc') + '.txt', 'w') as f:
+            for stat in snapshot.statistics('lineno')[:50]:
+                f.write(f'{stat}\n')
+
+    with open(path('metrics') + '.json', 'w') as f:
+        json.dump(get_metrics(), f, indent=2)
+
+    with open(path('trace') + '.json', 'w') as f:
+        json.dump({'traceEvents': list(_events), 'displayTimeUnit': 'ms'}, f, default=str)
+
+
+if os.environ.get('ASTROPY_TOOLS_METRICS'):
+    enable(os.environ['ASTROPY_TOOLS_METRICS'],
+           profile=bool(os.environ.get('ASTROPY_TOOLS_PROFILE')))
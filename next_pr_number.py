@@ -1,11 +1,13 @@
 import argparse
-import json
-import urllib.request
+
+from github_client import get_client
 
 parser = argparse.ArgumentParser()
 parser.add_argument('repository', default='astropy/astropy', nargs='?', help='the repository to search for the next PR (default is "astropy/astropy")')
 
 args = parser.parse_args()
 
-with urllib.request.urlopen(f"https://api.github.com/repos/{args.repository}/issues?state=all&sort=created&direction=desc") as response:
-    print(f"Next PR number: {json.loads(response.read())[0]['number'] + 1}")
+issues = get_client().rest('GET', f'repos/{args.repository}/issues',
+                           params={'state': 'all', 'sort': 'created',
+                                   'direction': 'desc', 'per_page': 1})
+print(f"Next PR number: {issues[0]['number'] + 1}")
@@ -0,0 +1,278 @@
+"""
+A snapshot of the membership of a GitHub organization, cached on disk.
+
+The org inviter needs the logins of all the members of the organization, of
+the users blocked by it, and of the users with open or failed invitations.
+For large organizations these take many requests to list, so they are kept
+in a JSON file (one per organization) and only listed again once they are
+older than a time-to-live. Each category is refreshed separately, and since
+the listings go through the shared HTTP client, pages which have not changed
+are revalidated with conditional requests (see `github_client.HTTPCache`)
+rather than downloaded again.
+
+The logins are returned as frozen sets so that checking whether someone is a
+member does not depend on the size of the organization.
+
+The invitations sent by the org inviter are recorded in an append-only
+journal next to the snapshot (see `InvitationJournal`), so that invitations
+which could not be sent can be retried, and so that the invitations sent
+since the snapshot was refreshed count as open without listing them again.
+"""
+
+import os
+import json
+import time
+import threading
+
+# Directory for the cached snapshots - set the ASTROPY_TOOLS_ORG_CACHE
+# environment variable to change it.
+ORG_CACHE_DIR = os.environ.get(
+    'ASTROPY_TOOLS_ORG_CACHE',
+    os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')),
+                 'astropy-tools', 'org'))
+
+# Time in seconds after which the snapshot is refreshed
+DEFAULT_TTL = 24 * 3600
+
+# The categories in the snapshot, and the REST API endpoint listing each
+ENDPOINTS = {'members': 'members',
+             'blocked_users': 'blocks',
+             'open_invitations': 'invitations',
+             'failed_invitations': 'failed_invitations'}
+
+# For failed invitations, these fields are also kept since they are used to
+# decide whether to invite someone again.
+FAILED_INVITATION_FIELDS = ('login', 'failed_at', 'failed_reason')
+
+# Number of times an invitation can fail before it is no longer retried
+MAX_ATTEMPTS = 3
+
+
+class OrgSnapshot:
+    """
+    The members, blocked users and open and failed invitations of a GitHub
+    organization.
+
+    Parameters
+    ----------
+    org : str
+        The name of the organization.
+    client : `github_client.GitHubClient`
+        The client to list the organization with. The token needs to have
+        permission to read the membership of the organization.
+    ttl : float, optional
+        Time in seconds after which each category is listed again.
+    directory : str, optional
+        Directory in which the snapshot is kept. Defaults to
+        ``ORG_CACHE_DIR``.
+    verbose : bool, optional
+        If `True`, print which categories are refreshed.
+    """
+
+    def __init__(self, org, client, ttl=DEFAULT_TTL, directory=None, verbose=False):
+        self.org = org
+        self.client = client
+        self.ttl = ttl
+        self.verbose = verbose
+        self.path = os.path.join(directory or ORG_CACHE_DIR, f'{org}.json')
+        self._data = self._load()
+        self._sets = {}
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if data.get('org') != self.org:
+            return {}
+        return data['categories']
+
+    def save(self):
+        """
+        Write the snapshot to disk.
+        """
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path + '.tmp', 'w') as f:
+            json.dump({'org': self.org, 'categories': self._data}, f)
+        os.replace(self.path + '.tmp', self.path)
+
+    def _list(self, category):
+        items = self.client.paginate(f'orgs/{self.org}/{ENDPOINTS[category]}',
+                                     params={'per_page': 100})
+        if category == 'failed_invitations':
+            return {item['login']: {field: item.get(field) for field in FAILED_INVITATION_FIELDS}
+                    for item in items if item.get('login')}
+        # Invitations sent by email rather than to a user have no login
+        return sorted(item['login'] for item in items if item.get('login'))
+
+    def stale(self, category):
+        """
+        Whether a category is missing from the snapshot or older than the
+        time-to-live.
+        """
+        entry = self._data.get(category)
+        return entry is None or time.time() - entry['fetched'] > self.ttl
+
+    def fetched(self, category):
+        """
+        Return the time at which a category was listed, in seconds since the
+        epoch, or `None` if it has not been.
+        """
+        entry = self._data.get(category)
+        return entry['fetched'] if entry else None
+
+    def complete(self):
+        """
+        Whether all the categories are in the snapshot, regardless of their
+        age.
+        """
+        return all(category in self._data for category in ENDPOINTS)
+
+    def refresh(self, force=False):
+        """
+        List again the categories which are stale (or all of them if
+        ``force`` is `True`), and save the snapshot if anything changed.
+        """
+
+        changed = False
+
+        for category in ENDPOINTS:
+            if force or self.stale(category):
+                if self.verbose:
+                    print(f'Listing {category.replace("_", " ")} of {self.org}')
+                self._data[category] = {'fetched': time.time(), 'items': self._list(category)}
+                self._sets.pop(category, None)
+                changed = True
+
+        if changed:
+            self.save()
+
+    def _set(self, category):
+        if category not in self._sets:
+            if category not in self._data:
+                self.refresh()
+            self._sets[category] = frozenset(self._data[category]['items'])
+        return self._sets[category]
+
+    @property
+    def members(self):
+        return self._set('members')
+
+    @property
+    def blocked_users(self):
+        return self._set('blocked_users')
+
+    @property
+    def open_invitations(self):
+        return self._set('open_invitations')
+
+    @property
+    def failed_invitations(self):
+        """
+        A dictionary giving for each login with a failed invitation the
+        ``failed_at`` and ``failed_reason`` of the invitation.
+        """
+        if 'failed_invitations' not in self._data:
+            self.refresh()
+        return self._data['failed_invitations']['items']
+
+
+class InvitationJournal:
+    """
+    An append-only record of the invitations sent to an organization.
+
+    Each line of the journal is a JSON object with the ``login`` of the
+    person invited, the ``time`` (in seconds since the epoch) and the
+    ``status``: ``queued`` when the invitation is about to be sent, then
+    ``sent``, ``failed`` (with the ``error``) if it could not be sent but may
+    be retried, or ``rejected`` if GitHub refused it in a way that retrying
+    would not change (for instance for a user who does not exist). The
+    journal can be written to from several threads at the same time.
+
+    Parameters
+    ----------
+    org : str
+        The name of the organization.
+    directory : str, optional
+        Directory in which the journal is kept. Defaults to
+        ``ORG_CACHE_DIR``.
+    """
+
+    def __init__(self, org, directory=None):
+        self.path = os.path.join(directory or ORG_CACHE_DIR, f'{org}-invitations.jsonl')
+        self._lock = threading.Lock()
+
+    def record(self, login, status, error=None):
+        """
+        Append the status of an invitation to the journal.
+        """
+        entry = {'login': login, 'status': status, 'time': time.time()}
+        if error is not None:
+            entry['error'] = error
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(entry) + '\n')
+
+    def entries(self):
+        """
+        Return the entries in the journal, oldest first.
+        """
+        entries = []
+        try:
+            with open(self.path) as f:
+                for line in f:
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        # The last line is incomplete if the process was
+                        # killed while writing it.
+                        continue
+        except FileNotFoundError:
+            pass
+        return entries
+
+    def sent_since(self, timestamp):
+        """
+        Return the logins of the people invited since a time (in seconds
+        since the epoch, or `None` for all of them).
+        """
+        return frozenset(entry['login'] for entry in self.entries()
+                         if entry['status'] == 'sent' and
+                         (timestamp is None or entry['time'] >= timestamp))
+
+    def _latest(self):
+        # The latest status of each invitation, and the number of times it
+        # failed since it was last sent
+        status = {}
+        failures = {}
+        for entry in self.entries():
+            login = entry['login']
+            status[login] = entry['status']
+            if entry['status'] == 'sent':
+                failures.pop(login, None)
+            elif entry['status'] == 'failed':
+                failures[login] = failures.get(login, 0) + 1
+        return status, failures
+
+    def given_up(self):
+        """
+        Return the logins of the people whose invitation was rejected, or
+        failed ``MAX_ATTEMPTS`` times, and should not be sent again.
+        """
+        status, failures = self._latest()
+        return frozenset(login for login, latest in status.items()
+                         if latest == 'rejected' or
+                         (latest != 'sent' and failures.get(login, 0) >= MAX_ATTEMPTS))
+
+    def unsent(self):
+        """
+        Return the logins of the people whose invitation was queued but not
+        sent, because it failed or the process stopped before sending it,
+        except those which were given up (see `given_up`).
+        """
+        status, _ = self._latest()
+        given_up = self.given_up()
+        return sorted(login for login, latest in status.items()
+                      if latest != 'sent' and login not in given_up)
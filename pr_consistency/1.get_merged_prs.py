@@ -1,13 +1,14 @@
 # The purpose of this script is to download information about all pull
 # requests merged into the main branch of the given repository. This
-# information is downloaded to a JSON file.
+# information is downloaded to a JSON (or columnar, see artefacts.py) file.
 
 import os
 import sys
-import json
-import requests
 
 from common import get_credentials
+from github_client import get_client
+from artefacts import save_artefact
+from instrumentation import span
 
 QUERY_TEMPLATE = """
 {{
@@ -52,11 +53,11 @@ NAME = os.path.basename(REPOSITORY)
 print("The repository this script currently works with is '{}'.\n"
       .format(REPOSITORY))
 
-json_filename = f'merged_pull_requests_{NAME}.json'
+artefact_name = f'merged_pull_requests_{NAME}'
 
 TOKEN = get_credentials('N/A', needs_token=True)[1]
 
-headers = {"Authorization": f"Bearer {TOKEN}"}
+client = get_client(token=TOKEN)
 
 cursor = None
 
@@ -77,12 +78,9 @@ try:
 
             query = QUERY_TEMPLATE.format(owner=OWNER, repository=NAME, after=after, basename=basename)
 
-            request = requests.post('https://api.github.com/graphql', json={'query': query}, headers=headers)
-
-            if request.status_code != 200:
-                raise Exception("Query failed")
-
-            entries = request.json()['data']['repository']['pullRequests']['edges']
+            with span('get_merged_prs.page', branch=basename) as attributes:
+                entries = client.graphql(query)['repository']['pullRequests']['edges']
+                attributes['pull_requests'] = len(entries)
 
             for entry in entries:
 
@@ -98,5 +96,5 @@ try:
                                                     'merge_commit': pr['mergeCommit']['oid'] if pr['mergeCommit'] else None}
 
 finally:
-    with open(json_filename, 'w') as f:
-        json.dump(pull_requests, f, sort_keys=True, indent=2)
+    # Sorting by merge date allows later scripts to only load recent PRs
+    save_artefact(artefact_name, pull_requests, sort_by='merged')
@@ -7,15 +7,13 @@
 
 import os
 import sys
-import json
 import re
-import subprocess
 import tempfile
 from collections import defaultdict
 
-from astropy.utils.console import color_print
-
-from common import get_branches
+from common import get_branches, color_print
+from artefacts import save_artefact
+from instrumentation import span, call, check_output
 
 if sys.argv[1:]:
     REPOSITORY_NAME = sys.argv[1]
@@ -26,7 +24,9 @@ print("The repository this script currently works with is '{}'.\n"
       .format(REPOSITORY_NAME))
 
 
-REPOSITORY = f'https://github.com/{REPOSITORY_NAME}.git'
+# Set the REPOSITORY_URL environment variable to clone from somewhere else,
+# e.g. a local mirror
+REPOSITORY = os.environ.get('REPOSITORY_URL', f'https://github.com/{REPOSITORY_NAME}.git')
 NAME = os.path.basename(REPOSITORY_NAME)
 
 DIRTOCLONEIN = tempfile.mkdtemp()  # set this to a non-temp directory to retain the clone between runs
@@ -37,9 +37,15 @@ STARTDIR = os.path.abspath('.')
 # The branches we are interested in
 BRANCHES = get_branches(REPOSITORY_NAME)
 
-# Read in a list of all the PRs
-with open(f'merged_pull_requests_{NAME}.json') as merged:
-    merged_prs = json.load(merged)
+
+def find_prs_in_log(log):
+    """
+    Return the numbers of the pull requests merged or backported according
+    to the output of ``git log``.
+    """
+    return (re.findall(r'Merge pull request #(\d+) ', log) +
+            re.findall(r'Backport PR #(\d+):', log))
+
 
 # Set up a dictionary where each key will be a PR and each value will be a list
 # of branches in which the PR is present
@@ -56,32 +62,33 @@ try:
                     'existing clone'.format(NAME), 'yellow')
         os.chdir(NAME)
         if ORIGIN:
-            subprocess.call(f'git fetch {ORIGIN}', shell=True)
+            call(f'git fetch {ORIGIN}', shell=True)
     else:
-        subprocess.call(f'git clone {REPOSITORY}', shell=True)
+        call(f'git clone {REPOSITORY}', shell=True)
         os.chdir(NAME)
 
     # Loop over branches and find all PRs in the branch
     for branch in BRANCHES:
 
-        # Change branch
-        color_print(f'Switching to branch {branch}', 'green')
-        subprocess.call('git reset --hard', shell=True)
-        subprocess.call('git clean -fxd', shell=True)
-        subprocess.call(f'git checkout {branch}', shell=True)
-        if ORIGIN:
-            subprocess.call(f'git reset --hard {ORIGIN}/{branch}', shell=True)
+        with span('find_pr_branches.branch', branch=branch):
+
+            # Change branch
+            color_print(f'Switching to branch {branch}', 'green')
+            call('git reset --hard', shell=True)
+            call('git clean -fxd', shell=True)
+            call(f'git checkout {branch}', shell=True)
+            if ORIGIN:
+                call(f'git reset --hard {ORIGIN}/{branch}', shell=True)
 
-        # Extract log:
-        log = subprocess.check_output('git log', shell=True).decode('utf-8')
+            # Extract log:
+            log = check_output('git log', shell=True).decode('utf-8')
 
-        # Check for the presence of the PR in the log
-        for pr in (re.findall(r'Merge pull request #(\d+) ', log) +
-                   re.findall(r'Backport PR #(\d+):', log)):
-            pr_branches[pr].append(branch)
+            # Check for the presence of the PR in the log
+            with span('find_pr_branches.scan', branch=branch, bytes=len(log)):
+                for pr in find_prs_in_log(log):
+                    pr_branches[pr].append(branch)
 
 finally:
     os.chdir(STARTDIR)
 
-with open(f'pull_requests_branches_{NAME}.json', 'w') as f:
-    json.dump(pr_branches, f, sort_keys=True, indent=2)
+save_artefact(f'pull_requests_branches_{NAME}', pr_branches, column='branches')
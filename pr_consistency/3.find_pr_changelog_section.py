@@ -6,10 +6,10 @@
 import os
 import re
 import sys
-import json
 import tempfile
 
-import requests
+from artefacts import save_artefact
+from instrumentation import span
 
 if sys.argv[1:]:
     REPOSITORY = sys.argv[1]
@@ -31,8 +31,9 @@ if os.environ.get('LOCAL_CHANGELOG'):
     with open(CHANGELOG) as f:
         changelog_lines = f.readlines()
 else:
+    from github_client import get_session
     CHANGELOG = f'https://raw.githubusercontent.com/{REPOSITORY}/main/{CHANGELOG_NAME}'
-    changelog_lines = requests.get(CHANGELOG).text.splitlines()
+    changelog_lines = get_session().get(CHANGELOG).text.splitlines()
 
 TMPDIR = tempfile.mkdtemp()
 
@@ -51,33 +52,45 @@ def find_prs_in_changelog(content):
             issue_numbers.append(block[start:end][1:])
     return issue_numbers
 
+
+def find_changelog_sections(changelog_lines):
+    """
+    Return a dictionary giving for each pull request mentioned in the
+    changelog the version of the section it is mentioned in.
+    """
+
+    changelog_prs = {}
+    version = None
+    content = ''
+    previous = None
+
+    new_changelog_format = False
+
+    for line in changelog_lines:
+        if '=======' in line:
+            new_changelog_format = True
+        if '=======' in line or (not new_changelog_format and '-------' in line):
+            if version is not None:
+                for pr in find_prs_in_changelog(content):
+                    changelog_prs[pr] = version
+            version = previous.strip().split('(')[0].strip()
+            if version.startswith('Version '):
+                version = version.split()[1]
+            if 'v' not in version:
+                version = 'v' + version
+            content = ''
+
+        elif version is not None:
+            content += line
+        previous = line
+
+    return changelog_prs
+
+
 # Get all the PR numbers from the changelog
 
+with span('find_pr_changelog_section.parse', lines=len(changelog_lines)):
+    changelog_prs = find_changelog_sections(changelog_lines)
 
-changelog_prs = {}
-version = None
-content = ''
-previous = None
-
-new_changelog_format = False
-
-for line in changelog_lines:
-    if '=======' in line:
-        new_changelog_format = True
-    if '=======' in line or (not new_changelog_format and '-------' in line):
-        if version is not None:
-            for pr in find_prs_in_changelog(content):
-                changelog_prs[pr] = version
-        version = previous.strip().split('(')[0].strip()
-        if version.startswith('Version '):
-            version = version.split()[1]
-        if 'v' not in version:
-            version = 'v' + version
-        content = ''
-
-    elif version is not None:
-        content += line
-    previous = line
-
-with open(f'pull_requests_changelog_sections_{NAME}.json', 'w') as f:
-    json.dump(changelog_prs, f, sort_keys=True, indent=2)
+save_artefact(f'pull_requests_changelog_sections_{NAME}', changelog_prs,
+              column='version')
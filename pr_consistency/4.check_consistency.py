@@ -3,13 +3,12 @@
 
 import os
 import sys
-import json
 from datetime import datetime
 from collections import defaultdict
 
-from astropy.utils.console import color_print
-
-from common import get_branches
+from common import get_branches, color_print
+from artefacts import load_artefact
+from instrumentation import span
 
 
 def parse_isoformat(string):
@@ -154,55 +153,16 @@ CLOSED_BY_ANOTHER = {
     '2676': '2680'
 }
 
-with open(f'merged_pull_requests_{NAME}.json') as merged:
-    merged_prs = json.load(merged)
-
-with open(f'pull_requests_changelog_sections_{NAME}.json') as merged:
-    changelog_prs = json.load(merged)
-
-with open(f'pull_requests_branches_{NAME}.json') as merged:
-    pr_branches = json.load(merged)
-
-
-if HTML_OUTPUT:
-    print('<!DOCTYPE html>\n<title>Astropy Consistency Check Report</title>'
-          '\n\n<h1>Main report for repository {}</h1>'.format(REPOSITORY))
-else:
-    color_print('Main report:', 'blue')
-
-backports = defaultdict(list)
-
-for pr in sorted(merged_prs, key=lambda pr: merged_prs[pr]['merged']):
-
-    if 'unusual-merge-dealt-with' in merged_prs[pr]['labels']:
-        # This label indicates problematic PRs that have been checked
-        # manually and don't need to be considered here.
-        continue
-
-    merge_date = parse_isoformat(merged_prs[pr]['merged'])
-
-    if merge_date < START:
-        continue
-
-    if pr in CLOSED_BY_ANOTHER:
-        continue
 
-    # Extract labels and milestones/versions
-    labels = merged_prs[pr]['labels']
-    milestone = merged_prs[pr]['milestone']
-    if milestone is not None and not milestone.startswith('v') and milestone != 'Future':
-        milestone = 'v' + milestone
-
-    cl_version = changelog_prs.get(pr, None)
-
-    if cl_version:
-        # Ignore RC status in changelog, those are temporary measures
-        cl_version = cl_version.split('rc')[0]
-
-    branches = pr_branches.get(pr, [])
+def check_pull_request(pr, labels, milestone, cl_version, branches, merge_date):
+    """
+    Run the consistency checks for one pull request. Returns a list of
+    (message, color) tuples, and the list of branches to which the pull
+    request still needs to be backported.
+    """
 
     status = []
-    valid = True
+    missing = []
 
     # Make sure that the milestone is consistent with the changelog section, and
     # that this is also consistent with the labels set on the pull request.
@@ -210,7 +170,7 @@ for pr in sorted(merged_prs, key=lambda pr: merged_prs[pr]['merged']):
     affect_dev = {'Affects-dev', 'affects-dev', 'affect-dev', 'Affect-dev'}
     affect_dev_in_labels = len(affect_dev.intersection(set(labels))) > 0
 
-    if pr in changelog_prs:
+    if cl_version is not None:
         if affect_dev_in_labels:
             pass  # don't print for now since there are too many
             # status.append(('Labelled as affects-dev but in changelog ({0})'.format(cl_version), INVALID))
@@ -271,18 +231,73 @@ for pr in sorted(merged_prs, key=lambda pr: merged_prs[pr]['merged']):
                     elif BRANCHES[i] in EXPECTED_MISSING.get(pr, []):
                         status.append((f'Pull request was not included in branch {BRANCHES[i]} (but whitelisted as ok)', VALID))
                     else:
-                        if BRANCH_CLOSED[BRANCHES[i]] is not None:
+                        if BRANCH_CLOSED.get(BRANCHES[i]) is not None:
                             if merge_date > BRANCH_CLOSED[BRANCHES[i]]:
                                 status.append((f'Pull request was not included in branch {BRANCHES[i]} (but was merged after branch closed)', VALID))
                             else:
                                 status.append((f'Pull request was not included in branch {BRANCHES[i]} (but too late to fix)', CANTFIX))
                         else:
                             status.append((f'Pull request was not included in branch {BRANCHES[i]}. Backport command included below.', INVALID))
-                            backports[BRANCHES[i]].append(pr)
+                            missing.append(BRANCHES[i])
 
         else:
             pass  # no branch for this milestone yet
 
+    return status, missing
+
+
+# We only need a few of the columns, and only for PRs merged after START
+merged_prs = load_artefact(f'merged_pull_requests_{NAME}',
+                           columns=['labels', 'merged', 'milestone', 'title', 'merge_commit'],
+                           sort_by='merged', start=START.isoformat())
+
+changelog_prs = load_artefact(f'pull_requests_changelog_sections_{NAME}', column='version')
+
+pr_branches = load_artefact(f'pull_requests_branches_{NAME}', column='branches')
+
+
+if HTML_OUTPUT:
+    print('<!DOCTYPE html>\n<title>Astropy Consistency Check Report</title>'
+          '\n\n<h1>Main report for repository {}</h1>'.format(REPOSITORY))
+else:
+    color_print('Main report:', 'blue')
+
+backports = defaultdict(list)
+
+for pr in sorted(merged_prs, key=lambda pr: merged_prs[pr]['merged']):
+
+    if 'unusual-merge-dealt-with' in merged_prs[pr]['labels']:
+        # This label indicates problematic PRs that have been checked
+        # manually and don't need to be considered here.
+        continue
+
+    merge_date = parse_isoformat(merged_prs[pr]['merged'])
+
+    if merge_date < START:
+        continue
+
+    if pr in CLOSED_BY_ANOTHER:
+        continue
+
+    # Extract labels and milestones/versions
+    labels = merged_prs[pr]['labels']
+    milestone = merged_prs[pr]['milestone']
+    if milestone is not None and not milestone.startswith('v') and milestone != 'Future':
+        milestone = 'v' + milestone
+
+    cl_version = changelog_prs.get(pr, None)
+
+    if cl_version:
+        # Ignore RC status in changelog, those are temporary measures
+        cl_version = cl_version.split('rc')[0]
+
+    branches = pr_branches.get(pr, [])
+
+    with span('check_consistency.pull_request', pr=pr):
+        status, missing = check_pull_request(pr, labels, milestone, cl_version, branches, merge_date)
+    for branch in missing:
+        backports[branch].append(pr)
+
     # If SHOW_VALID is False, we want to skip entries which are all valid.
     # Otherwise we want to show both valid and invalid entries.
 
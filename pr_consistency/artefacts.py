@@ -0,0 +1,286 @@
+# This module handles the intermediate files exchanged between the numbered
+# scripts in this directory. In addition to plain JSON, it implements a compact
+# columnar container for these files. Rows are sorted (by PR number or by a
+# chosen column such as the merge date) and split into chunks, and each column
+# of each chunk is stored as a separate (optionally zlib-compressed) block. A
+# small header at the start of the file records the byte offset of every block
+# together with the range of sort values covered by each chunk, so that
+# readers can decode only the columns and the rows they actually need.
+#
+# File layout:
+#
+#   MAGIC | header length (8 bytes, little-endian) | JSON header | blocks...
+
+import os
+import json
+import zlib
+import struct
+
+from instrumentation import span
+
+# The format used for the intermediate files passed between the scripts. This
+# can be 'json' (pretty-printed JSON, the default), 'columnar', or
+# 'columnar-compressed'.
+ARTEFACT_FORMAT = os.environ.get('ARTEFACT_FORMAT', 'json')
+
+MAGIC = b'PRCOLS1\n'
+
+# Number of rows per chunk - this sets the granularity of range reads
+CHUNK_SIZE = 4096
+
+KEY_COLUMN = '_key'
+
+
+def _encode(values, compress):
+    data = json.dumps(values, separators=(',', ':')).encode('utf-8')
+    if compress:
+        data = zlib.compress(data, 6)
+    return data
+
+
+def _sort_value(table, key, sort_by):
+    if sort_by is None:
+        return int(key)
+    return table[key].get(sort_by)
+
+
+def write_columns(filename, table, sort_by=None, compress=False,
+                  chunk_size=CHUNK_SIZE):
+    """
+    Write a table to a columnar file.
+
+    Parameters
+    ----------
+    filename : str
+        The file to write. It is written to a temporary file first and then
+        moved into place, so an interrupted write never leaves a truncated
+        file behind.
+    table : dict
+        A dictionary mapping PR numbers (as strings) to dictionaries of
+        column values.
+    sort_by : str, optional
+        Column by which rows are sorted and by which range reads can be
+        done. If not specified, rows are sorted by PR number.
+    compress : bool, optional
+        Whether to compress each block with zlib.
+    chunk_size : int, optional
+        Number of rows per chunk.
+    """
+
+    keys = sorted(table, key=lambda key: (_sort_value(table, key, sort_by) is None,
+                                          _sort_value(table, key, sort_by) or 0,
+                                          int(key)))
+
+    columns = sorted({column for row in table.values() for column in row})
+
+    blocks = []
+    chunks = []
+    offset = 0
+
+    for first in range(0, len(keys), chunk_size):
+
+        chunk_keys = keys[first:first + chunk_size]
+        sort_values = [_sort_value(table, key, sort_by) for key in chunk_keys]
+        sort_values = [value for value in sort_values if value is not None]
+
+        chunk = {'nrows': len(chunk_keys),
+                 'min': min(sort_values) if sort_values else None,
+                 'max': max(sort_values) if sort_values else None,
+                 'blocks': {}}
+
+        for column in [KEY_COLUMN] + columns:
+            if column == KEY_COLUMN:
+                values = chunk_keys
+            else:
+                values = [table[key].get(column) for key in chunk_keys]
+            data = _encode(values, compress)
+            chunk['blocks'][column] = [offset, len(data)]
+            blocks.append(data)
+            offset += len(data)
+
+        chunks.append(chunk)
+
+    header = json.dumps({'version': 1,
+                         'nrows': len(keys),
+                         'sort_by': sort_by,
+                         'compressed': compress,
+                         'columns': columns,
+                         'chunks': chunks}, separators=(',', ':')).encode('utf-8')
+
+    tmp_filename = filename + '.tmp'
+    with open(tmp_filename, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<Q', len(header)))
+        f.write(header)
+        for data in blocks:
+            f.write(data)
+    os.replace(tmp_filename, filename)
+
+
+def _read_header(f):
+    if f.read(len(MAGIC)) != MAGIC:
+        raise ValueError(f'{f.name} is not a columnar PR file')
+    length, = struct.unpack('<Q', f.read(8))
+    return json.loads(f.read(length).decode('utf-8'))
+
+
+def _read_block(f, data_start, location, compressed):
+    offset, length = location
+    f.seek(data_start + offset)
+    data = f.read(length)
+    if compressed:
+        data = zlib.decompress(data)
+    return json.loads(data.decode('utf-8'))
+
+
+def read_columns(filename, columns=None, start=None, stop=None):
+    """
+    Read (part of) a table from a columnar file.
+
+    Parameters
+    ----------
+    filename : str
+        The file to read.
+    columns : iterable of str, optional
+        The columns to load. By default all columns are loaded.
+    start, stop : optional
+        If specified, only rows for which the value of the sort column (or
+        the PR number, if the file was not sorted by a column) is at least
+        ``start`` and below ``stop`` are loaded. Chunks entirely outside of
+        this range are not decoded at all.
+
+    Returns
+    -------
+    table : dict
+        A dictionary mapping PR numbers to dictionaries of column values.
+    """
+
+    table = {}
+
+    with open(filename, 'rb') as f:
+
+        header = _read_header(f)
+        data_start = f.tell()
+
+        sort_by = header['sort_by']
+        compressed = header['compressed']
+
+        if columns is None:
+            columns = header['columns']
+        else:
+            columns = [column for column in columns if column in header['columns']]
+
+        for chunk in header['chunks']:
+
+            if chunk['min'] is not None:
+                if start is not None and chunk['max'] < start:
+                    continue
+                if stop is not None and chunk['min'] >= stop:
+                    continue
+
+            blocks = chunk['blocks']
+
+            keys = _read_block(f, data_start, blocks[KEY_COLUMN], compressed)
+            values = {column: _read_block(f, data_start, blocks[column], compressed)
+                      for column in columns}
+
+            # Only chunks straddling the edges of the range need to be
+            # filtered row by row
+            if ((start is not None and (chunk['min'] is None or chunk['min'] < start)) or
+                    (stop is not None and (chunk['max'] is None or chunk['max'] >= stop))):
+                if sort_by is None:
+                    sort_values = [int(key) for key in keys]
+                elif sort_by in values:
+                    sort_values = values[sort_by]
+                else:
+                    sort_values = _read_block(f, data_start, blocks[sort_by], compressed)
+                selected = [i for i, value in enumerate(sort_values)
+                            if value is not None
+                            and (start is None or value >= start)
+                            and (stop is None or value < stop)]
+            else:
+                selected = range(len(keys))
+
+            for i in selected:
+                table[keys[i]] = {column: values[column][i] for column in columns}
+
+    return table
+
+
+def artefact_filename(basename):
+    if ARTEFACT_FORMAT == 'json':
+        return basename + '.json'
+    elif ARTEFACT_FORMAT in ('columnar', 'columnar-compressed'):
+        return basename + '.cols'
+    else:
+        raise ValueError(f'Unknown ARTEFACT_FORMAT: {ARTEFACT_FORMAT}')
+
+
+def save_artefact(basename, data, column=None, sort_by=None):
+    """
+    Save one of the intermediate files in the format set by ARTEFACT_FORMAT.
+
+    If ``column`` is given, ``data`` maps each PR to a single value which is
+    stored under that column name, otherwise ``data`` maps each PR to a
+    dictionary of columns. ``sort_by`` is the column by which rows can later
+    be selected with ``load_artefact(start=...)``.
+    """
+
+    filename = artefact_filename(basename)
+
+    with span('artefacts.save', filename=filename, rows=len(data)) as attributes:
+        if ARTEFACT_FORMAT == 'json':
+            with open(filename, 'w') as f:
+                json.dump(data, f, sort_keys=True, indent=2)
+        else:
+            if column is not None:
+                data = {pr: {column: value} for pr, value in data.items()}
+            write_columns(filename, data, sort_by=sort_by,
+                          compress=ARTEFACT_FORMAT == 'columnar-compressed')
+        attributes['bytes'] = os.path.getsize(filename)
+
+
+def _load(filename, column, columns, sort_by, start, stop):
+
+    if column is not None:
+        columns = [column]
+
+    if ARTEFACT_FORMAT == 'json':
+        with open(filename) as f:
+            data = json.load(f)
+        if column is not None:
+            return data
+        if start is not None or stop is not None:
+            data = {pr: row for pr, row in data.items()
+                    if row.get(sort_by) is not None
+                    and (start is None or row[sort_by] >= start)
+                    and (stop is None or row[sort_by] < stop)}
+        if columns is not None:
+            data = {pr: {key: row.get(key) for key in columns}
+                    for pr, row in data.items()}
+    else:
+        data = read_columns(filename, columns=columns, start=start, stop=stop)
+        if column is not None:
+            data = {pr: row[column] for pr, row in data.items()}
+
+    return data
+
+
+def load_artefact(basename, column=None, columns=None, sort_by=None,
+                  start=None, stop=None):
+    """
+    Load one of the intermediate files written by `save_artefact`.
+
+    Only the requested ``columns`` and, if ``start`` and/or ``stop`` are
+    given, the rows whose ``sort_by`` value lies in that range are returned.
+    With the columnar formats the remaining data is not even decoded.
+    """
+
+    filename = artefact_filename(basename)
+
+    with span('artefacts.load', filename=filename,
+              bytes=os.path.getsize(filename)) as attributes:
+        data = _load(filename, column, columns, sort_by, start, stop)
+        attributes['rows'] = len(data)
+
+    return data
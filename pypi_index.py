@@ -0,0 +1,215 @@
+"""
+A local index of the names of all the projects on PyPI.
+
+Checking whether thousands of names are projects on PyPI one request at a
+time is slow, so instead the whole simple index (PEP 503) is downloaded once
+and the names in it are kept in a file, normalized and sorted, one per line.
+Matching names against PyPI is then a set intersection in memory, and a few
+names can be looked up without reading the whole file with a binary search
+in the memory-mapped file.
+
+The index is downloaded again once it is older than a time-to-live, with a
+conditional request so that nothing is downloaded if it has not changed. To
+keep it up to date on a schedule, run this module from cron::
+
+    python pypi_index.py
+"""
+
+import os
+import re
+import json
+import mmap
+import time
+import argparse
+
+import requests
+
+# File in which the index is kept - set the ASTROPY_TOOLS_PYPI_INDEX
+# environment variable to change it.
+PYPI_INDEX_PATH = os.environ.get(
+    'ASTROPY_TOOLS_PYPI_INDEX',
+    os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')),
+                 'astropy-tools', 'pypi', 'simple-index.txt'))
+
+PYPI_URL = os.environ.get('PYPI_URL', 'https://pypi.org').rstrip('/')
+
+# Time in seconds after which the index is downloaded again
+DEFAULT_TTL = 24 * 3600
+
+# The JSON form of the simple index (PEP 691) is preferred as it is quicker
+# to parse, but the HTML form is accepted too.
+ACCEPT = ('application/vnd.pypi.simple.v1+json, '
+          'application/vnd.pypi.simple.v1+html;q=0.2, text/html;q=0.1')
+
+
+def normalize(name):
+    """
+    Normalize a project name as in PEP 503.
+    """
+    return re.sub(r'[-_.]+', '-', name).lower()
+
+
+def parse_simple_index(response):
+    """
+    Return the names of the projects in a response for the simple index.
+    """
+    if 'json' in response.headers.get('Content-Type', ''):
+        return [project['name'] for project in response.json()['projects']]
+    return re.findall(r'<a\s[^>]*>([^<]+)</a>', response.text)
+
+
+class PyPIIndex:
+    """
+    The normalized names of all the projects on PyPI, kept in a file.
+
+    Parameters
+    ----------
+    path : str, optional
+        The file in which the index is kept. Defaults to ``PYPI_INDEX_PATH``.
+        The ``ETag`` and ``Last-Modified`` headers of the download are kept
+        next to it, in a file with the same name ending in ``.json``.
+    ttl : float, optional
+        Time in seconds after which the index is downloaded again.
+    url : str, optional
+        The base URL of PyPI. Defaults to ``PYPI_URL``.
+    verbose : bool, optional
+        If `True`, print when the index is downloaded.
+    """
+
+    def __init__(self, path=None, ttl=DEFAULT_TTL, url=None, verbose=False):
+        self.path = path or PYPI_INDEX_PATH
+        self.ttl = ttl
+        self.url = (url or PYPI_URL) + '/simple/'
+        self.verbose = verbose
+        self._names = None
+        self._map = None
+
+    def _load_meta(self):
+        try:
+            with open(self.path + '.json') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write(self, path, write):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path + '.tmp', 'wb') as f:
+            write(f)
+        os.replace(path + '.tmp', path)
+
+    def stale(self):
+        """
+        Whether the index is missing or older than the time-to-live.
+        """
+        meta = self._load_meta()
+        return (not os.path.exists(self.path) or
+                time.time() - meta.get('fetched', 0) > self.ttl)
+
+    def refresh(self, force=False):
+        """
+        Download the index again if it is stale (or if ``force`` is `True`),
+        and return whether it changed.
+        """
+
+        if not force and not self.stale():
+            return False
+
+        meta = self._load_meta() if os.path.exists(self.path) else {}
+        headers = {'Accept': ACCEPT}
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+
+        if self.verbose:
+            print(f'Downloading the PyPI simple index from {self.url}')
+
+        response = requests.get(self.url, headers=headers, timeout=300)
+        changed = response.status_code != 304
+        if changed:
+            response.raise_for_status()
+            names = sorted({normalize(name).encode() for name in parse_simple_index(response)})
+            self._write(self.path, lambda f: f.write(b''.join(name + b'\n' for name in names)))
+            meta = {'etag': response.headers.get('ETag'),
+                    'last_modified': response.headers.get('Last-Modified')}
+            self.close()
+            self._names = None
+        elif self.verbose:
+            print('The PyPI simple index has not changed')
+
+        meta['fetched'] = time.time()
+        self._write(self.path + '.json', lambda f: f.write(json.dumps(meta).encode()))
+
+        return changed
+
+    @property
+    def names(self):
+        """
+        The normalized names of all the projects, as a frozen set.
+        """
+        if self._names is None:
+            self.refresh()
+            with open(self.path) as f:
+                self._names = frozenset(f.read().split())
+        return self._names
+
+    def matching(self, names):
+        """
+        Return the names in ``names`` which are projects on PyPI.
+        """
+        return {name for name in names if normalize(name) in self.names}
+
+    def __contains__(self, name):
+        if self._names is not None:
+            return normalize(name) in self._names
+        if self._map is None:
+            self.refresh()
+            if not os.path.getsize(self.path):
+                return False
+            with open(self.path, 'rb') as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        # Binary search for the line in the sorted file. The range searched
+        # always starts and ends at the start of a line.
+        key = normalize(name).encode()
+        lo, hi = 0, len(self._map)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = self._map.rfind(b'\n', 0, mid) + 1
+            end = self._map.find(b'\n', start)
+            line = self._map[start:end]
+            if line == key:
+                return True
+            elif line < key:
+                lo = end + 1
+            else:
+                hi = start
+        return False
+
+    def __len__(self):
+        return len(self.names)
+
+    def close(self):
+        """
+        Close the memory map of the file, if it is open.
+        """
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description='Download the names of all the projects '
+                                                 'on PyPI into a local index.')
+    parser.add_argument('--path', help=f'the index file (default: {PYPI_INDEX_PATH})')
+    parser.add_argument('--force', action='store_true',
+                        help='check for changes even if the index is recent')
+    args = parser.parse_args(argv)
+
+    index = PyPIIndex(path=args.path, verbose=True)
+    index.refresh(force=args.force)
+    print(f'{len(index)} projects in {index.path}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,224 @@
+"""
+Sharing of the GitHub rate limits between processes.
+
+Tools running at the same time with the same credentials share the same
+GitHub rate limits. To avoid each of them discovering the limits on its own
+(and then failing), every request to the GitHub API first asks a
+`RateLimitBroker` for permission. The broker keeps, in a small JSON file
+protected by a lock file, the remaining budget and reset time for each rate
+limit resource (``core``, ``search``, ``code_search``, ``graphql``) as
+reported by the ``X-RateLimit-*`` headers of the latest response, together
+with how much of the budget each process has used in the current window.
+
+As long as a single process is active it can use the whole budget. When
+several are active, each one gets an equal share of what is left in the
+window, and has to wait for the window to reset once it has used its share.
+
+If coordination between processes is disabled, the budget is still tracked
+within the process, so that requests are only delayed once the budget
+reported by GitHub is exhausted, until it resets.
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+GITHUB_API_HOST = urlsplit(os.environ.get('GITHUB_API_URL', 'https://api.github.com')).hostname
+
+# Directory for the shared state - set the ASTROPY_TOOLS_RATE_LIMIT_DIR
+# environment variable to change it, or to an empty string to disable
+# coordination between processes (the state is then kept in memory).
+RATE_LIMIT_DIR = os.environ.get(
+    'ASTROPY_TOOLS_RATE_LIMIT_DIR',
+    os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')),
+                 'astropy-tools', 'ratelimit'))
+
+# Processes that have not asked for a request for this many seconds are no
+# longer counted when sharing the budget.
+CLIENT_TIMEOUT = 600
+
+# Maximum time in seconds to sleep before checking the budget again, since
+# other processes may finish in the meantime and free up their share.
+MAX_POLL = 5
+
+_brokers = {}
+
+
+def resource_for_url(url):
+    """
+    Return the rate limit resource used by a request to the given URL, or
+    `None` if the URL is not part of the GitHub API.
+    """
+
+    parts = urlsplit(url)
+
+    if parts.hostname != GITHUB_API_HOST:
+        return None
+
+    if parts.path.startswith('/search/code'):
+        return 'code_search'
+    elif parts.path.startswith('/search/'):
+        return 'search'
+    elif parts.path.startswith('/graphql'):
+        return 'graphql'
+    else:
+        return 'core'
+
+
+def _is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass
+    return True
+
+
+class RateLimitBroker:
+    """
+    Shares the GitHub rate limits for one set of credentials between
+    processes.
+
+    Parameters
+    ----------
+    path : str or `None`
+        The file in which the shared state is kept. If `None`, the state is
+        kept in memory and only shared between the threads of this process.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._memory = {}
+
+    @contextmanager
+    def _state(self):
+        if self.path is None:
+            with self._lock:
+                yield self._memory
+            return
+        with open(self.path + '.lock', 'a') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                try:
+                    with open(self.path) as f:
+                        state = json.load(f)
+                except (OSError, ValueError):
+                    state = {}
+                yield state
+                with open(self.path + '.tmp', 'w') as f:
+                    json.dump(state, f)
+                os.replace(self.path + '.tmp', self.path)
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _bucket(state, resource):
+        return state.setdefault(resource, {'remaining': None, 'reset': 0,
+                                           'used': {}, 'seen': {}})
+
+    @staticmethod
+    def _reserve(bucket, pid, now):
+        """
+        Reserve one request from the bucket for the given process if it is
+        within its share, and return 0, otherwise return the number of
+        seconds until the window resets.
+        """
+
+        seen = bucket['seen']
+        seen[pid] = now
+        for other in list(seen):
+            if now - seen[other] > CLIENT_TIMEOUT or not _is_alive(int(other)):
+                del seen[other]
+                bucket['used'].pop(other, None)
+
+        if now >= bucket['reset']:
+            # The window has been reset, so nothing is known about the budget
+            # until we see the headers of the next response.
+            bucket['remaining'] = None
+            bucket['used'] = {}
+
+        used = bucket['used'].get(pid, 0)
+
+        if bucket['remaining'] is not None:
+            window_budget = bucket['remaining'] + sum(bucket['used'].values())
+            if bucket['remaining'] <= 0 or used >= window_budget / len(seen):
+                return bucket['reset'] - now
+            bucket['remaining'] -= 1
+
+        bucket['used'][pid] = used + 1
+        return 0
+
+    def acquire(self, resource):
+        """
+        Block until this process may make a request using the given rate
+        limit resource.
+        """
+        pid = str(os.getpid())
+        while True:
+            with self._state() as state:
+                wait = self._reserve(self._bucket(state, resource), pid, time.time())
+            if wait <= 0:
+                return
+            time.sleep(min(wait, MAX_POLL))
+
+    def update(self, resource, headers):
+        """
+        Update the budget from the ``X-RateLimit-*`` headers of a response.
+        A ``Retry-After`` header (sent when a secondary rate limit is hit)
+        stops all requests using the resource until that time.
+        """
+
+        if 'Retry-After' in headers:
+            remaining = 0
+            reset = int(time.time() + float(headers['Retry-After'])) + 1
+        elif 'X-RateLimit-Remaining' in headers and 'X-RateLimit-Reset' in headers:
+            remaining = int(headers['X-RateLimit-Remaining'])
+            reset = int(headers['X-RateLimit-Reset'])
+        else:
+            return
+
+        resource = headers.get('X-RateLimit-Resource', resource)
+
+        with self._state() as state:
+            bucket = self._bucket(state, resource)
+            if reset > bucket['reset']:
+                bucket['used'] = {}
+            bucket['remaining'] = remaining
+            bucket['reset'] = reset
+
+
+def get_broker(authorization):
+    """
+    Return the `RateLimitBroker` for the given ``Authorization`` header
+    (unauthenticated requests share one). If coordination between processes
+    is disabled, or the directory for the shared state cannot be created,
+    the broker keeps its state in memory.
+    """
+
+    identity = hashlib.sha256((authorization or 'anonymous').encode('utf-8')).hexdigest()
+
+    if identity not in _brokers:
+        path = None
+        if RATE_LIMIT_DIR:
+            try:
+                os.makedirs(RATE_LIMIT_DIR, exist_ok=True)
+            except OSError:
+                pass
+            else:
+                path = os.path.join(RATE_LIMIT_DIR, identity + '.json')
+        _brokers[identity] = RateLimitBroker(path)
+
+    return _brokers[identity]
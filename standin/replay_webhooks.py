@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+"""
+Replay ``pull_request`` webhook deliveries for the synthetic merged pull
+requests of the stand-in server, to exercise the org inviter daemon
+(``add_contributors_to_org.py --watch``) without GitHub.
+
+Deliveries are either POSTed to a webhook receiver, signed with
+``GITHUB_WEBHOOK_SECRET`` if it is set::
+
+    python replay_webhooks.py http://127.0.0.1:8080 --last 100
+
+or written directly to a queue directory::
+
+    python replay_webhooks.py queue/ --last 100
+
+By default the pull requests are replayed as if they had just been merged.
+"""
+
+import os
+import hmac
+import json
+import time
+import uuid
+import hashlib
+import argparse
+import urllib.request
+from datetime import datetime, timezone
+
+from standin_server import Datasets, isoformat
+from webhook_queue import enqueue
+
+
+def pull_request_payload(pr, org, repo, merged_at=None):
+    """
+    Return the payload of the ``pull_request`` event sent when a pull
+    request is merged (only the keys used by the tools).
+    """
+    merged_at = merged_at or pr['merged_at']
+    return {'action': 'closed',
+            'number': pr['number'],
+            'pull_request': {'number': pr['number'],
+                             'title': pr['title'],
+                             'state': 'closed',
+                             'merged': True,
+                             'merged_at': isoformat(merged_at),
+                             'closed_at': isoformat(merged_at),
+                             # Deleted accounts have a null user
+                             'user': None if pr['author'] == 'ghost' else {'login': pr['author']},
+                             'html_url': f'https://github.com/{org}/{repo}/pull/{pr["number"]}'},
+            'repository': {'name': repo,
+                           'full_name': f'{org}/{repo}',
+                           'owner': {'login': org}}}
+
+
+def post(url, payload, secret=None):
+    body = json.dumps(payload).encode()
+    headers = {'Content-Type': 'application/json',
+               'X-GitHub-Event': 'pull_request',
+               'X-GitHub-Delivery': str(uuid.uuid4())}
+    if secret:
+        headers['X-Hub-Signature-256'] = 'sha256=' + hmac.new(secret.encode(), body,
+                                                              hashlib.sha256).hexdigest()
+    request = urllib.request.Request(url, data=body, headers=headers, method='POST')
+    with urllib.request.urlopen(request) as response:
+        response.read()
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('target', help='URL of a webhook receiver, or a queue directory')
+    parser.add_argument('--org', default='astropy')
+    parser.add_argument('--repo', default='astropy')
+    parser.add_argument('--last', type=int, default=100,
+                        help='number of merged pull requests to replay (the most recent ones)')
+    parser.add_argument('--interval', type=float, default=0,
+                        help='time in seconds between deliveries')
+    parser.add_argument('--original-times', action='store_true',
+                        help='keep the merge times of the synthetic data instead of '
+                             'using the current time')
+    parser.add_argument('--prs', type=int, default=100000,
+                        help='number of synthetic pull requests')
+    parser.add_argument('--seed', type=int, default=1,
+                        help='random seed for the synthetic data')
+    args = parser.parse_args(argv)
+
+    datasets = Datasets(n_prs=args.prs, n_search_hits=0, n_citations=0, seed=args.seed)
+    secret = os.environ.get('GITHUB_WEBHOOK_SECRET')
+
+    prs = datasets.merged_pull_requests[-args.last:] if args.last else []
+    for pr in prs:
+        merged_at = None if args.original_times else datetime.now(timezone.utc)
+        payload = pull_request_payload(pr, args.org, args.repo, merged_at=merged_at)
+        if args.target.startswith(('http://', 'https://')):
+            post(args.target, payload, secret=secret)
+        else:
+            enqueue(args.target, 'pull_request', payload)
+        if args.interval:
+            time.sleep(args.interval)
+
+    print(f'Replayed {len(prs)} merged pull requests')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,755 @@
+#!/usr/bin/env python
+"""
+A local stand-in for the GitHub, PyPI and ADS APIs used by the tools in
+this repository, so that they can be exercised and benchmarked without
+network access or tokens.
+
+The server answers from two sources:
+
+* Recorded fixtures: JSON files in the ``--fixtures`` directory, each
+  containing a request (method, path and optionally query parameters) and
+  the response to send back. Fixtures can be recorded from the real services
+  by running with ``--record`` and ``--upstream``.
+
+* Synthetic datasets, generated deterministically from ``--seed``: merged
+  pull requests (``--prs``), code search hits (``--search-hits``), PyPI
+  projects and paper citations (``--citations``). These are served with the
+  same pagination (``Link`` headers, GraphQL cursors, ADS ``start``/``rows``)
+  and rate limit headers as the real services.
+
+All three services are served on the same port, so for example::
+
+    python standin_server.py --port 8000 &
+    export GITHUB_API_URL=http://127.0.0.1:8000
+    export PYPI_URL=http://127.0.0.1:8000
+    export ADS_API_URL=http://127.0.0.1:8000/v1/
+    export GITHUB_TOKEN=standin
+
+The number of requests served for each endpoint can be retrieved from
+``/_standin/stats`` (and reset with ``/_standin/reset``).
+"""
+
+import os
+import re
+import json
+import math
+import time
+import base64
+import random
+import hashlib
+import argparse
+import threading
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+ISO_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+# Rate limits as (limit, window in seconds) for each resource
+RATE_LIMITS = {'core': (5000, 3600),
+               'search': (30, 60),
+               'code_search': (10, 60),
+               'graphql': (5000, 3600)}
+
+# Like GitHub, only the first 1000 results of a search are available
+SEARCH_RESULT_CAP = 1000
+
+START_DATE = datetime(2011, 6, 1, tzinfo=timezone.utc)
+END_DATE = datetime(2024, 6, 1, tzinfo=timezone.utc)
+
+VERSIONS = ['0.1', '0.2', '0.3', '0.4', '1.0', '1.1', '1.2', '1.3', '2.0',
+            '3.0', '3.1', '3.2', '4.0', '4.1', '4.2', '4.3', '5.0', '5.1',
+            '5.2', '5.3', '6.0', '6.1']
+
+LABELS = ['Bug', 'Enhancement', 'Docs', 'Affects-dev', 'no-changelog-entry-needed',
+          'skip-changelog-checks', 'backport-v5.0.x', 'io.fits', 'coordinates',
+          'table', 'units', 'modeling']
+
+
+def isoformat(dt):
+    return dt.strftime(ISO_FORMAT)
+
+
+class Datasets:
+    """
+    Synthetic data, generated deterministically from a random seed.
+    """
+
+    def __init__(self, n_prs=100000, n_search_hits=50000, n_citations=10000,
+                 n_authors=3000, n_repos=300, seed=1):
+
+        rng = random.Random(seed)
+
+        # Authors follow a long-tailed distribution, as is typical for
+        # contributions to open source projects.
+        self.authors = [f'user{i}' for i in range(n_authors)] + ['ghost', 'dependabot[bot]']
+        weights = [1 / (i + 1) for i in range(n_authors)] + [1, 2]
+
+        span = (END_DATE - START_DATE).total_seconds()
+
+        self.pull_requests = []
+        for number in range(1, n_prs + 1):
+            created = START_DATE + timedelta(seconds=span * (number - 1) / max(n_prs, 1))
+            merged = None
+            if rng.random() < 0.75:
+                merged = created + timedelta(hours=rng.expovariate(1 / 72))
+            version_index = min(len(VERSIONS) - 1,
+                                int(len(VERSIONS) * (created - START_DATE).total_seconds() / span))
+            milestone = None
+            if merged is not None and rng.random() < 0.9:
+                minor = VERSIONS[min(len(VERSIONS) - 1, version_index + rng.choice([0, 0, 1]))]
+                milestone = f'v{minor}.{rng.choice([0, 0, 1, 2])}'
+            self.pull_requests.append({
+                'number': number,
+                'title': f'Synthetic pull request {number}',
+                'author': rng.choices(self.authors, weights)[0],
+                'created_at': created,
+                'updated_at': (merged or created) + timedelta(days=1),
+                'merged_at': merged,
+                'closed_at': merged or (created + timedelta(days=rng.randint(1, 300))
+                                        if rng.random() < 0.9 else None),
+                'milestone': milestone,
+                'labels': rng.sample(LABELS, rng.choice([0, 1, 1, 2, 3])),
+                'merge_commit': hashlib.sha1(str(number).encode()).hexdigest() if merged else None,
+            })
+
+        self.merged_pull_requests = [pr for pr in self.pull_requests if pr['merged_at']]
+
+        # Code search hits, with a file size distribution spanning several
+        # orders of magnitude so that searches have to be split by size.
+        self.search_hits = []
+        for i in range(n_search_hits):
+            owner = f'owner{rng.randrange(n_search_hits // 2 + 1)}'
+            name = f'project{rng.randrange(n_search_hits)}'
+            self.search_hits.append({'size': int(rng.lognormvariate(8, 1.5)),
+                                     'path': f'src/module{i}.py',
+                                     'full_name': f'{owner}/{name}',
+                                     'name': name})
+        self.search_hits.sort(key=lambda hit: hit['size'])
+
+        # About a third of the repositories found also exist on PyPI
+        names = sorted({hit['name'] for hit in self.search_hits})
+        self.pypi_projects = {name for name in names if rng.random() < 0.3}
+        self.pypi_projects |= {'astropy', 'numpy', 'scipy', 'matplotlib'}
+
+        self.citations = []
+        for i in range(n_citations):
+            year = rng.randint(2013, 2024)
+            self.citations.append({'bibcode': f'{year}Synth{i:06d}',
+                                   'pubdate': f'{year}-{rng.randint(1, 12):02d}-00',
+                                   'year': str(year)})
+
+        # Repositories of the organization, most of which have not been
+        # pushed to for a while. A few are archived or empty.
+        self.repositories = [{'name': 'astropy', 'archived': False,
+                              'head_committed_at': self.merged_pull_requests[-1]['merged_at']
+                              if self.merged_pull_requests else END_DATE}]
+        for i in range(1, n_repos):
+            self.repositories.append({
+                'name': f'package{i}',
+                'archived': rng.random() < 0.1,
+                'head_committed_at': (None if rng.random() < 0.02 else
+                                      START_DATE + timedelta(seconds=span * rng.random() ** 0.3)),
+            })
+
+
+class RateLimiter:
+    """
+    Tracks the rate limit budget of each resource, like GitHub does.
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.windows = {}
+
+    def consume(self, resource, cost=1):
+        """
+        Consume from the budget and return ``(allowed, headers)``.
+        """
+        limit, window = RATE_LIMITS[resource]
+        now = time.time()
+        with self.lock:
+            reset, used = self.windows.get(resource, (0, 0))
+            if now >= reset:
+                reset, used = int(now) + window, 0
+            allowed = not self.enabled or used + cost <= limit
+            # Without rate limits, the whole budget is always reported as
+            # remaining, so that clients never wait for it to reset.
+            if allowed and self.enabled:
+                used += cost
+            self.windows[resource] = (reset, used)
+        headers = {'X-RateLimit-Limit': str(limit),
+                   'X-RateLimit-Remaining': str(max(limit - used, 0)),
+                   'X-RateLimit-Used': str(used),
+                   'X-RateLimit-Reset': str(reset),
+                   'X-RateLimit-Resource': resource}
+        return allowed, headers
+
+
+def paginate(items, query, base_url, cap=None, default_per_page=30):
+    """
+    Return the items on the requested page, and the ``Link`` header.
+    """
+
+    per_page = min(int(query.get('per_page', default_per_page)), 100)
+    page = int(query.get('page', 1))
+    n_items = len(items) if cap is None else min(len(items), cap)
+    last = max(1, math.ceil(n_items / per_page))
+
+    links = []
+
+    def link(page, rel):
+        params = dict(query, per_page=per_page, page=page)
+        links.append(f'<{base_url}?{urlencode(params)}>; rel="{rel}"')
+
+    if page < last:
+        link(page + 1, 'next')
+        link(last, 'last')
+    if page > 1:
+        link(1, 'first')
+        link(page - 1, 'prev')
+
+    start = (page - 1) * per_page
+    return items[start:min(start + per_page, n_items)], ', '.join(links)
+
+
+def pr_as_rest(pr, owner, name):
+    return {'number': pr['number'],
+            'title': pr['title'],
+            'state': 'open' if pr['closed_at'] is None else 'closed',
+            'user': {'login': pr['author']},
+            'created_at': isoformat(pr['created_at']),
+            'updated_at': isoformat(pr['updated_at']),
+            'closed_at': isoformat(pr['closed_at']) if pr['closed_at'] else None,
+            'merged_at': isoformat(pr['merged_at']) if pr['merged_at'] else None,
+            'merge_commit_sha': pr['merge_commit'],
+            'milestone': {'title': pr['milestone']} if pr['milestone'] else None,
+            'labels': [{'name': label} for label in pr['labels']],
+            'html_url': f'https://github.com/{owner}/{name}/pull/{pr["number"]}',
+            'pull_request': {}}
+
+
+def pr_as_graphql(pr):
+    return {'title': pr['title'],
+            'number': pr['number'],
+            'author': {'login': pr['author']},
+            'mergeCommit': {'oid': pr['merge_commit']} if pr['merge_commit'] else None,
+            'createdAt': isoformat(pr['created_at']),
+            'updatedAt': isoformat(pr['updated_at']),
+            'mergedAt': isoformat(pr['merged_at']) if pr['merged_at'] else None,
+            'milestone': {'title': pr['milestone']} if pr['milestone'] else None,
+            'labels': {'edges': [{'node': {'name': label}} for label in pr['labels']]}}
+
+
+def encode_cursor(index):
+    return base64.b64encode(f'cursor:{index}'.encode()).decode()
+
+
+def decode_cursor(cursor):
+    return int(base64.b64decode(cursor.encode()).decode().split(':')[1])
+
+
+class Fixtures:
+    """
+    Recorded responses, stored as one JSON file per request.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.entries = []
+        if directory and os.path.isdir(directory):
+            for filename in sorted(os.listdir(directory)):
+                if filename.endswith('.json'):
+                    with open(os.path.join(directory, filename)) as f:
+                        self.entries.append(json.load(f))
+
+    def find(self, method, path, query):
+        for entry in self.entries:
+            request = entry['request']
+            if (request['method'] == method and request['path'] == path
+                    and all(query.get(key) == str(value)
+                            for key, value in request.get('query', {}).items())):
+                return entry['response']
+        return None
+
+    def record(self, method, path, query, status, headers, body):
+        os.makedirs(self.directory, exist_ok=True)
+        entry = {'request': {'method': method, 'path': path, 'query': query},
+                 'response': {'status': status, 'headers': headers, 'body': body}}
+        key = hashlib.sha1(json.dumps(entry['request'], sort_keys=True).encode()).hexdigest()
+        with open(os.path.join(self.directory, f'{key[:16]}.json'), 'w') as f:
+            json.dump(entry, f, indent=2)
+        self.entries.insert(0, entry)
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    # Set on the server: datasets, rate_limiter, fixtures, upstream, record, stats
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    @property
+    def base_url(self):
+        host = self.headers.get('Host') or '{}:{}'.format(*self.server.server_address[:2])
+        return f'http://{host}'
+
+    def do_GET(self):
+        self.handle_request('GET')
+
+    def do_HEAD(self):
+        self.handle_request('HEAD')
+
+    def do_POST(self):
+        self.handle_request('POST')
+
+    def do_PATCH(self):
+        self.handle_request('PATCH')
+
+    def do_PUT(self):
+        self.handle_request('PUT')
+
+    def read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def send(self, status, body=None, headers=None, content_type='application/json'):
+
+        if body is None:
+            data = b''
+        elif isinstance(body, (bytes, str)):
+            data = body.encode('utf-8') if isinstance(body, str) else body
+        else:
+            data = json.dumps(body).encode('utf-8')
+
+        headers = dict(headers or {})
+
+        if status == 200 and self.command in ('GET', 'HEAD'):
+            etag = '"{}"'.format(hashlib.sha1(data).hexdigest())
+            headers['ETag'] = etag
+            if self.headers.get('If-None-Match') == etag:
+                status, data = 304, b''
+
+        self.send_response(status)
+        headers.setdefault('Content-Type', content_type)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(data)
+
+    def handle_request(self, method):
+
+        parts = urlsplit(self.path)
+        path = parts.path.rstrip('/') or '/'
+
+        # github3.py and PyGithub add this prefix for GitHub Enterprise URLs
+        if path.startswith('/api/v3'):
+            path = path[len('/api/v3'):] or '/'
+        query = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+        body = self.read_body()
+
+        if path.startswith('/_standin/'):
+            return self.handle_control(path)
+
+        self.server.stats[f'{method} {self.endpoint_name(path)}'] += 1
+
+        if self.server.record:
+            return self.handle_record(method, path, query, body)
+
+        response = self.server.fixtures.find(method, path, query)
+        if response is not None:
+            return self.send(response['status'], response['body'], response.get('headers'))
+
+        if path.startswith('/pypi/') or path.startswith('/simple'):
+            return self.handle_pypi(path)
+        elif path.startswith('/v1/'):
+            return self.handle_ads(path, query)
+        else:
+            return self.handle_github(method, path, query, body)
+
+    @staticmethod
+    def endpoint_name(path):
+        # Collapse the variable parts of paths so that the statistics are
+        # grouped by endpoint.
+        path = re.sub(r'^/repos/[^/]+/[^/]+', '/repos/{owner}/{repo}', path)
+        path = re.sub(r'^/orgs/[^/]+', '/orgs/{org}', path)
+        path = re.sub(r'^/pypi/[^/]+', '/pypi/{project}', path)
+        path = re.sub(r'^/simple/[^/]+', '/simple/{project}', path)
+        return re.sub(r'/\d+', '/{number}', path)
+
+    def handle_control(self, path):
+        if path == '/_standin/stats':
+            return self.send(200, dict(self.server.stats))
+        elif path == '/_standin/reset':
+            self.server.stats.clear()
+            self.server.rate_limiter.windows.clear()
+            return self.send(200, {})
+        return self.send(404, {'message': 'Not Found'})
+
+    def handle_record(self, method, path, query, body):
+        import urllib.request
+        import urllib.error
+        url = self.server.upstream.rstrip('/') + self.path
+        headers = {key: value for key, value in self.headers.items()
+                   if key.lower() in ('authorization', 'accept', 'content-type')}
+        request = urllib.request.Request(url, data=body or None, headers=headers, method=method)
+        try:
+            with urllib.request.urlopen(request) as response:
+                status, data, response_headers = response.status, response.read(), response.headers
+        except urllib.error.HTTPError as exc:
+            status, data, response_headers = exc.code, exc.read(), exc.headers
+        kept = {key: value for key, value in response_headers.items()
+                if key.lower() in ('link', 'content-type') or key.lower().startswith('x-ratelimit')}
+        try:
+            recorded = json.loads(data)
+        except ValueError:
+            recorded = data.decode('utf-8', errors='replace')
+        self.server.fixtures.record(method, path, query, status, kept, recorded)
+        return self.send(status, data, kept, content_type=kept.get('Content-Type', 'application/json'))
+
+    # GitHub
+
+    def handle_github(self, method, path, query, body):
+
+        if path.startswith('/search/code'):
+            resource = 'code_search'
+        elif path.startswith('/search/'):
+            resource = 'search'
+        elif path == '/graphql':
+            resource = 'graphql'
+        else:
+            resource = 'core'
+
+        if resource == 'graphql' and self.headers.get('Authorization') is None:
+            return self.send(401, {'message': 'This endpoint requires you to be authenticated.'})
+
+        allowed, headers = self.server.rate_limiter.consume(resource)
+        if not allowed:
+            return self.send(403, {'message': 'API rate limit exceeded'}, headers)
+
+        datasets = self.server.datasets
+
+        if path == '/graphql':
+            return self.handle_graphql(json.loads(body or b'{}'), headers)
+
+        if path == '/rate_limit':
+            return self.send(200, {'resources': {}}, headers)
+
+        match = re.match(r'^/repos/([^/]+)/([^/]+)/(issues|pulls)$', path)
+        if match:
+            owner, name, kind = match.groups()
+            prs = datasets.pull_requests
+            state = query.get('state', 'open')
+            if state == 'closed':
+                prs = [pr for pr in prs if pr['closed_at'] is not None]
+            elif state == 'open':
+                prs = [pr for pr in prs if pr['closed_at'] is None]
+            if query.get('direction', 'desc') == 'desc':
+                prs = prs[::-1]
+            items, link = paginate(prs, query, self.base_url + path)
+            headers['Link'] = link
+            return self.send(200, [pr_as_rest(pr, owner, name) for pr in items], headers)
+
+        match = re.match(r'^/orgs/([^/]+)(/.*)?$', path)
+        if match:
+            return self.handle_org(method, match.group(1), match.group(2) or '', query, headers)
+
+        if path == '/search/code':
+            return self.handle_code_search(query, headers)
+
+        return self.send(404, {'message': 'Not Found'}, headers)
+
+    def handle_org(self, method, org, subpath, query, headers):
+
+        authors = self.server.datasets.authors
+        url = f'{self.base_url}/orgs/{org}'
+
+        if subpath == '':
+            return self.send(200, {'login': org, 'url': url}, headers)
+
+        # A deterministic subset of the authors are members, blocked, etc.
+        lists = {'/members': authors[:len(authors) // 20],
+                 '/blocks': authors[-5:-2],
+                 '/invitations': authors[len(authors) // 20:len(authors) // 20 + 10],
+                 '/failed_invitations': authors[len(authors) // 10:len(authors) // 10 + 40]}
+
+        if subpath in lists:
+            users = []
+            for i, login in enumerate(lists[subpath]):
+                user = {'login': login, 'id': i}
+                if subpath == '/failed_invitations':
+                    user['failed_at'] = isoformat(END_DATE - timedelta(days=30 * i))
+                    user['failed_reason'] = ('Invitation expired. User did not accept this '
+                                             'invite for 7 days.' if i % 4 else 'Declined')
+                users.append(user)
+            items, headers['Link'] = paginate(users, query, url + subpath)
+            return self.send(200, items, headers)
+
+        if subpath.startswith('/memberships/') and method == 'PUT':
+            login = subpath.split('/')[-1]
+            return self.send(200, {'state': 'pending', 'role': 'member',
+                                   'user': {'login': login}}, headers)
+
+        return self.send(404, {'message': 'Not Found'}, headers)
+
+    def handle_code_search(self, query, headers):
+
+        hits = self.server.datasets.search_hits
+        match = re.search(r'size:(\d+)\.\.(\d+)', query.get('q', ''))
+        if match:
+            low, high = int(match.group(1)), int(match.group(2))
+            hits = [hit for hit in hits if low <= hit['size'] <= high]
+
+        per_page = min(int(query.get('per_page', 30)), 100)
+        if (int(query.get('page', 1)) - 1) * per_page >= SEARCH_RESULT_CAP:
+            return self.send(422, {'message': 'Only the first 1000 search results are available'},
+                             headers)
+
+        items, headers['Link'] = paginate(hits, query, self.base_url + '/search/code',
+                                          cap=SEARCH_RESULT_CAP)
+        return self.send(200, {'total_count': len(hits),
+                               'incomplete_results': False,
+                               'items': [{'name': hit['path'].split('/')[-1],
+                                          'path': hit['path'],
+                                          'repository': {'full_name': hit['full_name'],
+                                                         'name': hit['name']}}
+                                         for hit in items]}, headers)
+
+    def handle_graphql(self, payload, headers):
+
+        query = payload.get('query', '')
+
+        if re.search(r'\bsearch\s*\(', query):
+            return self.handle_graphql_search(query, payload.get('variables') or {}, headers)
+
+        if re.search(r'\brepositories\s*\(', query):
+            return self.handle_graphql_repositories(query, payload.get('variables') or {}, headers)
+
+        match = re.search(r'pullRequests\(([^)]*)\)', query)
+        if match:
+            arguments = match.group(1)
+            prs = self.server.datasets.merged_pull_requests
+            base = re.search(r'baseRefName:\s*"([^"]*)"', arguments)
+            if base and base.group(1) != 'main':
+                prs = []
+            first = int(re.search(r'first:\s*(\d+)', arguments).group(1))
+            after = re.search(r'after:\s*"([^"]*)"', arguments)
+            start = decode_cursor(after.group(1)) + 1 if after else 0
+            edges = [{'node': pr_as_graphql(pr), 'cursor': encode_cursor(start + i)}
+                     for i, pr in enumerate(prs[start:start + first])]
+            return self.send(200, {'data': {'repository': {'pullRequests': {
+                'edges': edges,
+                'pageInfo': {'hasNextPage': start + first < len(prs),
+                             'endCursor': edges[-1]['cursor'] if edges else None}}}}}, headers)
+
+        return self.send(200, {'errors': [{'message': 'Query not supported by the stand-in server'}]},
+                         headers)
+
+    def handle_graphql_repositories(self, query, variables, headers):
+
+        first = re.search(r'first:\s*(\d+)', query)
+        first = int(first.group(1)) if first else 100
+        after = variables.get('cursor')
+        if after is None:
+            match = re.search(r'after:\s*"([^"]*)"', query)
+            after = match.group(1) if match else None
+
+        repositories = self.server.datasets.repositories
+        if re.search(r'isArchived:\s*false', query):
+            repositories = [repo for repo in repositories if not repo['archived']]
+
+        start = decode_cursor(after) + 1 if after else 0
+        stop = min(start + first, len(repositories))
+        nodes = []
+        for repo in repositories[start:stop]:
+            committed = repo['head_committed_at']
+            nodes.append({'name': repo['name'],
+                          'isArchived': repo['archived'],
+                          'defaultBranchRef': {'name': 'main',
+                                               'target': {'committedDate': isoformat(committed)}}
+                          if committed else None})
+
+        return self.send(200, {'data': {'organization': {'repositories': {
+            'nodes': nodes,
+            'pageInfo': {'hasNextPage': stop < len(repositories),
+                         'endCursor': encode_cursor(stop - 1) if nodes else None}}}}}, headers)
+
+    def handle_graphql_search(self, query, variables, headers):
+
+        # The search string, page size and cursor can be given inline or as
+        # variables
+        def argument(name, variable, pattern):
+            if variable in variables:
+                return variables[variable]
+            match = re.search(name + r':\s*' + pattern, query)
+            return match.group(1) if match else None
+
+        search = argument('query', 'query', r'"([^"]*)"') or ''
+        first = int(argument('first', 'first', r'(\d+)') or 10)
+        after = argument('after', 'cursor', r'"([^"]*)"')
+
+        prs = self.server.datasets.pull_requests
+        if 'is:merged' in search.split():
+            prs = self.server.datasets.merged_pull_requests
+
+        match = re.search(r'merged:(>=|<=)?(\d{4}-\d{2}-\d{2})(?:\.\.(\d{4}-\d{2}-\d{2}))?', search)
+        if match:
+            comparison, start, stop = match.groups()
+            start = datetime.fromisoformat(start).replace(tzinfo=timezone.utc)
+            if stop is not None:
+                stop = datetime.fromisoformat(stop).replace(tzinfo=timezone.utc) + timedelta(days=1)
+                prs = [pr for pr in prs if pr['merged_at'] and start <= pr['merged_at'] < stop]
+            elif comparison == '<=':
+                prs = [pr for pr in prs if pr['merged_at'] and pr['merged_at'] < start + timedelta(days=1)]
+            else:
+                prs = [pr for pr in prs if pr['merged_at'] and pr['merged_at'] >= start]
+
+        start = decode_cursor(after) + 1 if after else 0
+        stop = min(start + first, len(prs), SEARCH_RESULT_CAP)
+        nodes = []
+        for pr in prs[start:stop]:
+            node = pr_as_graphql(pr)
+            # Deleted accounts have a null author
+            if pr['author'] == 'ghost':
+                node['author'] = None
+            nodes.append(node)
+
+        return self.send(200, {'data': {'search': {
+            'issueCount': len(prs),
+            'nodes': nodes,
+            'pageInfo': {'hasNextPage': stop < min(len(prs), SEARCH_RESULT_CAP),
+                         'endCursor': encode_cursor(stop - 1) if nodes else None}}}}, headers)
+
+    # PyPI
+
+    def handle_pypi(self, path):
+
+        projects = self.server.datasets.pypi_projects
+
+        if path == '/simple':
+            if 'application/vnd.pypi.simple.v1+json' in self.headers.get('Accept', ''):
+                return self.send(200, {'meta': {'api-version': '1.0'},
+                                       'projects': [{'name': name} for name in sorted(projects)]},
+                                 content_type='application/vnd.pypi.simple.v1+json')
+            links = '\n'.join(f'<a href="/simple/{name}/">{name}</a>' for name in sorted(projects))
+            return self.send(200, f'<!DOCTYPE html>\n<html><body>\n{links}\n</body></html>\n',
+                             content_type='text/html')
+
+        match = re.match(r'^/(?:pypi|simple)/([^/]+)(/json)?$', path)
+        if match and match.group(1).lower() in projects:
+            name = match.group(1).lower()
+            if path.startswith('/simple'):
+                return self.send(200, f'<html><body><a href="#">{name}-1.0.tar.gz</a></body></html>',
+                                 content_type='text/html')
+            return self.send(200, {'info': {'name': name, 'version': '1.0'}, 'releases': {}})
+
+        return self.send(404, {'message': 'Not Found'})
+
+    # ADS
+
+    def handle_ads(self, path, query):
+
+        if not self.headers.get('Authorization', '').startswith('Bearer'):
+            return self.send(401, {'error': 'Unauthorized'})
+
+        if path != '/v1/search/query':
+            return self.send(404, {'error': 'Not Found'})
+
+        docs = self.server.datasets.citations
+        match = re.search(r'year:(\d+)', query.get('q', '') + ' ' + query.get('fq', ''))
+        if match:
+            docs = [doc for doc in docs if doc['year'] == match.group(1)]
+
+        fields = query.get('fl', 'bibcode').split(',')
+        start = int(query.get('start', 0))
+        rows = min(int(query.get('rows', 10)), 2000)
+
+        return self.send(200, {'responseHeader': {'status': 0},
+                               'response': {'numFound': len(docs), 'start': start,
+                                            'docs': [{field: doc.get(field) for field in fields}
+                                                     for doc in docs[start:start + rows]]}},
+                         {'X-RateLimit-Limit': '5000', 'X-RateLimit-Remaining': '4999'})
+
+
+def make_server(host='127.0.0.1', port=0, datasets=None, fixtures=None,
+                rate_limit=True, upstream=None, record=False, verbose=False):
+    """
+    Create the stand-in server. Use ``port=0`` to pick a free port, which is
+    then available as ``server.server_address[1]``.
+    """
+    server = ThreadingHTTPServer((host, port), StandinHandler)
+    server.daemon_threads = True
+    server.datasets = datasets if datasets is not None else Datasets()
+    server.fixtures = Fixtures(fixtures)
+    server.rate_limiter = RateLimiter(enabled=rate_limit)
+    server.upstream = upstream
+    server.record = record
+    server.verbose = verbose
+    server.stats = Counter()
+    return server
+
+
+def start_server(**kwargs):
+    """
+    Start the stand-in server in a background thread, and return the server
+    and its base URL. Stop it with ``server.shutdown()``.
+    """
+    server = make_server(**kwargs)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    host, port = server.server_address[:2]
+    return server, f'http://{host}:{port}'
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--prs', type=int, default=100000,
+                        help='number of synthetic pull requests')
+    parser.add_argument('--search-hits', type=int, default=50000,
+                        help='number of synthetic code search hits')
+    parser.add_argument('--citations', type=int, default=10000,
+                        help='number of synthetic citations')
+    parser.add_argument('--seed', type=int, default=1,
+                        help='random seed for the synthetic data')
+    parser.add_argument('--fixtures',
+                        help='directory with recorded responses to replay (or to record to)')
+    parser.add_argument('--record', action='store_true',
+                        help='forward requests to --upstream and record the responses in --fixtures')
+    parser.add_argument('--upstream', default='https://api.github.com',
+                        help='the service to record from')
+    parser.add_argument('--no-rate-limit', action='store_true',
+                        help='never refuse requests because of rate limits')
+    parser.add_argument('--verbose', '-v', action='store_true',
+                        help='log every request')
+    args = parser.parse_args(argv)
+
+    if args.record and not args.fixtures:
+        parser.error('--record requires --fixtures')
+
+    print('Generating synthetic data...')
+    datasets = Datasets(n_prs=args.prs, n_search_hits=args.search_hits,
+                        n_citations=args.citations, seed=args.seed)
+
+    server = make_server(args.host, args.port, datasets=datasets, fixtures=args.fixtures,
+                         rate_limit=not args.no_rate_limit, upstream=args.upstream,
+                         record=args.record, verbose=args.verbose)
+
+    print(f'Serving on http://{args.host}:{server.server_address[1]}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
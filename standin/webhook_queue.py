@@ -0,0 +1 @@
+../webhook_queue.py
\ No newline at end of file
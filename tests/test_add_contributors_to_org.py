@@ -0,0 +1,66 @@
+"""
+Tests of add_contributors_to_org.py against the stand-in GitHub API server.
+"""
+
+import os
+import sys
+import subprocess
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, os.path.join(ROOT, 'standin'))
+
+from standin_server import Datasets, start_server  # noqa: E402
+
+
+@pytest.fixture
+def cli(tmp_path):
+
+    server, url = start_server(datasets=Datasets(n_prs=300, n_search_hits=10,
+                                                 n_citations=10, n_repos=3),
+                               rate_limit=False)
+
+    env = dict(os.environ,
+               GITHUB_API_URL=url,
+               ORG_INVITE_TOKEN='token',
+               ASTROPY_TOOLS_ORG_CACHE=str(tmp_path / 'org'),
+               ASTROPY_TOOLS_LEDGER=str(tmp_path / 'ledger.sqlite'),
+               ASTROPY_TOOLS_HTTP_CACHE='',
+               ASTROPY_TOOLS_RATE_LIMIT_DIR='')
+
+    def run(*args):
+        result = subprocess.run([sys.executable, os.path.join(ROOT, 'add_contributors_to_org.py'),
+                                 'astropy', *args],
+                                env=env, cwd=ROOT, capture_output=True, text=True)
+        assert result.returncode == 0, result.stderr
+        return result.stdout
+
+    def invitations():
+        return sum(count for request, count in server.stats.items()
+                   if request.startswith('PUT /orgs/{org}/memberships/'))
+
+    yield run, invitations
+
+    server.shutdown()
+    server.server_close()
+
+
+def test_dry_run_then_real_run_still_invites(cli):
+
+    run, invitations = cli
+
+    output = run('--all-repos', '--dry-run', '-d', '2024-01-01')
+    n_dry_run = output.count('DRY RUN: would have invited')
+    assert n_dry_run > 0
+    assert invitations() == 0
+
+    run('--all-repos', '-d', '2024-01-01')
+    assert invitations() == n_dry_run
+
+    # Nothing was pushed since, so the next run skips all the repositories
+    output = run('--all-repos', '-d', '2024-01-01', '--verbose')
+    assert 'Skipping repository' in output
+    assert 'Processing repository' not in output
+    assert invitations() == n_dry_run
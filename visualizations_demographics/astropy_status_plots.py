@@ -9,7 +9,6 @@ git log --numstat --use-mailmap --format=format:"COMMIT,%H,%at,%aN"
 
 import os
 import numpy as np
-from matplotlib import pyplot as plt
 
 def generate_commit_stats_file(fn='gitlogstats', overwrite=False, dirtorunin=None):
     """
@@ -75,6 +74,7 @@ def parse_git_log(fn='gitlogstats', recentfirst=False, cumlines=False):
 
 def loc_plot(yrlabels=None):
     from datetime import datetime
+    from matplotlib import pyplot as plt
 
     authors, datetimes, nlines = parse_git_log(cumlines=True, recentfirst=False)
 
@@ -91,6 +91,7 @@ def loc_plot(yrlabels=None):
 
 def commits_plot(yrlabels=None, **plotkws):
     from datetime import datetime
+    from matplotlib import pyplot as plt
 
     authors, datetimes, deltalines = parse_git_log(recentfirst=False)
 
@@ -120,6 +121,7 @@ def get_first_commit_map():
 
 def commiters_plot(yrlabels=None, **plotkws):
     from datetime import datetime
+    from matplotlib import pyplot as plt
 
     firstcommit = get_first_commit_map()
 
@@ -163,8 +165,10 @@ def get_paper_citations(paperbibcode='2013A&A...558A..33A', apikey=None, fields=
         else:
             raise ValueError('No ADS API key given and no adsapikey file found')
 
+    ads_url = os.environ.get('ADS_API_URL', 'https://api.adsabs.harvard.edu/v1/')
+
     headers = {'Authorization': 'Bearer:' + apikey}
-    get_ads = lambda apiend, params=None: requests.get('http://api.adsabs.harvard.edu/v1/'+apiend, params=params, headers=headers)
+    get_ads = lambda apiend, params=None: requests.get(ads_url+apiend, params=params, headers=headers)
 
     params = {'q': 'citations(bibcode:{0})'.format(paperbibcode),
               'fl': fields,
@@ -182,6 +186,7 @@ def get_paper_citations(paperbibcode='2013A&A...558A..33A', apikey=None, fields=
 
 def plot_paper_citations(paperbibcode=None, **plotkws):
     from astropy.time import Time
+    from matplotlib import pyplot as plt
     from matplotlib.dates import YearLocator, MonthLocator, DateFormatter
 
 
@@ -223,6 +228,7 @@ def plot_docs_visits(analyics_csvfn, **plotkws):
     from datetime import datetime
     from astropy.table import Table
     from astropy.time import Time
+    from matplotlib import pyplot as plt
     from matplotlib.dates import YearLocator, MonthLocator, DateFormatter
 
     #first read the data
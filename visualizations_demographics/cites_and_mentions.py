@@ -1,5 +1,3 @@
-from matplotlib import pyplot as plt
-
 from datetime import datetime
 import ads
 import numpy as np
@@ -72,6 +70,8 @@ def get_total():
     return years, np.array(values)
 
 if __name__ == "__main__":
+    from matplotlib import pyplot as plt
+
     if 'years' not in locals():
         # "cache" the queries if running multiple times interactively
         years = {}
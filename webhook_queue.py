@@ -0,0 +1,220 @@
+"""
+A queue of GitHub webhook deliveries kept in a local directory.
+
+Each delivery is a JSON file with the ``event`` (the ``X-GitHub-Event``
+header), the ``delivery`` ID and the ``payload``, named so that listing the
+directory in order gives the deliveries in the order they were received.
+Files are written to a temporary name first and then renamed, so a consumer
+never sees a partial delivery. Deliveries which cannot be handled are moved
+to the ``failed`` subdirectory after a few attempts, and can be moved back
+to the queue to be handled again once the problem is fixed.
+
+Deliveries can be added by anything that can write files, or received over
+HTTP by running this module::
+
+    python webhook_queue.py QUEUE_DIR --port 8080
+
+in which case set ``GITHUB_WEBHOOK_SECRET`` to the secret of the webhook so
+that the signature of each delivery is checked.
+"""
+
+import os
+import hmac
+import json
+import sys
+import time
+import uuid
+import hashlib
+import argparse
+import threading
+import traceback
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Time in seconds between checks of the queue for new deliveries
+POLL_INTERVAL = 2
+
+# A delivery which cannot be handled is tried again after RETRY_DELAY
+# seconds, doubling each time, and moved to the FAILED_DIR subdirectory of the
+# queue after MAX_ATTEMPTS attempts.
+RETRY_DELAY = 30
+MAX_ATTEMPTS = 5
+FAILED_DIR = 'failed'
+
+
+def enqueue(directory, event, payload, delivery=None):
+    """
+    Add a webhook delivery to the queue and return the path of its file.
+    """
+    delivery = delivery or str(uuid.uuid4())
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'{time.time_ns():020d}-{delivery}.json')
+    with open(path + '.tmp', 'w') as f:
+        json.dump({'event': event, 'delivery': delivery, 'payload': payload}, f)
+    os.replace(path + '.tmp', path)
+    return path
+
+
+def pending(directory):
+    """
+    Return the paths of the deliveries in the queue, oldest first.
+    """
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    return [os.path.join(directory, name) for name in sorted(names) if name.endswith('.json')]
+
+
+def consume(directory, handle, poll_interval=POLL_INTERVAL, stop=None):
+    """
+    Call ``handle(event, payload)`` for each delivery in the queue, oldest
+    first, removing each from the queue once it has been handled, and then
+    wait for new deliveries until ``stop`` (a `threading.Event`) is set.
+
+    If ``handle`` raises an exception, it is printed and the delivery is
+    left in the queue to be tried again later (after the following ones), so
+    that a temporary failure such as a network error does not lose it. A
+    delivery which still cannot be handled after ``MAX_ATTEMPTS`` attempts,
+    or which cannot be read, is moved to the ``failed`` subdirectory of the
+    queue so that it does not block the others.
+    """
+
+    # Number of failed attempts and time of the next attempt for each delivery
+    attempts = {}
+    retry_at = {}
+
+    while stop is None or not stop.is_set():
+        for path in pending(directory):
+            if time.monotonic() < retry_at.get(path, 0):
+                continue
+            try:
+                with open(path) as f:
+                    delivery = json.load(f)
+            except ValueError:
+                print(f'Could not read the webhook delivery {os.path.basename(path)}:',
+                      file=sys.stderr)
+                traceback.print_exc()
+                fail(path)
+                continue
+            try:
+                handle(delivery['event'], delivery['payload'])
+            except Exception:
+                attempts[path] = attempts.get(path, 0) + 1
+                print(f'Could not handle the webhook delivery {os.path.basename(path)} '
+                      f'(attempt {attempts[path]} of {MAX_ATTEMPTS}):', file=sys.stderr)
+                traceback.print_exc()
+                if attempts[path] < MAX_ATTEMPTS:
+                    retry_at[path] = (time.monotonic() +
+                                      RETRY_DELAY * 2 ** (attempts[path] - 1))
+                else:
+                    fail(path)
+                    del attempts[path]
+                    retry_at.pop(path, None)
+                continue
+            os.remove(path)
+            attempts.pop(path, None)
+            retry_at.pop(path, None)
+        if stop is None:
+            time.sleep(poll_interval)
+        else:
+            stop.wait(poll_interval)
+
+
+def fail(path):
+    """
+    Move a delivery which could not be handled to the ``failed``
+    subdirectory of its queue, and return its new path.
+    """
+    failed_dir = os.path.join(os.path.dirname(path), FAILED_DIR)
+    os.makedirs(failed_dir, exist_ok=True)
+    new_path = os.path.join(failed_dir, os.path.basename(path))
+    os.replace(path, new_path)
+    print(f'Moved the webhook delivery to {new_path}', file=sys.stderr)
+    return new_path
+
+
+def signature_valid(secret, body, signature):
+    """
+    Check the ``X-Hub-Signature-256`` header of a delivery.
+    """
+    expected = 'sha256=' + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature or '')
+
+
+class WebhookHandler(BaseHTTPRequestHandler):
+
+    def do_POST(self):
+
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+        secret = self.server.secret
+        if secret and not signature_valid(secret, body, self.headers.get('X-Hub-Signature-256')):
+            return self.reply(401, 'Invalid signature')
+
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            return self.reply(400, 'Invalid JSON payload')
+
+        enqueue(self.server.directory, self.headers.get('X-GitHub-Event', ''), payload,
+                delivery=self.headers.get('X-GitHub-Delivery'))
+
+        self.reply(202, 'Queued')
+
+    def reply(self, status, message):
+        body = message.encode() + b'\n'
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/plain')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def make_receiver(directory, host='127.0.0.1', port=8080, secret=None, verbose=False):
+    """
+    Return an HTTP server which adds the webhook deliveries it receives to
+    the queue in ``directory``. The secret defaults to the
+    ``GITHUB_WEBHOOK_SECRET`` environment variable.
+    """
+    server = ThreadingHTTPServer((host, port), WebhookHandler)
+    server.directory = directory
+    server.secret = secret if secret is not None else os.environ.get('GITHUB_WEBHOOK_SECRET')
+    server.verbose = verbose
+    return server
+
+
+def start_receiver(directory, **kwargs):
+    """
+    Start `make_receiver` in a background thread, and return the server.
+    """
+    server = make_receiver(directory, **kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description='Receive GitHub webhook deliveries '
+                                                 'into a queue directory.')
+    parser.add_argument('directory', help='the queue directory')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--verbose', '-v', action='store_true',
+                        help='log every delivery')
+    args = parser.parse_args(argv)
+
+    server = make_receiver(args.directory, host=args.host, port=args.port, verbose=args.verbose)
+    print(f'Queueing webhook deliveries received on http://{args.host}:{server.server_address[1]} '
+          f'in {args.directory}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()